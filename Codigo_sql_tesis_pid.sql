@@ -21,18 +21,26 @@ CREATE TABLE ubicacion (
     descripcion_sitio TEXT
 );
 
--- 3. Tabla medición
+-- 3. Tabla medición, particionada por mes (src/partitions.py crea las
+-- particiones mensuales; medicion_default recibe lo que no tenga partición).
+-- Bases creadas con la versión sin particiones: migraciones/001_medicion_particionada.sql
 CREATE TABLE medicion (
-    medicion_id BIGSERIAL PRIMARY KEY,
-    sensor_id TEXT REFERENCES sensor(sensor_id),
+    medicion_id BIGSERIAL,
+    sensor_id TEXT NOT NULL REFERENCES sensor(sensor_id),
     timestamp TIMESTAMPTZ NOT NULL,
     temperatura DOUBLE PRECISION,
     humedad DOUBLE PRECISION,
     presion DOUBLE PRECISION,
     radiacion_solar DOUBLE PRECISION,
     velocidad_viento DOUBLE PRECISION,
-    UNIQUE(sensor_id, timestamp)
-);
+    procedure_version TEXT,
+    raw_payload JSONB,                   -- fila original según INGEST_RAW_PAYLOAD (src/raw_payload.py)
+    raw_archivo_id INTEGER,              -- modo reference: archivo en archivo_crudo ...
+    raw_fila BIGINT,                     -- ... y fila de datos dentro de él
+    ingest_ts TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (sensor_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE TABLE medicion_default PARTITION OF medicion DEFAULT;
 
 CREATE TABLE variable (
 	variable_id SERIAL PRIMARY KEY,
@@ -40,20 +48,85 @@ CREATE TABLE variable (
 	unidad_estandar TEXT,
 	rango_minimo DOUBLE PRECISION,
 	rango_maximo DOUBLE PRECISION,
-	descripcion TEXT
+	descripcion TEXT,
+	-- umbrales de control de calidad (src/qc.py); NULL = chequeo desactivado
+	cambio_maximo DOUBLE PRECISION,   -- CONSISTENCY: cambio máximo contra la lectura anterior
+	salto_maximo DOUBLE PRECISION,    -- SPIKE / STEP: amplitud de un pico o escalón
+	tasa_maxima DOUBLE PRECISION,     -- RATE: cambio máximo por hora
+	plano_minutos DOUBLE PRECISION    -- FLATLINE: minutos con el mismo valor
 );
 
 CREATE TABLE validacion (
 	validacion_id BIGSERIAL PRIMARY KEY,
-	medicion_id BIGINT REFERENCES medicion(medicion_id),
+	medicion_id BIGINT,   -- sin FK: medicion es particionada (la integridad la mantienen src/db.py y src/partitions.py)
 	tipo_flag TEXT,
 	descripcion_problema TEXT
-)
+);
 
 -- Índices (funcionan perfecto sin PostGIS)
-CREATE INDEX idx_medicion_timestamp ON medicion(timestamp);
-CREATE INDEX idx_medicion_sensor ON medicion(sensor_id);
-CREATE INDEX idx_sensor_time ON medicion(sensor_id, timestamp);
+-- (sensor_id, timestamp) ya lo cubre la PRIMARY KEY; por tiempo alcanza con BRIN
+CREATE INDEX idx_medicion_timestamp_brin ON medicion USING brin (timestamp) WITH (pages_per_range = 32, autosummarize = on);
+CREATE INDEX idx_medicion_id_brin ON medicion USING brin (medicion_id) WITH (autosummarize = on);
+CREATE INDEX idx_validacion_medicion ON validacion(medicion_id);
+
+-- Registro de archivos cargados (src/ledger.py): permite saltar archivos ya
+-- cargados y retomar uno a medias desde la última fila confirmada
+CREATE TABLE ingesta_archivo (
+    hash_contenido TEXT PRIMARY KEY,     -- sha256 del archivo
+    archivo TEXT NOT NULL,
+    tamano_bytes BIGINT NOT NULL,
+    filas_confirmadas BIGINT NOT NULL DEFAULT 0,
+    completo BOOLEAN NOT NULL DEFAULT false,
+    inicio TIMESTAMPTZ DEFAULT now(),
+    actualizado TIMESTAMPTZ DEFAULT now()
+);
+
+-- CSV originales para raw_payload 'reference' (src/raw_payload.py): cada medición
+-- guarda sólo (raw_archivo_id, raw_fila). Bases anteriores: migraciones/004_raw_payload.sql
+CREATE TABLE archivo_crudo (
+    archivo_id SERIAL PRIMARY KEY,
+    hash_contenido TEXT UNIQUE NOT NULL, -- sha256 del archivo (el mismo de ingesta_archivo)
+    archivo TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    encabezado BYTEA NOT NULL            -- línea de encabezado (se antepone a cada bloque al leerlo)
+);
+-- el contenido, en bloques de filas comprimidos con gzip por separado
+CREATE TABLE archivo_crudo_bloque (
+    archivo_id INTEGER NOT NULL REFERENCES archivo_crudo ON DELETE CASCADE,
+    fila_desde BIGINT NOT NULL,          -- filas de datos [fila_desde, fila_hasta)
+    fila_hasta BIGINT NOT NULL,
+    contenido BYTEA NOT NULL,
+    PRIMARY KEY (archivo_id, fila_desde)
+);
+-- ya viene comprimido: sin segunda compresión TOAST
+ALTER TABLE archivo_crudo_bloque ALTER COLUMN contenido SET STORAGE EXTERNAL;
+
+-- Agregados por sensor y hora / día (src/rollups.py los mantiene al cargar).
+-- Por variable: cantidad de valores no nulos, suma, mínimo y máximo; la media es _sum / _n.
+-- Bases anteriores: migraciones/002_rollups.sql (crea y rellena)
+CREATE TABLE medicion_hora (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,         -- inicio del bucket (UTC)
+    n INTEGER NOT NULL,                  -- filas de medicion en el bucket
+    temperatura_n INTEGER, temperatura_sum DOUBLE PRECISION, temperatura_min DOUBLE PRECISION, temperatura_max DOUBLE PRECISION,
+    humedad_n INTEGER, humedad_sum DOUBLE PRECISION, humedad_min DOUBLE PRECISION, humedad_max DOUBLE PRECISION,
+    presion_n INTEGER, presion_sum DOUBLE PRECISION, presion_min DOUBLE PRECISION, presion_max DOUBLE PRECISION,
+    radiacion_solar_n INTEGER, radiacion_solar_sum DOUBLE PRECISION, radiacion_solar_min DOUBLE PRECISION, radiacion_solar_max DOUBLE PRECISION,
+    velocidad_viento_n INTEGER, velocidad_viento_sum DOUBLE PRECISION, velocidad_viento_min DOUBLE PRECISION, velocidad_viento_max DOUBLE PRECISION,
+    PRIMARY KEY (sensor_id, bucket)
+);
+
+CREATE TABLE medicion_dia (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,         -- inicio del bucket (UTC)
+    n INTEGER NOT NULL,                  -- filas de medicion en el bucket
+    temperatura_n INTEGER, temperatura_sum DOUBLE PRECISION, temperatura_min DOUBLE PRECISION, temperatura_max DOUBLE PRECISION,
+    humedad_n INTEGER, humedad_sum DOUBLE PRECISION, humedad_min DOUBLE PRECISION, humedad_max DOUBLE PRECISION,
+    presion_n INTEGER, presion_sum DOUBLE PRECISION, presion_min DOUBLE PRECISION, presion_max DOUBLE PRECISION,
+    radiacion_solar_n INTEGER, radiacion_solar_sum DOUBLE PRECISION, radiacion_solar_min DOUBLE PRECISION, radiacion_solar_max DOUBLE PRECISION,
+    velocidad_viento_n INTEGER, velocidad_viento_sum DOUBLE PRECISION, velocidad_viento_min DOUBLE PRECISION, velocidad_viento_max DOUBLE PRECISION,
+    PRIMARY KEY (sensor_id, bucket)
+);
 
 SELECT '¡BASE DE DATOS CREADA SIN ERRORES - LISTA PARA TU TESIS!' AS estado;
 
@@ -64,13 +137,14 @@ CREATE TABLE IF NOT EXISTS variable_sinonimo (
   ejemplo TEXT
 );
 
-INSERT INTO variable (nombre_estandar, unidad_estandar, rango_minimo, rango_maximo, descripcion)
+INSERT INTO variable (nombre_estandar, unidad_estandar, rango_minimo, rango_maximo, descripcion,
+                      cambio_maximo, salto_maximo, tasa_maxima, plano_minutos)
 VALUES
-('temperatura','degC',-60,60,'Temperatura del aire'),
-('humedad','percent',0,100,'Humedad relativa'),
-('presion','hPa',300,1100,'Presion atmosferica'),
-('radiacion_solar','W/m2',0,2000,'Radiacion solar'),
-('velocidad_viento','m/s',0,100,'Velocidad del viento')
+('temperatura','degC',-60,60,'Temperatura del aire',10,5,10,180),
+('humedad','percent',0,100,'Humedad relativa',30,20,40,720),
+('presion','hPa',300,1100,'Presion atmosferica',NULL,3,6,720),
+('radiacion_solar','W/m2',0,2000,'Radiacion solar',NULL,NULL,NULL,NULL),
+('velocidad_viento','m/s',0,100,'Velocidad del viento',NULL,15,NULL,360)
 ON CONFLICT (nombre_estandar) DO NOTHING;
 
 INSERT INTO variable_sinonimo (nombre_sinonimo, nombre_estandar, ejemplo)
@@ -86,3 +160,17 @@ VALUES
 ('pressure','presion','100870');
 
 
+-- columnas que usa src/db.py (para bases creadas con una versión anterior de este script)
+ALTER TABLE medicion ADD COLUMN IF NOT EXISTS procedure_version TEXT;
+ALTER TABLE medicion ADD COLUMN IF NOT EXISTS raw_payload JSONB;
+ALTER TABLE medicion ADD COLUMN IF NOT EXISTS ingest_ts TIMESTAMPTZ DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_validacion_medicion ON validacion(medicion_id);
+CREATE TABLE IF NOT EXISTS ingesta_archivo (
+    hash_contenido TEXT PRIMARY KEY,
+    archivo TEXT NOT NULL,
+    tamano_bytes BIGINT NOT NULL,
+    filas_confirmadas BIGINT NOT NULL DEFAULT 0,
+    completo BOOLEAN NOT NULL DEFAULT false,
+    inicio TIMESTAMPTZ DEFAULT now(),
+    actualizado TIMESTAMPTZ DEFAULT now()
+);
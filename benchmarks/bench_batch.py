@@ -0,0 +1,54 @@
+# benchmarks/bench_batch.py
+# Ejecuta: python -m benchmarks.bench_batch --rows 1000000
+# Memoria retenida (tracemalloc) por millón de mediciones: dicts por fila
+# (records_from_frame con raw, como el camino fila a fila), DataFrame de
+# normalize_frame (validation_flags como tuplas) y MeasurementBatch.
+# El camino de dicts se mide sobre --dict-sample filas y se extrapola.
+import argparse
+import gc
+import tracemalloc
+import numpy as np
+from benchmarks.bench_normalize import synthetic_frame
+from src.normalize import normalize_batch, normalize_frame, records_from_frame
+
+def measure(build):
+    """(objeto, bytes retenidos, pico de bytes) de construir build()."""
+    gc.collect()
+    tracemalloc.start()
+    out = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, current, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--dict-sample', type=int, default=100000, help='filas medidas en el camino de dicts')
+    args = parser.parse_args()
+    df = synthetic_frame(args.rows)
+    # rango roto en ~1% de las filas, para que haya flags
+    df.loc[np.random.default_rng(1).random(args.rows) < 0.01, 'rad'] = 5000.0
+    sample = df.iloc[:args.dict_sample]
+    sample_norm = normalize_batch(sample)
+
+    results = []
+    records, current, peak = measure(lambda: list(records_from_frame(sample_norm, sample)))
+    scale = args.rows / len(sample)
+    results.append(('dicts por fila', current * scale, peak * scale, True))
+    del records
+    norm, current, peak = measure(lambda: normalize_frame(df))
+    results.append(('normalize_frame', current, peak, False))
+    del norm
+    batch, current, peak = measure(lambda: normalize_batch(df))
+    results.append(('MeasurementBatch', current, peak, False))
+
+    print(f"{args.rows} filas, {len(batch.flag_row)} flags; dicts: {len(sample)} filas extrapoladas")
+    print(f"{'formato':18s} {'retenido MB':>12s} {'B/medicion':>11s} {'pico MB':>9s}")
+    for name, current, peak, extrapolated in results:
+        mark = '*' if extrapolated else ' '
+        print(f"{name:18s} {current / 1e6:>11.1f}{mark} {current / args.rows:>11.1f} {peak / 1e6:>9.1f}")
+    print(f"MeasurementBatch.nbytes: {batch.nbytes / 1e6:.1f} MB ({batch.nbytes / args.rows:.1f} B por medición)")
+
+if __name__ == "__main__":
+    main()
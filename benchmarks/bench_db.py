@@ -0,0 +1,56 @@
+# benchmarks/bench_db.py
+# Ejecuta: python -m benchmarks.bench_db --rows 20000
+# Requiere una PostgreSQL local con el esquema de Codigo_sql_tesis_pid.sql (usa src.config.DB).
+# Mide filas/s de insert_medicion (fila a fila) contra insert_mediciones_bulk (COPY por lotes).
+import argparse
+import time
+from src.config import DB
+from src.db import get_conn, insert_medicion_rows, insert_mediciones_bulk
+from src.normalize import normalize_frame, records_from_frame
+from benchmarks.bench_normalize import synthetic_frame
+
+def cleanup(conn, prefix):
+    conn.rollback()
+    with conn.cursor() as cur:
+        like = prefix + '%'
+        cur.execute("DELETE FROM validacion WHERE medicion_id IN (SELECT medicion_id FROM medicion WHERE sensor_id LIKE %s)", (like,))
+        cur.execute("DELETE FROM medicion WHERE sensor_id LIKE %s", (like,))
+        cur.execute("DELETE FROM sensor WHERE sensor_id LIKE %s", (like,))
+    conn.commit()
+
+def frame_for(prefix, n_rows):
+    df = synthetic_frame(n_rows)
+    df['sensor_id'] = prefix + df['sensor_id']
+    return df
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000, help='filas para el modo bulk')
+    parser.add_argument('--rows-row', type=int, default=2000, help='filas para el modo fila a fila')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    conn = get_conn(DB)
+    try:
+        cleanup(conn, 'bench_')
+
+        df = frame_for('bench_row_', args.rows_row)
+        norm = normalize_frame(df)
+        t0 = time.perf_counter()
+        insert_medicion_rows(conn, ((int(pos), m) for pos, m in zip(norm.index, records_from_frame(norm, df))),
+                             procedure_version='bench')
+        t_row = time.perf_counter() - t0
+
+        df = frame_for('bench_bulk_', args.rows)
+        norm = normalize_frame(df)
+        t0 = time.perf_counter()
+        insert_mediciones_bulk(conn, norm, df, procedure_version='bench', batch_size=args.batch_size)
+        t_bulk = time.perf_counter() - t0
+
+        print(f"fila a fila: {args.rows_row} filas en {t_row:.2f} s -> {args.rows_row / t_row:,.0f} filas/s")
+        print(f"bulk:        {args.rows} filas en {t_bulk:.2f} s -> {args.rows / t_bulk:,.0f} filas/s (lotes de {args.batch_size})")
+    finally:
+        cleanup(conn, 'bench_')
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/bench_normalize.py
+# Ejecuta: python -m benchmarks.bench_normalize --rows 100000
+# Compara normalize_row (fila a fila, como run_batch antes) contra normalize_frame.
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.ingest import rows_from_df
+from src.normalize import normalize_row, normalize_frame, records_from_frame
+
+def synthetic_frame(n_rows, n_sensors=20, seed=0, start='2025-01-01T00:00:00Z'):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    seconds = np.arange(n_rows) * 60
+    day = np.sin(2 * np.pi * seconds / 86400)
+    df = pd.DataFrame({
+        'sensor_id': [f's{i}' for i in rng.integers(0, n_sensors, n_rows)],
+        'time': (start + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'temp_f': np.round(70 + 15 * day + rng.normal(0, 1, n_rows), 1),
+        'hum': np.round(np.clip(0.6 - 0.2 * day + rng.normal(0, 0.02, n_rows), 0, 1), 2),
+        'p': np.round(rng.normal(101000, 3000, n_rows), 0),
+        'rad': np.round(rng.uniform(-10, 2100, n_rows), 1),
+    })
+    # huecos como en las descargas reales
+    df.loc[rng.random(n_rows) < 0.05, 'hum'] = np.nan
+    return df
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+    df = synthetic_frame(args.rows)
+
+    t0 = time.perf_counter()
+    by_row = [normalize_row(raw) for raw in rows_from_df(df)]
+    t_row = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    norm = normalize_frame(df)
+    t_frame = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    by_frame = list(records_from_frame(norm, df))
+    t_records = time.perf_counter() - t0
+
+    keys = ['sensor_id', 'timestamp', 'temperatura', 'humedad', 'presion',
+            'radiacion_solar', 'velocidad_viento', 'validation_flags']
+    same = all(all(a[k] == b[k] for k in keys) for a, b in zip(by_row, by_frame))
+
+    print(f"filas:            {args.rows}")
+    print(f"normalize_row:    {t_row:.3f} s ({args.rows / t_row:,.0f} filas/s)")
+    print(f"normalize_frame:  {t_frame:.3f} s ({args.rows / t_frame:,.0f} filas/s)")
+    print(f"  + records:      {t_records:.3f} s")
+    print(f"speedup:          {t_row / t_frame:.1f}x")
+    print(f"resultado igual:  {same}")
+
+if __name__ == "__main__":
+    main()
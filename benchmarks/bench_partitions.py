@@ -0,0 +1,152 @@
+# benchmarks/bench_partitions.py
+# Ejecuta: python -m benchmarks.bench_partitions --rows 300000
+# Requiere una PostgreSQL local (usa src.config.DB). Crea dos esquemas de prueba
+# con medicion antes (heap + 4 B-tree) y después (particionada por mes + BRIN)
+# de migraciones/001_medicion_particionada.sql, carga los mismos datos con
+# insert_mediciones_bulk (vía search_path) y mide filas/s y latencia de consultas
+# por rango de tiempo. Los esquemas se borran al terminar.
+import argparse
+import statistics
+import time
+import pandas as pd
+from src.config import DB
+import src.db as db
+from src.normalize import normalize_frame
+from src.partitions import PARTITIONS
+from src.rollups import ROLLUPS
+from src.raw_payload import RAW_REFS
+from src.sensor_state import SENSOR_STATE
+from benchmarks.bench_normalize import synthetic_frame
+
+COMMON_DDL = """
+CREATE TABLE sensor (sensor_id TEXT PRIMARY KEY, nombre TEXT NOT NULL, modelo TEXT, fabricante TEXT);
+CREATE TABLE validacion (validacion_id BIGSERIAL PRIMARY KEY, medicion_id BIGINT, tipo_flag TEXT, descripcion_problema TEXT);
+CREATE INDEX ON validacion(medicion_id);
+"""
+
+COLUMNS = """
+    sensor_id TEXT {null} REFERENCES sensor(sensor_id),
+    timestamp TIMESTAMPTZ NOT NULL,
+    temperatura DOUBLE PRECISION, humedad DOUBLE PRECISION, presion DOUBLE PRECISION,
+    radiacion_solar DOUBLE PRECISION, velocidad_viento DOUBLE PRECISION,
+    procedure_version TEXT, raw_payload JSONB, ingest_ts TIMESTAMPTZ DEFAULT now(),
+"""
+
+LAYOUTS = {
+    'heap': """
+CREATE TABLE medicion (
+    medicion_id BIGSERIAL PRIMARY KEY,""" + COLUMNS.format(null='') + """
+    UNIQUE(sensor_id, timestamp)
+);
+CREATE INDEX ON medicion(timestamp);
+CREATE INDEX ON medicion(sensor_id);
+CREATE INDEX ON medicion(sensor_id, timestamp);
+""",
+    'particionada': """
+CREATE TABLE medicion (
+    medicion_id BIGSERIAL,""" + COLUMNS.format(null='NOT NULL') + """
+    PRIMARY KEY (sensor_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE INDEX ON medicion USING brin (timestamp) WITH (pages_per_range = 32, autosummarize = on);
+CREATE INDEX ON medicion USING brin (medicion_id) WITH (autosummarize = on);
+CREATE TABLE medicion_default PARTITION OF medicion DEFAULT;
+""",
+}
+
+QUERIES = {
+    'agregado 1 dia': ("SELECT sensor_id, avg(temperatura), count(*) FROM medicion "
+                       "WHERE timestamp >= %(t)s AND timestamp < %(t)s::timestamptz + interval '1 day' GROUP BY sensor_id"),
+    'agregado 1 mes': ("SELECT sensor_id, avg(temperatura), count(*) FROM medicion "
+                       "WHERE timestamp >= %(t)s AND timestamp < %(t)s::timestamptz + interval '1 month' GROUP BY sensor_id"),
+    'serie sensor 1 semana': ("SELECT timestamp, temperatura FROM medicion WHERE sensor_id = %(s)s "
+                              "AND timestamp >= %(t)s AND timestamp < %(t)s::timestamptz + interval '7 days' ORDER BY timestamp"),
+    'ultima lectura previa': ("SELECT timestamp, temperatura FROM medicion WHERE sensor_id = %(s)s "
+                              "AND timestamp < %(t)s ORDER BY timestamp DESC LIMIT 1"),
+}
+
+def reset_caches():
+    db.KNOWN_SENSORS.clear()
+    SENSOR_STATE.clear()
+    PARTITIONS.clear()
+    ROLLUPS.clear()
+    RAW_REFS.clear()
+
+def setup(conn, schema, layout):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}; SET search_path TO {schema}")
+        cur.execute(COMMON_DDL + LAYOUTS[layout])
+    conn.commit()
+    reset_caches()
+
+def load(conn, df, batch_size):
+    norm = normalize_frame(df)
+    t0 = time.perf_counter()
+    db.insert_mediciones_bulk(conn, norm, df, procedure_version='bench', batch_size=batch_size)
+    return len(df) / (time.perf_counter() - t0)
+
+def time_queries(conn, params, repeat):
+    out = {}
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        # lo que haría autovacuum: estadísticas y resumen BRIN de los rangos nuevos
+        cur.execute("VACUUM ANALYZE medicion")
+    conn.autocommit = False
+    with conn.cursor() as cur:
+        for name, q in QUERIES.items():
+            runs = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                cur.execute(q, params)
+                cur.fetchall()
+                runs.append((time.perf_counter() - t0) * 1000)
+            out[name] = statistics.median(runs)
+    conn.commit()
+    return out
+
+def index_mb(conn, schema):
+    with conn.cursor() as cur:
+        cur.execute("SELECT coalesce(sum(pg_indexes_size(c.oid)), 0) / 1048576.0 FROM pg_class c "
+                    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE n.nspname = %s AND c.relkind = 'r' AND c.relname LIKE 'medicion%%'", (schema,))
+        return float(cur.fetchone()[0])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=300000, help='filas de la carga inicial (una por minuto)')
+    parser.add_argument('--rows-extra', type=int, default=20000, help='filas cargadas después sobre la tabla llena')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=7, help='repeticiones por consulta (se informa la mediana)')
+    args = parser.parse_args()
+    df = synthetic_frame(args.rows)
+    extra = synthetic_frame(args.rows_extra, seed=1,
+                            start=(pd.Timestamp('2025-01-01T00:00:00Z') + pd.Timedelta(minutes=args.rows)).isoformat())
+    mid = pd.Timestamp('2025-01-01T00:00:00Z') + pd.Timedelta(minutes=args.rows // 2)
+    params = {'t': mid.to_pydatetime(), 's': 's3'}
+
+    conn = db.get_conn(DB)
+    results = {}
+    try:
+        for layout in LAYOUTS:
+            schema = f"bench_{layout}"
+            setup(conn, schema, layout)
+            initial = load(conn, df, args.batch_size)
+            incremental = load(conn, extra, args.batch_size)
+            results[layout] = {'carga inicial filas/s': initial, 'carga sobre tabla llena filas/s': incremental,
+                               'indices MB': index_mb(conn, schema)}
+            results[layout].update({f"{k} ms": v for k, v in time_queries(conn, params, args.repeat).items()})
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("DROP SCHEMA IF EXISTS bench_heap CASCADE; DROP SCHEMA IF EXISTS bench_particionada CASCADE")
+        conn.commit()
+        conn.close()
+        reset_caches()
+
+    print(f"{args.rows} filas iniciales + {args.rows_extra} extra")
+    print(f"{'':34s} {'heap':>12s} {'particionada':>14s}")
+    for metric in results['heap']:
+        print(f"{metric:34s} {results['heap'][metric]:>12,.2f} {results['particionada'][metric]:>14,.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/bench_raw_payload.py
+# Ejecuta: python -m benchmarks.bench_raw_payload --rows 100000
+# Requiere una PostgreSQL local con el esquema al día (migraciones/004_raw_payload.sql
+# para el modo reference; usa src.config.DB). Carga el mismo CSV (con columnas
+# extra que no son variables: lat, lon, bateria, estado) con cada modo de
+# raw_payload y mide filas/s, bytes por fila en medicion (pg_column_size de la
+# fila y de raw_payload), bytes de archivo_crudo y WAL generado por fila.
+import argparse
+import time
+import numpy as np
+from src.config import DB
+from src.db import get_conn
+from src.loader import ingest_file
+from src.raw_payload import MODES
+from benchmarks.bench_normalize import synthetic_frame
+
+PREFIX = 'bench_raw_'
+
+def cleanup(conn):
+    conn.rollback()
+    with conn.cursor() as cur:
+        like = PREFIX + '%'
+        cur.execute("DELETE FROM validacion WHERE medicion_id IN (SELECT medicion_id FROM medicion WHERE sensor_id LIKE %s)", (like,))
+        cur.execute("DELETE FROM medicion WHERE sensor_id LIKE %s", (like,))
+        for table in ('medicion_hora', 'medicion_dia'):
+            cur.execute(f"DELETE FROM {table} WHERE sensor_id LIKE %s", (like,))
+        cur.execute("DELETE FROM sensor WHERE sensor_id LIKE %s", (like,))
+        cur.execute("DELETE FROM archivo_crudo WHERE hash_contenido IN "
+                    "(SELECT hash_contenido FROM ingesta_archivo WHERE archivo LIKE %s)", ('%' + like,))
+        cur.execute("DELETE FROM ingesta_archivo WHERE archivo LIKE %s", ('%' + like,))
+    conn.commit()
+
+def write_csv(path, mode, n_rows):
+    df = synthetic_frame(n_rows)
+    rng = np.random.default_rng(1)
+    df['sensor_id'] = PREFIX + mode + '_' + df['sensor_id']
+    df['lat'] = -12.05
+    df['lon'] = -77.04
+    df['bateria'] = np.round(rng.uniform(3.5, 4.2, n_rows), 2)
+    df['estado'] = 'ok'
+    df.to_csv(path, index=False)
+
+def sizes(conn, mode):
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*), avg(pg_column_size(m.*)), avg(coalesce(pg_column_size(raw_payload), 0)) "
+                    "FROM medicion m WHERE sensor_id LIKE %s", (f'{PREFIX}{mode}_%',))
+        n, row_bytes, raw_bytes = cur.fetchone()
+        cur.execute("SELECT coalesce(sum(octet_length(b.contenido)), 0) FROM archivo_crudo_bloque b "
+                    "JOIN archivo_crudo a USING (archivo_id) JOIN ingesta_archivo i USING (hash_contenido) "
+                    "WHERE i.archivo LIKE %s", (f'%{PREFIX}{mode}%',))
+        file_bytes = cur.fetchone()[0]
+    conn.rollback()
+    return n, float(row_bytes), float(raw_bytes), file_bytes
+
+def wal_lsn(conn):
+    # tras un CHECKPOINT todos los modos pagan igual las páginas completas en el WAL
+    with conn.cursor() as cur:
+        try:
+            cur.execute("CHECKPOINT")
+        except Exception:
+            conn.rollback()     # sin permiso: el WAL por fila queda más ruidoso
+        cur.execute("SELECT pg_current_wal_lsn()")
+        lsn = cur.fetchone()[0]
+    conn.rollback()
+    return lsn
+
+def wal_since(conn, lsn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", (lsn,))
+        n = cur.fetchone()[0]
+    conn.rollback()
+    return float(n)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--mode', default='bulk', choices=['bulk', 'row'], help='modo de inserción')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--dir', default='/tmp', help='directorio para los CSV de prueba')
+    args = parser.parse_args()
+    conn = get_conn(DB)
+    results = []
+    try:
+        cleanup(conn)
+        # calentamiento (particiones, caches de sensores, planes): no se mide
+        path = f"{args.dir}/{PREFIX}warmup.csv"
+        write_csv(path, 'warmup', min(args.rows, 5000))
+        ingest_file(conn, path, mode=args.mode, batch_size=args.batch_size, pipeline='sequential',
+                    resume=False, raw_payload='none')
+        for mode in MODES:
+            path = f"{args.dir}/{PREFIX}{mode}.csv"
+            write_csv(path, mode, args.rows)
+            lsn = wal_lsn(conn)
+            t0 = time.perf_counter()
+            ingest_file(conn, path, mode=args.mode, batch_size=args.batch_size, pipeline='sequential',
+                        resume=False, raw_payload=mode)
+            elapsed = time.perf_counter() - t0
+            wal = wal_since(conn, lsn)
+            n, row_bytes, raw_bytes, file_bytes = sizes(conn, mode)
+            results.append((mode, n / elapsed, row_bytes, raw_bytes, file_bytes / n, wal / n))
+    finally:
+        cleanup(conn)
+        conn.close()
+    print(f"{args.rows} filas, modo {args.mode}")
+    print(f"{'raw_payload':12s} {'filas/s':>9s} {'B/fila':>7s} {'raw B':>6s} {'archivo B':>10s} {'WAL B/fila':>11s}")
+    for mode, rate, row_bytes, raw_bytes, file_bytes, wal in results:
+        print(f"{mode:12s} {rate:>9,.0f} {row_bytes:>7.0f} {raw_bytes:>6.0f} {file_bytes:>10.1f} {wal:>11.0f}")
+
+if __name__ == "__main__":
+    main()
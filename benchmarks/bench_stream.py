@@ -0,0 +1,71 @@
+# benchmarks/bench_stream.py
+# Ejecuta: python -m benchmarks.bench_stream --rows 2000000 [--db]
+# Compara el pico de memoria (RSS) de leer+normalizar el CSV completo contra
+# la lectura por chunks; con --db además escribe en modo bulk y mide cuánto
+# tarda en quedar escrito el primer chunk (en modo full: el archivo entero).
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from src.ingest import read_csv, iter_csv
+from src.normalize import normalize_frame
+from benchmarks.bench_normalize import synthetic_frame
+
+def write_big_csv(path, n_rows, block=200000):
+    for i, start in enumerate(range(0, n_rows, block)):
+        df = synthetic_frame(min(block, n_rows - start), seed=i,
+                             start=pd.Timestamp('2020-01-01T00:00:00Z') + pd.Timedelta(minutes=start))
+        df.to_csv(path, mode='a', header=(i == 0), index=False)
+
+def run_worker(mode, path, chunk_rows, use_db):
+    t0 = time.perf_counter()
+    first_write = None
+    rows = 0
+    if use_db:
+        from src.config import DB
+        from src.db import get_conn, insert_mediciones_bulk
+        conn = get_conn(DB)
+    frames = [read_csv(path)] if mode == 'full' else iter_csv(path, chunksize=chunk_rows)
+    for df in frames:
+        df['sensor_id'] = 'bench_' + df['sensor_id']
+        norm = normalize_frame(df)
+        rows += len(norm)
+        if use_db:
+            insert_mediciones_bulk(conn, norm, df, procedure_version='bench')
+            first_write = first_write or time.perf_counter() - t0
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    extra = f", primer chunk escrito a los {first_write:.2f} s" if first_write else ""
+    print(f"{mode:6s}: {rows} filas en {elapsed:.2f} s, pico RSS {peak_mb:,.0f} MB{extra}")
+    if use_db:
+        from benchmarks.bench_db import cleanup
+        cleanup(conn, 'bench_')
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--db', action='store_true', help='escribir también en la base (modo bulk)')
+    parser.add_argument('--worker', nargs=2, metavar=('MODO', 'CSV'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.chunk_rows, args.db)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'big.csv')
+        write_big_csv(path, args.rows)
+        print(f"CSV: {args.rows} filas, {os.path.getsize(path) / 2**20:,.0f} MB")
+        for mode in ('full', 'stream'):
+            # cada modo en un proceso aparte para medir su pico de memoria
+            cmd = [sys.executable, '-m', 'benchmarks.bench_stream', '--worker', mode, path,
+                   '--chunk-rows', str(args.chunk_rows)] + (['--db'] if args.db else [])
+            subprocess.run(cmd, check=True)
+
+if __name__ == "__main__":
+    main()
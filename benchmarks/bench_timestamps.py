@@ -0,0 +1,85 @@
+# benchmarks/bench_timestamps.py
+# Ejecuta: python -m benchmarks.bench_timestamps --rows 1000000
+# Compara el parseo de timestamps anterior (pd.to_datetime sin formato por
+# columna, reintento 'mixed' y now() para lo ilegible; y por fila con
+# parse_timestamp) contra TimestampParser (formato inferido una vez por archivo),
+# para varios formatos de entrada. El camino por fila se mide sobre --row-sample
+# filas y se extrapola.
+import argparse
+import time
+import warnings
+from datetime import timezone
+import numpy as np
+import pandas as pd
+from src.timestamps import TimestampParser
+
+def old_frame(df, columns=('time',)):
+    # normalize.parse_timestamps / _to_datetime_column antes de src.timestamps
+    ts = np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+    pending = np.ones(len(df), dtype=bool)
+    for k in columns:
+        mask = pending & df[k].notna().to_numpy()
+        values = df[k][mask]
+        parsed = pd.to_datetime(values, utc=True, errors='coerce').dt.as_unit('ns')
+        retry = parsed.isna().to_numpy()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(values[retry], utc=True, errors='coerce', format='mixed').dt.as_unit('ns')
+        ok = parsed.notna().to_numpy()
+        rows = np.flatnonzero(mask)[ok]
+        ts[rows] = parsed[ok].dt.tz_localize(None).to_numpy()
+        pending[rows] = False
+    if pending.any():
+        ts[pending] = pd.Timestamp.now(tz=timezone.utc).tz_localize(None).to_datetime64()
+    return pd.Series(ts, index=df.index).dt.tz_localize('UTC')
+
+def old_row(value):
+    # normalize.parse_timestamp antes de src.timestamps (una columna)
+    try:
+        return pd.to_datetime(value, utc=True)
+    except Exception:
+        return pd.Timestamp.now(tz=timezone.utc)
+
+FORMATS = {
+    'iso Z': lambda t: t.strftime('%Y-%m-%dT%H:%M:%SZ'),
+    'iso offset': lambda t: t.tz_convert('America/Lima').strftime('%Y-%m-%dT%H:%M:%S%z'),
+    'dd/mm/aaaa hh:mm': lambda t: t.strftime('%d/%m/%Y %H:%M'),
+    'epoch s': lambda t: pd.Series((t - pd.Timestamp(0, tz='UTC')) // pd.Timedelta('1s')),
+    'epoch ms': lambda t: pd.Series((t - pd.Timestamp(0, tz='UTC')) // pd.Timedelta('1ms')),
+}
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--row-sample', type=int, default=20000, help='filas medidas en el camino fila a fila')
+    parser.add_argument('--invalid', type=float, default=0.001, help='fracción de celdas ilegibles')
+    args = parser.parse_args()
+    # el camino anterior avisa en cada dd/mm ambiguo; el aviso no es parte de lo medido
+    warnings.simplefilter('ignore', UserWarning)
+    rng = np.random.default_rng(0)
+    truth = pd.date_range('2025-01-01T00:00:00Z', periods=args.rows, freq='min')
+    bad = rng.random(args.rows) < args.invalid
+
+    print(f"{args.rows} filas, {bad.sum()} ilegibles; por fila: {args.row_sample} filas extrapoladas")
+    print(f"{'formato':18s} {'por fila s':>11s} {'columna s':>10s} {'nuevo s':>8s} {'x col':>6s} {'ok antes':>9s} {'ok nuevo':>9s} {'NaT':>6s}")
+    for name, fmt in FORMATS.items():
+        values = pd.Series(fmt(truth)).astype(object)
+        values[bad] = 'sin dato'
+        df = pd.DataFrame({'time': values})
+        sample = df['time'].iloc[:args.row_sample].tolist()
+        t_row, _ = timed(lambda: [old_row(v) for v in sample])
+        t_row *= args.rows / len(sample)
+        t_old, old = timed(old_frame, df)
+        t_new, new = timed(TimestampParser().parse, df)
+        expect = pd.Series(truth, index=df.index).where(~bad)
+        ok_old = (old == expect).sum() / (~bad).sum()
+        ok_new = (new == expect).sum() / (~bad).sum()
+        print(f"{name:18s} {t_row:>11.1f} {t_old:>10.2f} {t_new:>8.2f} {t_old / t_new:>6.1f} "
+              f"{ok_old:>9.1%} {ok_new:>9.1%} {new.isna().sum():>6d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/generator.py
+# Datos sintéticos de estaciones para benchmarks y pruebas, reproducibles por seed.
+#   python -m benchmarks.generator data/sintetico.csv --rows 100000 --sensors 50 --synonyms 2 --unit-mix 0.5
+# Se controla: cantidad de sensores y filas, cuántos sinónimos de columna por
+# variable (cada sensor escribe su variable en una sola de esas columnas, como
+# al juntar descargas de estaciones distintas), la mezcla de unidades (°F en vez
+# de °C, humedad como fracción en vez de %), la fracción de celdas vacías y la
+# de filas con un valor fuera de rango.
+import argparse
+import numpy as np
+import pandas as pd
+
+# sinónimos por variable (ver dictionary.LOCAL_MAP), el primero es el de la unidad estándar
+SYNONYMS = {
+    'temperatura': ['temp', 'temperature', 't'],
+    'humedad': ['hum', 'humidity', 'h'],
+    'presion': ['p', 'pressure', 'pa'],
+    'radiacion_solar': ['rad', 'radiacion'],
+    'velocidad_viento': ['wind', 'wind_speed'],
+}
+# columna de la unidad alternativa (unit_mix)
+ALT_UNIT_COLUMN = {'temperatura': 'temp_f'}
+# valores fuera de los límites de LOCAL_LIMITS, por variable
+OUT_OF_RANGE = {'temperatura': 85.0, 'humedad': 130.0, 'presion': 250.0, 'radiacion_solar': 2500.0,
+                'velocidad_viento': 140.0}
+TIMESTAMP_FORMATS = {'iso': '%Y-%m-%dT%H:%M:%SZ', 'dmy': '%d/%m/%Y %H:%M:%S'}
+
+def _series(rng, n_rows, seconds):
+    """Valores en unidad estándar con ciclo diario."""
+    day = np.sin(2 * np.pi * seconds / 86400)
+    return {
+        'temperatura': np.round(20 + 8 * day + rng.normal(0, 1, n_rows), 1),
+        'humedad': np.round(np.clip(60 - 20 * day + rng.normal(0, 2, n_rows), 0, 100), 1),
+        'presion': np.round(rng.normal(1010, 5, n_rows), 1),
+        'radiacion_solar': np.round(np.clip(900 * day, 0, None) + rng.uniform(0, 20, n_rows), 1),
+        'velocidad_viento': np.round(np.abs(rng.normal(4, 2, n_rows)), 1),
+    }
+
+def station_frame(n_rows, n_sensors=20, synonyms=1, unit_mix=0.0, missing=0.05, out_of_range=0.0,
+                  seed=0, start='2025-01-01T00:00:00Z', step_s=60, timestamp_format='iso'):
+    """
+    DataFrame crudo como los CSV de las estaciones: sensor_id, time y una o más
+    columnas por variable (la presión siempre en Pa, como la leen sus sinónimos).
+    synonyms: columnas por variable (1..len(SYNONYMS[var])); cada sensor usa una.
+    unit_mix: fracción de sensores en unidades alternativas (temperatura en
+      temp_f, humedad como fracción 0-1).
+    missing: fracción de celdas de variables vacías.
+    out_of_range: fracción de filas con una variable fuera de rango.
+    timestamp_format: 'iso', 'dmy' o 'epoch' (segundos).
+    """
+    rng = np.random.default_rng(seed)
+    sensor = rng.integers(0, n_sensors, n_rows)
+    row_alt = (rng.random(n_sensors) < unit_mix)[sensor]
+    seconds = np.arange(n_rows, dtype=np.int64) * step_s
+    times = pd.Timestamp(start) + pd.to_timedelta(seconds, unit='s')
+    if timestamp_format == 'epoch':
+        time_col = times.as_unit('s').asi8
+    else:
+        time_col = times.strftime(TIMESTAMP_FORMATS[timestamp_format])
+    sensor_ids = np.array([f's{i}' for i in range(n_sensors)], dtype=object)
+    df = pd.DataFrame({'sensor_id': sensor_ids[sensor], 'time': time_col})
+
+    values = _series(rng, n_rows, seconds)
+    bad_var = np.where(rng.random(n_rows) < out_of_range, rng.integers(0, len(values), n_rows), -1)
+    for j, (var, v) in enumerate(values.items()):
+        bad = bad_var == j
+        v[bad] = OUT_OF_RANGE[var]
+        v[rng.random(n_rows) < missing] = np.nan
+        if var == 'presion':
+            v = np.round(v * 100, 0)
+        elif var == 'humedad':
+            # el valor fuera de rango queda en %: como fracción (1.3) se leería como 1.3 % y no se marcaría
+            v = np.where(row_alt & ~bad, np.round(v / 100, 3), v)
+        columns = SYNONYMS[var][:max(1, min(synonyms, len(SYNONYMS[var])))]
+        # columna fija por sensor, repartida entre los sinónimos
+        target = np.array(columns, dtype=object)[sensor % len(columns)]
+        if var in ALT_UNIT_COLUMN:
+            target = np.where(row_alt, ALT_UNIT_COLUMN[var], target)
+            v = np.where(row_alt, np.round(v * 9 / 5 + 32, 1), v)
+        for col in dict.fromkeys(target.tolist()):
+            df[col] = np.where(target == col, v, np.nan)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.generator')
+    parser.add_argument('out', help='CSV de salida')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--sensors', type=int, default=20)
+    parser.add_argument('--synonyms', type=int, default=1, help='columnas por variable')
+    parser.add_argument('--unit-mix', type=float, default=0.0, help='fracción de sensores en unidades alternativas')
+    parser.add_argument('--missing', type=float, default=0.05, help='fracción de celdas vacías')
+    parser.add_argument('--out-of-range', type=float, default=0.0, help='fracción de filas con un valor fuera de rango')
+    parser.add_argument('--timestamp-format', choices=['iso', 'dmy', 'epoch'], default='iso')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    df = station_frame(args.rows, args.sensors, args.synonyms, args.unit_mix, args.missing, args.out_of_range,
+                       seed=args.seed, timestamp_format=args.timestamp_format)
+    df.to_csv(args.out, index=False)
+    print(f"{args.out}: {len(df)} filas, columnas {', '.join(df.columns)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# benchmarks/suite.py
+# Suite de benchmarks reproducible (datos de benchmarks.generator, seed fija).
+#   python -m benchmarks.suite run --out benchmarks/baselines/mi_equipo.json [--db]
+#   python -m benchmarks.suite run --compare benchmarks/baselines/mi_equipo.json [--db]
+#   python -m benchmarks.suite compare base.json actual.json [--threshold 0.2]
+# benchmarks/baselines/referencia.json es una corrida completa (--db) de referencia.
+# Los casos fila a fila usan las primeras --rows-row filas; los demás, --rows.
+# Cada caso se repite --repeat veces (tras --warmup corridas sin medir) y se
+# guarda la mediana y el mínimo. compare marca 'LENTO' los casos cuyo tiempo
+# por item creció más que threshold y sale con código 1 si hay alguno.
+# --db agrega insert_medicion, insert_mediciones_bulk y query_window contra una base
+# desechable (SCRATCH_DB, creada con Codigo_sql_tesis_pid.sql en el servidor
+# de src.config.DB y borrada al terminar).
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import psycopg2
+from src.config import DB
+import src.db as db
+from src.ingest import rows_from_df
+from src.normalize import normalize_row, apply_conversions, parse_timestamp, normalize_batch, normalize_frame, records_from_frame
+from src.export import export_mediciones_to_netcdf
+from src import parquet
+from src import query
+from src.raw_payload import RawPayload
+from benchmarks.generator import station_frame
+from benchmarks.bench_partitions import reset_caches
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA = ROOT / 'Codigo_sql_tesis_pid.sql'
+SCRATCH_DB = 'clima_bench'
+THRESHOLD = 0.2      # +20% de tiempo por item = regresión
+
+# datos de la suite (los mismos en todas las corridas)
+DATA = {'sensors': 20, 'synonyms': 2, 'unit_mix': 0.3, 'missing': 0.05, 'out_of_range': 0.01, 'seed': 0}
+
+# --- casos: setup(data) -> args (no se mide), run(args) -> items procesados ---
+
+def _rows(data):
+    return list(rows_from_df(data['df'].iloc[:data['rows_row']]))
+
+def _normalize_row(rows):
+    for r in rows:
+        normalize_row(r)
+    return len(rows)
+
+def _cells(data):
+    variables = set(data['df'].columns) - {'sensor_id', 'time'}
+    return [(k, v) for row in _rows(data) for k, v in row.items() if k in variables and pd.notna(v)]
+
+def _apply_conversions(cells):
+    for k, v in cells:
+        apply_conversions(k, v)
+    return len(cells)
+
+def _parse_timestamp(rows):
+    for r in rows:
+        parse_timestamp(r)
+    return len(rows)
+
+def _normalize_batch(df):
+    normalize_batch(df)
+    return len(df)
+
+def _export_setup(data):
+    return normalize_frame(data['df']), Path(data['tmp']) / 'suite.nc'
+
+def _export(args):
+    norm, path = args
+    export_mediciones_to_netcdf(norm, str(path))
+    return len(norm)
+
+def _stage_setup(data):
+    root = Path(data['tmp']) / 'staging'
+    return parquet.ParquetStage(root, 'suite' * 13, RawPayload('none')), normalize_batch(data['df'])
+
+def _stage(args):
+    stage, batch = args
+    return stage.write(batch)
+
+def _read_staged_setup(data):
+    stage, batch = _stage_setup(data)
+    stage.write(batch)
+    return stage.root
+
+def _read_staged(root):
+    # lo que reemplaza a leer el CSV + normalize_batch al recargar desde el staging
+    return len(parquet.table_batch(parquet.open_dataset(root).to_table()))
+
+def _db_setup(data, n_rows):
+    # tablas vacías y caches de proceso en cero: cada repetición parte igual
+    conn = data['conn']
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE validacion, medicion, medicion_hora, medicion_dia, sensor, ingesta_archivo")
+    conn.commit()
+    reset_caches()
+    df = data['df'].iloc[:n_rows]
+    return conn, df, normalize_batch(df)
+
+def _insert_medicion(args):
+    # como el modo row del loader: commit por fila, agregados una vez al final
+    conn, df, norm = args
+    rows = ((int(pos), m) for pos, m in zip(norm.index, records_from_frame(norm, df)))
+    return db.insert_medicion_rows(conn, rows, procedure_version='bench')
+
+def _insert_bulk(args):
+    conn, df, norm = args
+    return db.insert_mediciones_bulk(conn, norm, df, procedure_version='bench')
+
+def _query_setup(data):
+    conn, df, norm = _db_setup(data, len(data['df']))
+    db.insert_mediciones_bulk(conn, norm, df, procedure_version='bench')
+    query.QUERY_CACHE.clear()
+    return conn, norm['timestamp'].min(), norm['timestamp'].max() + pd.Timedelta(minutes=1)
+
+def _query_window(args):
+    # ventana completa de todos los sensores, por páginas keyset (sin cache)
+    conn, start, end = args
+    return sum(len(page) for page in query.iter_window(None, start, end, conn=conn))
+
+CASES = {
+    'normalize_row': (_rows, _normalize_row),
+    'apply_conversions': (_cells, _apply_conversions),
+    'parse_timestamp': (_rows, _parse_timestamp),
+    'normalize_batch': (lambda data: data['df'], _normalize_batch),
+    'export_mediciones_to_netcdf': (_export_setup, _export),
+}
+if parquet.available():
+    CASES.update({'stage_parquet': (_stage_setup, _stage), 'read_staged': (_read_staged_setup, _read_staged)})
+DB_CASES = {
+    'insert_medicion': (lambda data: _db_setup(data, data['rows_row']), _insert_medicion),
+    'insert_mediciones_bulk': (lambda data: _db_setup(data, len(data['df'])), _insert_bulk),
+    'query_window': (_query_setup, _query_window),
+}
+
+def measure(setup, run, repeat, warmup):
+    for _ in range(warmup):
+        run(setup())
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        t0 = time.perf_counter()
+        items = run(args)
+        times.append(time.perf_counter() - t0)
+    median = statistics.median(times)
+    return {'items': items, 'repeticiones': [round(t, 6) for t in times], 'min_s': round(min(times), 6),
+            'mediana_s': round(median, 6), 'items_s': round(items / median, 1)}
+
+# --- base desechable ---
+
+def _split_extensions(sql):
+    extensions = re.findall(r'CREATE EXTENSION[^;]*;', sql, flags=re.IGNORECASE)
+    for ext in extensions:
+        sql = sql.replace(ext, '')
+    return extensions, sql
+
+@contextmanager
+def scratch_db(config=DB, name=SCRATCH_DB):
+    """Conexión a una base nueva con el esquema del proyecto; se borra al salir."""
+    admin = psycopg2.connect(host=config['host'], dbname=config['dbname'], user=config['user'],
+                             password=config['password'], port=config['port'])
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {name}")
+        cur.execute(f"CREATE DATABASE {name} TEMPLATE template0 ENCODING 'UTF8'")
+    conn = None
+    try:
+        conn = db.get_conn({**config, 'dbname': name})
+        extensions, sql = _split_extensions(SCHEMA.read_text(encoding='utf-8'))
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for ext in extensions:
+                try:
+                    cur.execute(ext)
+                except psycopg2.Error:
+                    pass    # el esquema no usa la extensión (p.ej. uuid-ossp no instalada)
+            cur.execute(sql)
+        conn.autocommit = False
+        yield conn
+    finally:
+        if conn is not None:
+            conn.close()
+        reset_caches()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name}")
+        admin.close()
+
+# --- corrida y comparación ---
+
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(rows=20000, rows_row=1000, repeat=5, warmup=1, use_db=False, cases=None):
+    """Corre los casos (todos, o los de cases) y retorna el resultado como dict (el JSON de la base)."""
+    selected = dict(CASES, **(DB_CASES if use_db else {}))
+    if cases:
+        selected = {k: v for k, v in selected.items() if k in cases}
+    params = dict(DATA, rows=rows, rows_row=rows_row, repeat=repeat, warmup=warmup)
+    result = {
+        'meta': {'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': _commit(),
+                 'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                 'plataforma': platform.platform(), 'procesador': platform.processor() or platform.machine(),
+                 'parametros': params},
+        'casos': {},
+    }
+    data = {'df': station_frame(rows, DATA['sensors'], DATA['synonyms'], DATA['unit_mix'], DATA['missing'],
+                                DATA['out_of_range'], seed=DATA['seed']),
+            'rows_row': rows_row}
+    with tempfile.TemporaryDirectory() as tmp:
+        data['tmp'] = tmp
+        for name, (setup, run) in selected.items():
+            if name in DB_CASES:
+                continue
+            result['casos'][name] = measure(lambda: setup(data), run, repeat, warmup)
+            print(f"{name}: {result['casos'][name]['items_s']:,.0f} items/s", file=sys.stderr)
+    db_selected = {k: v for k, v in selected.items() if k in DB_CASES}
+    if db_selected:
+        with scratch_db() as conn:
+            data['conn'] = conn
+            for name, (setup, run) in db_selected.items():
+                result['casos'][name] = measure(lambda: setup(data), run, repeat, warmup)
+                print(f"{name}: {result['casos'][name]['items_s']:,.0f} items/s", file=sys.stderr)
+    return result
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    [(caso, s/item base, s/item actual, cambio relativo, estado)] de los casos
+    de current; estado 'LENTO' (cambio > threshold), 'rapido' (< -threshold),
+    'ok' o 'sin base'. Se compara el tiempo por item de la mediana, así las
+    corridas con otra cantidad de filas siguen siendo comparables.
+    """
+    out = []
+    for name, cur in current['casos'].items():
+        per_item = cur['mediana_s'] / cur['items']
+        base = baseline['casos'].get(name)
+        if base is None:
+            out.append((name, None, per_item, None, 'sin base'))
+            continue
+        base_item = base['mediana_s'] / base['items']
+        change = per_item / base_item - 1
+        state = 'LENTO' if change > threshold else 'rapido' if change < -threshold else 'ok'
+        out.append((name, base_item, per_item, change, state))
+    return out
+
+def format_comparison(rows, threshold=THRESHOLD):
+    lines = [f"{'caso':30s} {'base us/item':>13s} {'actual us/item':>15s} {'cambio':>8s}  estado (umbral {threshold:+.0%})"]
+    for name, base, cur, change, state in rows:
+        base_s = f"{base * 1e6:.2f}" if base is not None else '-'
+        change_s = f"{change:+.1%}" if change is not None else '-'
+        lines.append(f"{name:30s} {base_s:>13s} {cur * 1e6:>15.2f} {change_s:>8s}  {state}")
+    return '\n'.join(lines)
+
+def _check_params(baseline, current):
+    keys = ('rows', 'rows_row', 'sensors', 'synonyms', 'unit_mix', 'missing', 'out_of_range', 'seed')
+    diff = [k for k in keys if baseline['meta']['parametros'].get(k) != current['meta']['parametros'].get(k)]
+    if diff:
+        print(f"aviso: parámetros distintos a la base ({', '.join(diff)})", file=sys.stderr)
+
+def _report(baseline, current, threshold):
+    _check_params(baseline, current)
+    rows = compare(baseline, current, threshold)
+    print(format_comparison(rows, threshold))
+    return 1 if any(state == 'LENTO' for *_, state in rows) else 0
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help='correr la suite')
+    p_run.add_argument('--rows', type=int, default=20000, help='filas generadas (casos por lote)')
+    p_run.add_argument('--rows-row', type=int, default=1000,
+                       help='filas de los casos fila a fila (normalize_row, apply_conversions, parse_timestamp, insert_medicion)')
+    p_run.add_argument('--repeat', type=int, default=5)
+    p_run.add_argument('--warmup', type=int, default=1)
+    p_run.add_argument('--db', action='store_true', help='incluir los casos contra una base desechable')
+    p_run.add_argument('--case', action='append', dest='cases', help='correr sólo este caso (repetible)')
+    p_run.add_argument('--out', help='guardar el resultado como JSON (nueva base)')
+    p_run.add_argument('--compare', help='JSON base contra el que comparar')
+    p_run.add_argument('--threshold', type=float, default=THRESHOLD)
+    p_cmp = sub.add_parser('compare', help='comparar dos resultados guardados')
+    p_cmp.add_argument('baseline')
+    p_cmp.add_argument('current')
+    p_cmp.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = json.loads(Path(args.current).read_text())
+        sys.exit(_report(baseline, current, args.threshold))
+
+    result = run_suite(rows=args.rows, rows_row=args.rows_row, repeat=args.repeat, warmup=args.warmup,
+                       use_db=args.db, cases=args.cases)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(result, indent=2) + '\n')
+        print(f"resultado guardado en {args.out}")
+    if args.compare:
+        sys.exit(_report(json.loads(Path(args.compare).read_text()), result, args.threshold))
+    print(f"{'caso':30s} {'items':>8s} {'mediana s':>10s} {'items/s':>12s}")
+    for name, r in result['casos'].items():
+        print(f"{name:30s} {r['items']:>8d} {r['mediana_s']:>10.4f} {r['items_s']:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
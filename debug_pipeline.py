@@ -26,21 +26,16 @@ def main():
             traceback.print_exc()
             DB = None
 
-        # 2) conectar a la DB con psycopg2 y mostrar current_database y tablas
+        # 2) conectar a la DB (pool compartido de src.pool) y mostrar current_database y tablas
         try:
             import psycopg2
             from psycopg2.extras import Json
-            conn = psycopg2.connect(
-                host=DB['host'],
-                dbname=DB['dbname'],
-                user=DB['user'],
-                password=DB['password'],
-                port=DB['port']
-            )
+            from src.pool import POOL
+            conn = POOL.getconn(timeout=DB['connect_timeout'])
             conn.autocommit = True
             safe_print("Conexión DSN", conn.dsn if hasattr(conn,'dsn') else conn)
         except Exception as e:
-            print("ERROR: no pude conectar con psycopg2 usando src.config.DB ->", e)
+            print("ERROR: no pude conectar usando src.config.DB ->", e)
             traceback.print_exc()
             return
 
@@ -184,7 +179,8 @@ def main():
         # 6) cerrar
         try:
             cur.close()
-            conn.close()
+            POOL.putconn(conn)
+            POOL.closeall()
             print("\nDEBUG END")
         except:
             pass
@@ -0,0 +1,86 @@
+-- migraciones/001_medicion_particionada.sql
+-- Convierte medicion (una sola tabla heap) en una tabla particionada por mes
+-- (RANGE sobre timestamp) para bases creadas con la versión anterior de
+-- Codigo_sql_tesis_pid.sql.
+--   psql -d clima -f migraciones/001_medicion_particionada.sql
+--
+-- Índices: antes medicion_pkey (medicion_id), UNIQUE (sensor_id, timestamp),
+-- idx_medicion_timestamp, idx_medicion_sensor e idx_sensor_time (cinco B-tree
+-- por inserción). Después: PRIMARY KEY (sensor_id, timestamp), que sirve al
+-- ON CONFLICT y a las búsquedas por sensor, más BRIN sobre timestamp y
+-- medicion_id (unas pocas páginas por partición).
+-- medicion_id sigue saliendo de la misma secuencia, pero una clave única de una
+-- tabla particionada debe incluir timestamp, así que validacion ya no puede
+-- tener FK hacia medicion: la integridad la mantienen la carga (src/db.py) y
+-- el archivado de particiones (src/partitions.py mueve o borra sus validaciones).
+-- Las particiones futuras las crea src/partitions.py (también al cargar);
+-- medicion_default recibe lo que caiga fuera de las particiones existentes.
+-- Todo corre en una transacción: si algo falla (p.ej. filas con sensor_id
+-- NULL), la tabla queda como estaba.
+
+BEGIN;
+
+LOCK TABLE medicion IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE validacion DROP CONSTRAINT IF EXISTS validacion_medicion_id_fkey;
+
+ALTER TABLE medicion RENAME TO medicion_old;
+ALTER TABLE medicion_old DROP CONSTRAINT IF EXISTS medicion_pkey;
+ALTER TABLE medicion_old DROP CONSTRAINT IF EXISTS medicion_sensor_id_timestamp_key;
+ALTER TABLE medicion_old DROP CONSTRAINT IF EXISTS medicion_sensor_id_fkey;
+DROP INDEX IF EXISTS idx_medicion_timestamp, idx_medicion_sensor, idx_sensor_time;
+ALTER SEQUENCE medicion_medicion_id_seq OWNED BY NONE;
+
+CREATE TABLE medicion (
+    medicion_id BIGINT NOT NULL DEFAULT nextval('medicion_medicion_id_seq'),
+    sensor_id TEXT NOT NULL REFERENCES sensor(sensor_id),
+    timestamp TIMESTAMPTZ NOT NULL,
+    temperatura DOUBLE PRECISION,
+    humedad DOUBLE PRECISION,
+    presion DOUBLE PRECISION,
+    radiacion_solar DOUBLE PRECISION,
+    velocidad_viento DOUBLE PRECISION,
+    procedure_version TEXT,
+    raw_payload JSONB,
+    ingest_ts TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (sensor_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+ALTER SEQUENCE medicion_medicion_id_seq OWNED BY medicion.medicion_id;
+
+CREATE INDEX idx_medicion_timestamp_brin ON medicion USING brin (timestamp) WITH (pages_per_range = 32, autosummarize = on);
+CREATE INDEX idx_medicion_id_brin ON medicion USING brin (medicion_id) WITH (autosummarize = on);
+
+CREATE TABLE medicion_default PARTITION OF medicion DEFAULT;
+
+-- una partición por mes (UTC), desde el dato más antiguo hasta 3 meses después de hoy
+DO $$
+DECLARE
+    mes DATE;
+    hasta DATE;
+BEGIN
+    SELECT date_trunc('month', min(timestamp) AT TIME ZONE 'UTC')::date,
+           (date_trunc('month', greatest(max(timestamp), now()) AT TIME ZONE 'UTC') + interval '4 months')::date
+      INTO mes, hasta
+      FROM medicion_old;
+    mes := coalesce(mes, date_trunc('month', now() AT TIME ZONE 'UTC')::date);
+    hasta := coalesce(hasta, (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '4 months')::date);
+    WHILE mes < hasta LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF medicion FOR VALUES FROM (%L) TO (%L)',
+                       'medicion_p' || to_char(mes, 'YYYYMM'),
+                       mes::text || ' 00:00:00+00',
+                       (mes + interval '1 month')::date::text || ' 00:00:00+00');
+        mes := (mes + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+INSERT INTO medicion (medicion_id, sensor_id, timestamp, temperatura, humedad, presion, radiacion_solar,
+                      velocidad_viento, procedure_version, raw_payload, ingest_ts)
+SELECT medicion_id, sensor_id, timestamp, temperatura, humedad, presion, radiacion_solar,
+       velocidad_viento, procedure_version, raw_payload, ingest_ts
+FROM medicion_old;
+
+DROP TABLE medicion_old;
+
+COMMIT;
+
+ANALYZE medicion;
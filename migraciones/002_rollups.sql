@@ -0,0 +1,61 @@
+-- migraciones/002_rollups.sql
+-- Crea medicion_hora y medicion_dia (agregados por sensor y hora / día UTC) y
+-- los rellena desde medicion. Desde ahí los mantiene la carga (src/rollups.py):
+-- cada lote recalcula sólo los buckets (sensor, hora) y (sensor, día) que tocó,
+-- en la misma transacción.
+--   psql -d clima -f migraciones/002_rollups.sql
+-- Si se borran filas de medicion por fuera de la carga, volver a correr este
+-- script (recalcula todo).
+
+BEGIN;
+
+DROP TABLE IF EXISTS medicion_hora, medicion_dia;
+
+CREATE TABLE medicion_hora (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,         -- inicio del bucket (UTC)
+    n INTEGER NOT NULL,                  -- filas de medicion en el bucket
+    temperatura_n INTEGER, temperatura_sum DOUBLE PRECISION, temperatura_min DOUBLE PRECISION, temperatura_max DOUBLE PRECISION,
+    humedad_n INTEGER, humedad_sum DOUBLE PRECISION, humedad_min DOUBLE PRECISION, humedad_max DOUBLE PRECISION,
+    presion_n INTEGER, presion_sum DOUBLE PRECISION, presion_min DOUBLE PRECISION, presion_max DOUBLE PRECISION,
+    radiacion_solar_n INTEGER, radiacion_solar_sum DOUBLE PRECISION, radiacion_solar_min DOUBLE PRECISION, radiacion_solar_max DOUBLE PRECISION,
+    velocidad_viento_n INTEGER, velocidad_viento_sum DOUBLE PRECISION, velocidad_viento_min DOUBLE PRECISION, velocidad_viento_max DOUBLE PRECISION,
+    PRIMARY KEY (sensor_id, bucket)
+);
+
+CREATE TABLE medicion_dia (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,         -- inicio del bucket (UTC)
+    n INTEGER NOT NULL,                  -- filas de medicion en el bucket
+    temperatura_n INTEGER, temperatura_sum DOUBLE PRECISION, temperatura_min DOUBLE PRECISION, temperatura_max DOUBLE PRECISION,
+    humedad_n INTEGER, humedad_sum DOUBLE PRECISION, humedad_min DOUBLE PRECISION, humedad_max DOUBLE PRECISION,
+    presion_n INTEGER, presion_sum DOUBLE PRECISION, presion_min DOUBLE PRECISION, presion_max DOUBLE PRECISION,
+    radiacion_solar_n INTEGER, radiacion_solar_sum DOUBLE PRECISION, radiacion_solar_min DOUBLE PRECISION, radiacion_solar_max DOUBLE PRECISION,
+    velocidad_viento_n INTEGER, velocidad_viento_sum DOUBLE PRECISION, velocidad_viento_min DOUBLE PRECISION, velocidad_viento_max DOUBLE PRECISION,
+    PRIMARY KEY (sensor_id, bucket)
+);
+
+INSERT INTO medicion_hora (sensor_id, bucket, n, temperatura_n, temperatura_sum, temperatura_min, temperatura_max, humedad_n, humedad_sum, humedad_min, humedad_max, presion_n, presion_sum, presion_min, presion_max, radiacion_solar_n, radiacion_solar_sum, radiacion_solar_min, radiacion_solar_max, velocidad_viento_n, velocidad_viento_sum, velocidad_viento_min, velocidad_viento_max)
+SELECT sensor_id, date_bin('1 hour', timestamp, '1970-01-01 00:00:00+00'), count(*),
+       count(m.temperatura), sum(m.temperatura), min(m.temperatura), max(m.temperatura),
+       count(m.humedad), sum(m.humedad), min(m.humedad), max(m.humedad),
+       count(m.presion), sum(m.presion), min(m.presion), max(m.presion),
+       count(m.radiacion_solar), sum(m.radiacion_solar), min(m.radiacion_solar), max(m.radiacion_solar),
+       count(m.velocidad_viento), sum(m.velocidad_viento), min(m.velocidad_viento), max(m.velocidad_viento)
+FROM medicion m
+GROUP BY 1, 2;
+
+INSERT INTO medicion_dia (sensor_id, bucket, n, temperatura_n, temperatura_sum, temperatura_min, temperatura_max, humedad_n, humedad_sum, humedad_min, humedad_max, presion_n, presion_sum, presion_min, presion_max, radiacion_solar_n, radiacion_solar_sum, radiacion_solar_min, radiacion_solar_max, velocidad_viento_n, velocidad_viento_sum, velocidad_viento_min, velocidad_viento_max)
+SELECT sensor_id, date_bin('1 day', bucket, '1970-01-01 00:00:00+00'), sum(h.n),
+       sum(h.temperatura_n), sum(h.temperatura_sum), min(h.temperatura_min), max(h.temperatura_max),
+       sum(h.humedad_n), sum(h.humedad_sum), min(h.humedad_min), max(h.humedad_max),
+       sum(h.presion_n), sum(h.presion_sum), min(h.presion_min), max(h.presion_max),
+       sum(h.radiacion_solar_n), sum(h.radiacion_solar_sum), min(h.radiacion_solar_min), max(h.radiacion_solar_max),
+       sum(h.velocidad_viento_n), sum(h.velocidad_viento_sum), min(h.velocidad_viento_min), max(h.velocidad_viento_max)
+FROM medicion_hora h
+GROUP BY 1, 2;
+
+COMMIT;
+
+ANALYZE medicion_hora;
+ANALYZE medicion_dia;
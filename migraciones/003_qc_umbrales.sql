@@ -0,0 +1,29 @@
+-- migraciones/003_qc_umbrales.sql
+-- Agrega a la tabla variable los umbrales de control de calidad que usan la
+-- carga (RANGE, CONSISTENCY) y src/qc.py (SPIKE, STEP, RATE, FLATLINE), con
+-- los valores que antes estaban fijos en el código. NULL = chequeo desactivado.
+--   psql -d clima -f migraciones/003_qc_umbrales.sql
+-- Sólo completa variables que todavía no tengan ningún umbral nuevo cargado.
+
+BEGIN;
+
+ALTER TABLE variable ADD COLUMN IF NOT EXISTS cambio_maximo DOUBLE PRECISION;
+ALTER TABLE variable ADD COLUMN IF NOT EXISTS salto_maximo DOUBLE PRECISION;
+ALTER TABLE variable ADD COLUMN IF NOT EXISTS tasa_maxima DOUBLE PRECISION;
+ALTER TABLE variable ADD COLUMN IF NOT EXISTS plano_minutos DOUBLE PRECISION;
+
+UPDATE variable v
+SET cambio_maximo = u.cambio_maximo, salto_maximo = u.salto_maximo,
+    tasa_maxima = u.tasa_maxima, plano_minutos = u.plano_minutos
+FROM (VALUES
+    ('temperatura', 10, 5, 10, 180),
+    ('humedad', 30, 20, 40, 720),
+    ('presion', NULL, 3, 6, 720),
+    ('radiacion_solar', NULL, NULL, NULL, NULL),
+    ('velocidad_viento', NULL, 15, NULL, 360)
+) AS u(nombre_estandar, cambio_maximo, salto_maximo, tasa_maxima, plano_minutos)
+WHERE v.nombre_estandar = u.nombre_estandar
+  AND v.cambio_maximo IS NULL AND v.salto_maximo IS NULL
+  AND v.tasa_maxima IS NULL AND v.plano_minutos IS NULL;
+
+COMMIT;
@@ -0,0 +1,31 @@
+-- migraciones/004_raw_payload.sql
+-- Soporte para INGEST_RAW_PAYLOAD=reference (src/raw_payload.py): el CSV
+-- original se guarda una vez, en bloques de filas comprimidos por separado
+-- (archivo_crudo_bloque), y cada medición guarda sólo (raw_archivo_id,
+-- raw_fila) en vez de la fila como JSONB.
+--   psql -d clima -f migraciones/004_raw_payload.sql
+-- Agregar columnas nulas sin default no reescribe medicion.
+-- Los modos full, none y unmapped no necesitan esta migración.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS archivo_crudo (
+    archivo_id SERIAL PRIMARY KEY,
+    hash_contenido TEXT UNIQUE NOT NULL,
+    archivo TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    encabezado BYTEA NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archivo_crudo_bloque (
+    archivo_id INTEGER NOT NULL REFERENCES archivo_crudo ON DELETE CASCADE,
+    fila_desde BIGINT NOT NULL,
+    fila_hasta BIGINT NOT NULL,
+    contenido BYTEA NOT NULL,
+    PRIMARY KEY (archivo_id, fila_desde)
+);
+ALTER TABLE archivo_crudo_bloque ALTER COLUMN contenido SET STORAGE EXTERNAL;
+
+ALTER TABLE medicion ADD COLUMN IF NOT EXISTS raw_archivo_id INTEGER;
+ALTER TABLE medicion ADD COLUMN IF NOT EXISTS raw_fila BIGINT;
+
+COMMIT;
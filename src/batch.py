@@ -0,0 +1,200 @@
+# src/batch.py
+# Lote de mediciones en columnas (arrays NumPy tipados) en vez de un dict por
+# fila: es el formato que comparten normalize, qc, la carga a la base y la
+# exportación. Se accede como un DataFrame (batch['temperatura'], batch[a:b],
+# batch[mascara], len, index, columns) y to_frame() lo ve desde pandas sin copiar.
+import numpy as np
+import pandas as pd
+from src.dictionary import LIMITS
+from src.qc import range_mask
+from src.metrics import METRICS
+
+VARIABLES = ['temperatura', 'humedad', 'presion', 'radiacion_solar', 'velocidad_viento']
+COLUMNS = ['sensor_id', 'timestamp'] + VARIABLES
+FLAG_TYPES = ('RANGE', 'CONSISTENCY')
+LABELS = {'temperatura': 'temp', 'humedad': 'hum'}     # etiquetas de CONSISTENCY (db.consistency_flags)
+
+def code_dtype(n_categories):
+    # el mismo entero que pandas usa para los códigos de un Categorical (así no copia)
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _utc(timestamps):
+    # DatetimeArray datetime64[ns, UTC] (sin zona se asume UTC)
+    index = pd.DatetimeIndex(timestamps)
+    index = index.tz_convert('UTC') if index.tz is not None else index.tz_localize('UTC')
+    return index.as_unit('ns').array
+
+class MeasurementBatch:
+    """
+    n mediciones en columnas:
+      sensor_codes (int8..int64) + sensors (valores distintos): sensor_id; -1 = sin sensor
+      timestamp: DatetimeArray datetime64[ns, UTC] (NaT = sin timestamp legible)
+      values: float64 (len(VARIABLES), n), una fila contigua por variable (NaN = sin dato)
+      index: int64 (n,), fila del archivo de cada medición
+    Flags compactos, ordenados por fila: flag_row (posición en el lote),
+    flag_type (índice en FLAG_TYPES), flag_var (índice en VARIABLES) y
+    flag_ref (valor de referencia de CONSISTENCY; NaN en RANGE). La
+    descripción de texto se arma sólo cuando se pide (describe_flag).
+    Cortar con un slice da vistas de los mismos arrays.
+    """
+
+    __slots__ = ('sensor_codes', 'sensors', 'timestamp', 'values', 'rows',
+                 'flag_row', 'flag_type', 'flag_var', 'flag_ref')
+
+    def __init__(self, sensor_codes, sensors, timestamp, values, rows=None, flags=None):
+        self.sensor_codes = sensor_codes
+        self.sensors = sensors
+        self.timestamp = timestamp
+        self.values = values
+        self.rows = np.arange(len(sensor_codes), dtype=np.int64) if rows is None else rows
+        if flags is None:
+            flags = (np.empty(0, np.int64), np.empty(0, np.int8), np.empty(0, np.int8), np.empty(0))
+        self.flag_row, self.flag_type, self.flag_var, self.flag_ref = flags
+
+    @classmethod
+    def from_columns(cls, sensor_ids, timestamps, values, rows=None):
+        """
+        sensor_ids: valores por fila (NaN = sin sensor); timestamps: datetimes
+        parseados; values: { variable -> array float } (las que falten, NaN).
+        Calcula los flags RANGE con los límites de LIMITS.
+        """
+        codes, sensors = pd.factorize(np.asarray(sensor_ids, dtype=object))
+        n = len(codes)
+        matrix = np.full((len(VARIABLES), n), np.nan)
+        for j, var in enumerate(VARIABLES):
+            if var in values:
+                matrix[j] = values[var]
+        rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        batch = cls(codes.astype(code_dtype(len(sensors))), np.asarray(sensors, dtype=object),
+                    _utc(timestamps), matrix, rows)
+        with METRICS.stage('qc', rows=n):
+            batch.flag_range()
+        return batch
+
+    @classmethod
+    def from_frame(cls, df):
+        """Desde un DataFrame con sensor_id, timestamp y variables (normalize_frame, medicion)."""
+        if isinstance(df, cls):
+            return df
+        values = {var: df[var].to_numpy(dtype=float) for var in VARIABLES if var in df.columns}
+        return cls.from_columns(df['sensor_id'].to_numpy(), df['timestamp'], values, df.index.to_numpy())
+
+    # --- flags ---
+
+    def flag_range(self, limits=LIMITS):
+        """Recalcula los flags RANGE (reemplaza los que hubiera)."""
+        rows, variables = [], []
+        for j, var in enumerate(VARIABLES):
+            bad = np.flatnonzero(range_mask(self.values[j], *limits.range(var)))
+            rows.append(bad)
+            variables.append(np.full(len(bad), j, dtype=np.int8))
+        n = sum(map(len, rows))
+        self._set_flags(np.concatenate(rows), np.zeros(n, dtype=np.int8), np.concatenate(variables), np.full(n, np.nan))
+
+    def add_flags(self, tipo, var, rows, ref=None):
+        """Agrega flags tipo/var en las posiciones rows (ref: valor de referencia por flag)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        ref = np.full(len(rows), np.nan) if ref is None else np.asarray(ref, dtype=float)
+        self._set_flags(np.concatenate([self.flag_row, rows]),
+                        np.concatenate([self.flag_type, np.full(len(rows), FLAG_TYPES.index(tipo), np.int8)]),
+                        np.concatenate([self.flag_var, np.full(len(rows), VARIABLES.index(var), np.int8)]),
+                        np.concatenate([self.flag_ref, ref]))
+
+    def _set_flags(self, row, tipo, var, ref):
+        # por fila, en el orden en que se agregaron (como la lista de flags de normalize_row)
+        order = np.argsort(row, kind='stable')
+        self.flag_row, self.flag_type, self.flag_var, self.flag_ref = row[order], tipo[order], var[order], ref[order]
+
+    def describe_flag(self, k, limits=LIMITS):
+        """(tipo_flag, descripcion_problema) del flag k, con el mismo texto que normalize/db."""
+        tipo, var = FLAG_TYPES[self.flag_type[k]], VARIABLES[self.flag_var[k]]
+        value = float(self.values[self.flag_var[k], self.flag_row[k]])
+        if tipo == 'RANGE':
+            lo, hi = limits.range(var)
+            return tipo, f'{var}={value} fuera de rango [{lo},{hi}]'
+        return tipo, f'{LABELS.get(var, var)} change {value} vs {float(self.flag_ref[k])}'
+
+    def flag_dicts(self):
+        """Tupla de {tipo, descripcion} por fila (el validation_flags de normalize_frame)."""
+        out = np.empty(len(self), dtype=object)
+        out[:] = [()] * len(self)
+        for k, i in enumerate(self.flag_row):
+            tipo, descripcion = self.describe_flag(k)
+            out[i] = out[i] + ({'tipo': tipo, 'descripcion': descripcion},)
+        return out
+
+    # --- acceso tipo DataFrame ---
+
+    def __len__(self):
+        return len(self.sensor_codes)
+
+    @property
+    def index(self):
+        return pd.Index(self.rows, copy=False)
+
+    @property
+    def columns(self):
+        return pd.Index(COLUMNS)
+
+    @property
+    def nbytes(self):
+        arrays = (self.sensor_codes, self.sensors, self.timestamp, self.values, self.rows,
+                  self.flag_row, self.flag_type, self.flag_var, self.flag_ref)
+        return sum(a.nbytes for a in arrays)
+
+    def sensor_categorical(self):
+        return pd.Categorical.from_codes(self.sensor_codes, categories=pd.Index(self.sensors, dtype=object))
+
+    def column(self, name):
+        """Columna como array sin copia (sensor_id: Categorical sobre los códigos)."""
+        if name == 'sensor_id':
+            return self.sensor_categorical()
+        if name == 'timestamp':
+            return self.timestamp
+        if name == 'validation_flags':
+            return self.flag_dicts()
+        return self.values[VARIABLES.index(name)]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return pd.Series(self.column(key), index=self.index, name=key, copy=False)
+        if isinstance(key, slice):
+            return self._slice(key)
+        return self.take(key)
+
+    def _slice(self, key):
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            return self.take(np.arange(start, stop, step))
+        lo, hi = np.searchsorted(self.flag_row, [start, stop])
+        flags = (self.flag_row[lo:hi] - start, self.flag_type[lo:hi], self.flag_var[lo:hi], self.flag_ref[lo:hi])
+        return MeasurementBatch(self.sensor_codes[start:stop], self.sensors, self.timestamp[start:stop],
+                                self.values[:, start:stop], self.rows[start:stop], flags)
+
+    def take(self, positions):
+        """Sub-lote con las posiciones (o máscara booleana) dadas, en ese orden; copia."""
+        positions = np.asarray(positions)
+        if positions.dtype == bool:
+            positions = np.flatnonzero(positions)
+        new_pos = np.full(len(self), -1, dtype=np.int64)
+        new_pos[positions] = np.arange(len(positions))
+        keep = new_pos[self.flag_row] >= 0
+        flags = [self.flag_row[keep], self.flag_type[keep], self.flag_var[keep], self.flag_ref[keep]]
+        flags[0] = new_pos[flags[0]]
+        out = MeasurementBatch(self.sensor_codes[positions], self.sensors, self.timestamp[positions],
+                               self.values[:, positions], self.rows[positions])
+        out._set_flags(*flags)
+        return out
+
+    def to_frame(self, flags=False):
+        """
+        DataFrame sensor_id (categórica), timestamp y variables que comparte
+        memoria con el lote. flags=True agrega validation_flags (dicts por fila).
+        """
+        data = {name: self.column(name) for name in COLUMNS}
+        if flags:
+            data['validation_flags'] = self.flag_dicts()
+        return pd.DataFrame(data, index=self.index, copy=False)
@@ -9,5 +9,29 @@ DB = {
     'dbname': os.getenv('DB_NAME', 'postgres'),
     'user': os.getenv('DB_USER', 'postgres'),
     'password': os.getenv('DB_PASS', ''),
-    'port': int(os.getenv('DB_PORT', 5432))
+    'port': int(os.getenv('DB_PORT', 5432)),
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 10)),  # segundos al abrir una conexión
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 4)),                # conexiones por proceso (src/pool.py)
+    'prepare': os.getenv('DB_PREPARE', '1') != '0'                 # sentencias preparadas en la carga fila a fila
+}
+
+INGEST = {
+    'mode': os.getenv('INGEST_MODE', 'row'),               # 'row' (insert_medicion por fila) o 'bulk' (COPY por lotes)
+    'batch_size': int(os.getenv('INGEST_BATCH_SIZE', 5000)),
+    'chunk_rows': int(os.getenv('INGEST_CHUNK_ROWS', 100000)),  # filas leídas del CSV por vez
+    'workers': int(os.getenv('INGEST_WORKERS', 1)),              # procesos para cargar varios archivos
+    'pipeline': os.getenv('INGEST_PIPELINE', 'sequential'),      # 'sequential' o 'async' (etapas solapadas)
+    'resume': os.getenv('INGEST_RESUME', '1') != '0',              # saltar archivos ya cargados / retomar a medias
+    'raw_payload': os.getenv('INGEST_RAW_PAYLOAD', 'full'),        # 'full', 'none', 'unmapped' o 'reference' (src/raw_payload.py)
+    'commit_rows': int(os.getenv('INGEST_COMMIT_ROWS', 1)),         # modo row: commit cada N filas (0 = sólo por tiempo)
+    'commit_seconds': float(os.getenv('INGEST_COMMIT_SECONDS', 0)), # modo row: y/o cada T segundos (0 = sin límite)
+    'stage_dir': os.getenv('INGEST_STAGE_DIR', ''),                  # staging Parquet de los lotes normalizados ('' = no; src/parquet.py)
+    'column_conflicts': os.getenv('INGEST_COLUMN_CONFLICTS', 'last') # varias columnas -> misma variable: 'last', 'first' o 'error'
+}
+
+QUERY = {
+    'cache_entries': int(os.getenv('QUERY_CACHE_ENTRIES', 256)),   # resultados en la cache de src/query.py (0 = sin cache)
+    'cache_ttl': float(os.getenv('QUERY_CACHE_TTL', 60)),          # segundos que vale un resultado (lo que carguen otros procesos)
+    'cache_rows': int(os.getenv('QUERY_CACHE_ROWS', 200000)),      # ventanas más grandes no se guardan
+    'page_rows': int(os.getenv('QUERY_PAGE_ROWS', 50000))          # filas por página de iter_window
 }
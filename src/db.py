@@ -1,103 +1,548 @@
 # src/db.py (reemplazar insert_medicion con esta versión)
+import csv
+import io
+import json
+import logging
+import math
+import time
+from functools import partial
 import psycopg2
+from psycopg2 import errors
 from psycopg2.extras import Json
-import traceback
+import numpy as np
+import pandas as pd
+from src.sensor_state import SENSOR_STATE, to_ns
+from src.partitions import PARTITIONS, months_present
+from src.rollups import ROLLUPS
+from src.dictionary import LIMITS
+from src.batch import MeasurementBatch
+from src.raw_payload import FULL, RAW_REFS
+from src.metrics import METRICS
+from src.pool import POOL, PoolTimeout, connect, execute_prepared
+from src.query import QUERY_CACHE
+
+logger = logging.getLogger(__name__)
+
+VARIABLES = ['temperatura', 'humedad', 'presion', 'radiacion_solar', 'velocidad_viento']
+
+# filas por transacción en la carga masiva
+BULK_BATCH_SIZE = 5000
+HOUR_NS = 3_600_000_000_000
+
+def dumps_raw(raw):
+    # JSON válido para jsonb: NaN (celdas vacías del CSV) -> null
+    clean = {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in raw.items()}
+    return json.dumps(clean, default=str)
 
 def get_conn(config):
-    return psycopg2.connect(
-        host=config['host'],
-        dbname=config['dbname'],
-        user=config['user'],
-        password=config['password'],
-        port=config['port']
-    )
+    """
+    Conexión propia (MeteredConnection: idas a la base y commits quedan en
+    METRICS). Para compartir conexiones entre módulos y threads: POOL.connection().
+    """
+    return connect(config)
 
-def ensure_sensor_exists(cur, sensor_id):
-    # Inserta un sensor mínimo si no existe
-    cur.execute("SELECT 1 FROM sensor WHERE sensor_id = %s", (sensor_id,))
-    if cur.fetchone() is None:
+# sensores que ya sabemos que existen en la tabla sensor (compartido por todo el proceso)
+KNOWN_SENSORS = set()
+
+def ensure_sensors(cur, sensor_ids):
+    """
+    Registra en un solo INSERT multi-fila los sensores que no estén en
+    KNOWN_SENSORS. Si alguno quedó desactualizado (sensor borrado, rollback),
+    el FK violation posterior lo resuelve: ver forget_sensors.
+    """
+    missing = sorted(set(sensor_ids) - KNOWN_SENSORS)
+    if missing:
         cur.execute(
-            "INSERT INTO sensor (sensor_id, nombre, modelo, fabricante) VALUES (%s,%s,%s,%s) ON CONFLICT (sensor_id) DO NOTHING",
-            (sensor_id, f"Sensor {sensor_id}", None, None)
+            "INSERT INTO sensor (sensor_id, nombre, modelo, fabricante) "
+            "SELECT s, 'Sensor ' || s, NULL, NULL FROM unnest(%s::text[]) AS s "
+            "ON CONFLICT (sensor_id) DO NOTHING",
+            (missing,)
         )
+        KNOWN_SENSORS.update(missing)
+    return missing
+
+def forget_sensors(sensor_ids):
+    KNOWN_SENSORS.difference_update(sensor_ids)
+
+def ensure_sensor_exists(cur, sensor_id):
+    # Inserta un sensor mínimo si no existe
+    ensure_sensors(cur, [sensor_id])
 
-def insert_medicion(conn, m, procedure_version='v1'):
+def consistency_flags(m, last):
+    """
+    Compara m contra la última lectura del sensor
+    last: (temperatura, humedad, presion, timestamp)
+    """
+    flags = []
+    last_temp, last_hum = last[0], last[1]
+    max_temp, max_hum = LIMITS.get('temperatura', 'cambio_maximo'), LIMITS.get('humedad', 'cambio_maximo')
+    if last_temp is not None and m.get('temperatura') is not None and max_temp is not None:
+        if abs(m['temperatura'] - last_temp) > max_temp:
+            flags.append({'tipo':'CONSISTENCY','descripcion': f'temp change {m["temperatura"]} vs {last_temp}'})
+    if last_hum is not None and m.get('humedad') is not None and max_hum is not None:
+        if abs(m['humedad'] - last_hum) > max_hum:
+            flags.append({'tipo':'CONSISTENCY','descripcion': f'hum change {m["humedad"]} vs {last_hum}'})
+    return flags
+
+def insert_medicion(conn, m, procedure_version='v1', state=None, checkpoint=None, raw_payload=FULL, hours=None):
     """
     m: dict con keys:
       sensor_id, timestamp, temperatura, humedad, presion,
-      radiacion_solar, velocidad_viento, raw (dict), validation_flags (list)
+      radiacion_solar, velocidad_viento, raw (dict), validation_flags (list),
+      fila (número de fila en el archivo; sólo para raw_payload 'reference')
+    state: SensorStateCache para el chequeo CONSISTENCY (default: SENSOR_STATE)
+    raw_payload: RawPayload del archivo (qué se guarda de m['raw'], ver src.raw_payload)
+    checkpoint: callable(cur) que se ejecuta en la misma transacción, antes del commit
+    hours: set donde anotar (sensor, hora en ns) en vez de recalcular aquí los
+      agregados; el que llama los recalcula una vez (ver insert_medicion_rows)
+    Si la medición ya existía, sus validaciones se reemplazan por las nuevas.
     """
-    with conn.cursor() as cur:
+    state = SENSOR_STATE if state is None else state
+    sensor_id = m.get('sensor_id') or 'unknown'
+    PARTITIONS.ensure(conn, m.get('timestamp'), m.get('timestamp'))
+    flags = list(m.get('validation_flags', []))
+    for attempt in range(2):
         try:
-            # 1) asegurar existencia del sensor (para evitar FK violation)
-            sensor_id = m.get('sensor_id') or 'unknown'
-            ensure_sensor_exists(cur, sensor_id)
-
-            CONSISTENCY_THRESHOLDS = {
-                    'temperatura': 10.0,   # degC
-                    'humedad': 30.0,       # %
-                    'presion': 50.0        # hPa
-                }
-
-            cur.execute("SELECT temperatura, humedad, presion, timestamp FROM medicion WHERE sensor_id=%s ORDER BY timestamp DESC LIMIT 1", (sensor_id,))
-            last = cur.fetchone()
-            if last and last[3] is not None:
-                last_temp, last_hum, last_pres, last_ts = last[0], last[1], last[2], last[3]
-                # comparar y si excede umbral añadir flag a m['validation_flags']
-                if last_temp is not None and m.get('temperatura') is not None:
-                    if abs(m['temperatura'] - last_temp) > CONSISTENCY_THRESHOLDS['temperatura']:
-                        m.setdefault('validation_flags', []).append({'tipo':'CONSISTENCY','descripcion': f'temp change {m["temperatura"]} vs {last_temp}'})
-                if last_hum is not None and m.get('humedad') is not None:
-                    if abs(m['humedad'] - last_hum) > CONSISTENCY_THRESHOLDS['humedad']:
-                        m.setdefault('validation_flags', []).append({'tipo':'CONSISTENCY','descripcion': f'hum change {m["humedad"]} vs {last_hum}'})
-
-            # 2) insertar medición
-            cur.execute(
-                """
-                
-                INSERT INTO medicion
-                (sensor_id, timestamp, temperatura, humedad, presion, radiacion_solar, velocidad_viento, procedure_version, raw_payload)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (sensor_id, timestamp) DO UPDATE
-                  SET temperatura = EXCLUDED.temperatura,
-                      humedad = EXCLUDED.humedad,
-                      presion = EXCLUDED.presion,
-                      radiacion_solar = EXCLUDED.radiacion_solar,
-                      velocidad_viento = EXCLUDED.velocidad_viento,
-                      ingest_ts = now(),
-                      raw_payload = EXCLUDED.raw_payload;
-                """,
-                (
-                    sensor_id,
-                    m.get('timestamp'),
-                    m.get('temperatura'),
-                    m.get('humedad'),
-                    m.get('presion'),
-                    m.get('radiacion_solar'),
-                    m.get('velocidad_viento'),
-                    procedure_version,
-                    Json(m.get('raw', {}))
-                )
-            )
-            
-            # 3) insertar validaciones si las hay
-            cur.execute(
-                "SELECT medicion_id FROM medicion WHERE sensor_id=%s AND timestamp=%s",
-                (sensor_id, m.get('timestamp'))
-            )
-            row = cur.fetchone()
-            medicion_id = row[0] if row else None
-
-            for vf in m.get('validation_flags', []):
-                cur.execute(
-                    "INSERT INTO validacion (medicion_id, tipo_flag, descripcion_problema) VALUES (%s,%s,%s)",
-                    (medicion_id, vf.get('tipo'), vf.get('descripcion'))
-                )
-
-        except Exception as e:
-            # imprime error detallado (útil para depuración)
-            import traceback
-            print("ERROR en insert_medicion:", e)
-            traceback.print_exc()
+            with METRICS.stage('escritura', rows=1), conn.cursor() as cur:
+                ts = _insert_medicion(cur, m, sensor_id, procedure_version, state, raw_payload)
+                if hours is None:
+                    ROLLUPS.refresh(cur, [sensor_id], [ts])
+                if checkpoint is not None:
+                    checkpoint(cur)
+            break
+        except errors.ForeignKeyViolation:
+            # sensor en cache pero no en la base: olvidarlo y reintentar una vez
+            conn.rollback()
+            m['validation_flags'] = list(flags)
+            if attempt:
+                raise
+            forget_sensors([sensor_id])
+        except Exception:
+            logger.exception("insert_medicion: sensor %s, timestamp %s", sensor_id, m.get('timestamp'))
             raise
     conn.commit()
+    if hours is not None:
+        hours.add((sensor_id, ts - ts % HOUR_NS))
+    state.record(sensor_id, ts, m.get('temperatura'), m.get('humedad'), m.get('presion'))
+    QUERY_CACHE.invalidate({sensor_id: (ts, ts)})
+
+def insert_medicion_rows(conn, rows, procedure_version='v1', checkpoint=None, raw_payload=FULL):
+    """
+    insert_medicion (un commit por fila) para cada (fila, m) de rows, p.ej.
+    un chunk del archivo. Los agregados de las horas tocadas se recalculan
+    una vez al final (también si una fila falla: las anteriores ya están
+    confirmadas), no una vez por fila.
+    checkpoint: callable(cur, next_row) como en TransactionBatch.
+    Retorna la cantidad de filas insertadas.
+    """
+    hours = set()
+    n = 0
+    try:
+        for fila, m in rows:
+            m['fila'] = fila
+            row_checkpoint = partial(checkpoint, next_row=fila + 1) if checkpoint is not None else None
+            insert_medicion(conn, m, procedure_version, checkpoint=row_checkpoint, raw_payload=raw_payload, hours=hours)
+            n += 1
+    finally:
+        if hours:
+            conn.rollback()      # la transacción de una fila que falló; las confirmadas no se tocan
+            sensors, starts = zip(*hours)
+            with conn.cursor() as cur:
+                ROLLUPS.refresh(cur, list(sensors), list(starts))
+            conn.commit()
+    return n
+
+class TransactionBatch:
+    """
+    Carga fila a fila con un commit cada rows filas y/o cada seconds segundos
+    (0 / None = sin ese límite) en vez de uno por fila. Cada fila va en su
+    SAVEPOINT: una fila que falla se deshace sola, queda en rejected
+    [(fila, error)] y el resto de la transacción sigue.
+    checkpoint: callable(cur, next_row) que se ejecuta antes de cada commit,
+      con la fila siguiente a la última insertada (ver ledger.checkpoint).
+    Uso: with TransactionBatch(conn, rows=500) as tx: tx.insert(m) ...
+    (al salir sin error se confirma lo pendiente; con error se deshace).
+    """
+
+    def __init__(self, conn, rows=None, seconds=None, checkpoint=None, state=None):
+        self.conn = conn
+        self.rows = rows or None
+        self.seconds = seconds or None
+        self.checkpoint = checkpoint
+        self.state = SENSOR_STATE if state is None else state
+        self.pending = 0
+        self.next_row = None
+        self.inserted = 0
+        self.rejected = []
+        self._opened = None
+        self._touched = {}       # sensor -> (desde, hasta) ns sin confirmar (para QUERY_CACHE)
+        self._hours = set()      # (sensor, hora en ns) sin confirmar: ROLLUPS.refresh una vez por commit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.conn.rollback()
+            self._forget()
+        return False
+
+    def _forget(self):
+        # lo pendiente no llegó a la base: sus lecturas ya registradas salen de la cache
+        for sensor_id in self._touched:
+            self.state.discard(sensor_id)
+        self._touched = {}
+        self._hours = set()
+
+    def insert(self, m, procedure_version='v1', raw_payload=FULL):
+        """Inserta m (dict de insert_medicion; m['fila'] = fila del archivo). False si la fila se rechazó."""
+        sensor_id = m.get('sensor_id') or 'unknown'
+        fila = m.get('fila')
+        if PARTITIONS.pending(m.get('timestamp'), m.get('timestamp')):
+            # ensure hace commit: que no se lleve el lote sin su checkpoint
+            self.commit()
+            PARTITIONS.ensure(self.conn, m.get('timestamp'), m.get('timestamp'))
+        flags = list(m.get('validation_flags', []))
+        ok = False
+        with METRICS.stage('escritura', rows=1), self.conn.cursor() as cur:
+            if self._opened is None:
+                self._opened = time.monotonic()
+            for attempt in range(2):
+                cur.execute("SAVEPOINT fila")
+                try:
+                    ts = _insert_medicion(cur, m, sensor_id, procedure_version, self.state, raw_payload)
+                    cur.execute("RELEASE SAVEPOINT fila")
+                    ok = True
+                    break
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    raise       # conexión perdida: no es culpa de la fila
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT fila")
+                    m['validation_flags'] = list(flags)
+                    if isinstance(e, errors.ForeignKeyViolation) and not attempt:
+                        # sensor en cache pero no en la base: olvidarlo y reintentar una vez
+                        forget_sensors([sensor_id])
+                        continue
+                    logger.warning("fila %s rechazada (sensor %s, timestamp %s): %s", fila, sensor_id, m.get('timestamp'), e)
+                    self.rejected.append((fila, str(e).strip()))
+                    break
+        if ok:
+            self.inserted += 1
+            self.state.record(sensor_id, ts, m.get('temperatura'), m.get('humedad'), m.get('presion'))
+            lo, hi = self._touched.get(sensor_id, (ts, ts))
+            self._touched[sensor_id] = (min(lo, ts), max(hi, ts))
+            self._hours.add((sensor_id, ts - ts % HOUR_NS))
+        self.pending += 1
+        if fila is not None:
+            self.next_row = fila + 1
+        if (self.rows and self.pending >= self.rows) or \
+                (self.seconds and time.monotonic() - self._opened >= self.seconds):
+            self.commit()
+        return ok
+
+    def commit(self):
+        if not self.pending:
+            return
+        with self.conn.cursor() as cur:
+            if self._hours:
+                # agregados de las horas tocadas por el lote, en su misma transacción
+                sensors, hours = zip(*self._hours)
+                ROLLUPS.refresh(cur, list(sensors), list(hours))
+            if self.checkpoint is not None and self.next_row is not None:
+                self.checkpoint(cur, self.next_row)
+        try:
+            self.conn.commit()
+        except Exception:
+            self._forget()
+            raise
+        QUERY_CACHE.invalidate(self._touched)
+        self.pending = 0
+        self._opened = None
+        self._touched = {}
+        self._hours = set()
+
+# {columns}/{values}/{updates}: raw_archivo_id y raw_fila si medicion las tiene (RAW_REFS)
+ROW_SQL = """
+WITH up AS (
+INSERT INTO medicion
+(sensor_id, timestamp, temperatura, humedad, presion, radiacion_solar, velocidad_viento, procedure_version, raw_payload{columns})
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s{values})
+ON CONFLICT (sensor_id, timestamp) DO UPDATE
+  SET temperatura = EXCLUDED.temperatura,
+      humedad = EXCLUDED.humedad,
+      presion = EXCLUDED.presion,
+      radiacion_solar = EXCLUDED.radiacion_solar,
+      velocidad_viento = EXCLUDED.velocidad_viento,
+      ingest_ts = now(),
+      raw_payload = EXCLUDED.raw_payload{updates}
+RETURNING medicion_id
+), old AS (
+    DELETE FROM validacion WHERE medicion_id IN (SELECT medicion_id FROM up)
+)
+SELECT medicion_id FROM up;
+"""
+
+def _insert_medicion(cur, m, sensor_id, procedure_version, state, raw_payload):
+    # 1) asegurar existencia del sensor (para evitar FK violation)
+    ensure_sensor_exists(cur, sensor_id)
+
+    # lectura anterior más cercana (cache; consulta sólo si el sensor no está cubierto)
+    ts = to_ns(m.get('timestamp'))
+    with METRICS.stage('qc', rows=1):
+        state.warm(cur, {sensor_id: (ts, ts)})
+        last = state.previous(sensor_id, ts)
+        if last is not None:
+            # comparar y si excede umbral añadir flag a m['validation_flags']
+            for flag in consistency_flags(m, last):
+                m.setdefault('validation_flags', []).append(flag)
+
+    # 2) insertar medición; si ya existía (re-carga) se borran sus validaciones
+    payload = raw_payload.payload(m.get('raw'))
+    refs = RAW_REFS.columns(cur)
+    execute_prepared(
+        cur, 'clima_medicion_refs' if refs else 'clima_medicion',
+        ROW_SQL.format(columns=''.join(f', {c}' for c in refs), values=', %s' * len(refs),
+                       updates=''.join(f', {c} = EXCLUDED.{c}' for c in refs)),
+        (
+            sensor_id,
+            m.get('timestamp'),
+            m.get('temperatura'),
+            m.get('humedad'),
+            m.get('presion'),
+            m.get('radiacion_solar'),
+            m.get('velocidad_viento'),
+            procedure_version,
+            Json(payload, dumps=dumps_raw) if payload is not None else None,
+            *(raw_payload.refs(m.get('fila')) if refs else ())
+        )
+    )
+    
+    # 3) insertar validaciones si las hay
+    medicion_id = cur.fetchone()[0]
+
+    for vf in m.get('validation_flags', []):
+        execute_prepared(
+            cur, 'clima_validacion',
+            "INSERT INTO validacion (medicion_id, tipo_flag, descripcion_problema) VALUES (%s,%s,%s)",
+            (medicion_id, vf.get('tipo'), vf.get('descripcion'))
+        )
+
+    # 4) los agregados por hora/día los recalcula quien confirma (una vez por commit)
+    return ts
+
+
+# --- carga masiva (COPY a staging + merge en una sola sentencia) ---
+
+STAGE_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS medicion_stage (
+    fila BIGINT,
+    sensor_id TEXT,
+    timestamp TIMESTAMPTZ,
+    temperatura DOUBLE PRECISION,
+    humedad DOUBLE PRECISION,
+    presion DOUBLE PRECISION,
+    radiacion_solar DOUBLE PRECISION,
+    velocidad_viento DOUBLE PRECISION,
+    raw_payload JSONB,
+    raw_archivo_id INTEGER,
+    raw_fila BIGINT
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS validacion_stage (
+    orden BIGINT,
+    fila BIGINT,
+    sensor_id TEXT,
+    timestamp TIMESTAMPTZ,
+    tipo_flag TEXT,
+    descripcion_problema TEXT
+) ON COMMIT DELETE ROWS;
+"""
+
+# Se inserta en orden de timestamp: el orden físico sigue al tiempo y los índices BRIN descartan bien.
+# old: si la medición ya existía (re-carga), sus validaciones se reemplazan por las nuevas
+# d: por (sensor_id, timestamp) repetido en el lote gana la última fila; sólo sus
+# flags se guardan (los de las filas descartadas no describen lo escrito)
+# {columns}/{updates}: raw_archivo_id y raw_fila si medicion las tiene (RAW_REFS)
+MERGE_SQL = """
+WITH d AS (
+    SELECT DISTINCT ON (sensor_id, timestamp) *
+    FROM medicion_stage
+    ORDER BY sensor_id, timestamp, fila DESC
+), up AS (
+    INSERT INTO medicion
+    (sensor_id, timestamp, temperatura, humedad, presion, radiacion_solar, velocidad_viento, procedure_version, raw_payload{columns})
+    SELECT sensor_id, timestamp, temperatura, humedad, presion, radiacion_solar, velocidad_viento, %s, raw_payload{columns}
+    FROM d
+    ORDER BY timestamp
+    ON CONFLICT (sensor_id, timestamp) DO UPDATE
+      SET temperatura = EXCLUDED.temperatura,
+          humedad = EXCLUDED.humedad,
+          presion = EXCLUDED.presion,
+          radiacion_solar = EXCLUDED.radiacion_solar,
+          velocidad_viento = EXCLUDED.velocidad_viento,
+          ingest_ts = now(),
+          raw_payload = EXCLUDED.raw_payload{updates}
+    RETURNING medicion_id, sensor_id, timestamp
+), old AS (
+    DELETE FROM validacion WHERE medicion_id IN (SELECT medicion_id FROM up)
+), val AS (
+    INSERT INTO validacion (medicion_id, tipo_flag, descripcion_problema)
+    SELECT up.medicion_id, v.tipo_flag, v.descripcion_problema
+    FROM validacion_stage v JOIN d USING (fila) JOIN up ON up.sensor_id = d.sensor_id AND up.timestamp = d.timestamp
+    ORDER BY v.orden
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM up), (SELECT count(*) FROM val);
+"""
+
+def _ts_text(ts):
+    # timestamps UTC en texto ISO para COPY ('...Z')
+    return np.datetime_as_string(ts.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(), unit='us', timezone='UTC')
+
+def consistency_flags_frame(norm, state):
+    """
+    Chequeo CONSISTENCY columnar: cada fila se compara con la lectura más
+    cercana estrictamente anterior en el tiempo, sea de la base (state, ya
+    precargada para los sensores del lote) o de otra fila del mismo lote.
+    El resultado no depende del orden de las filas en el archivo.
+    Devuelve ({ posición -> [flags] }, lecturas a registrar en state tras el commit).
+    """
+    out, written = {}, []
+    ts_all = pd.DatetimeIndex(norm['timestamp']).as_unit('ns').asi8
+    temp_all = norm['temperatura'].to_numpy(dtype=float)
+    hum_all = norm['humedad'].to_numpy(dtype=float)
+    pres_all = norm['presion'].to_numpy(dtype=float)
+    groups = norm.groupby('sensor_id', sort=False, dropna=False).indices
+    for sensor_id, pos in groups.items():
+        ts, temp, hum = ts_all[pos], temp_all[pos], hum_all[pos]
+        # lecturas que quedan escritas: por timestamp gana la última fila del archivo
+        u_ts, last_idx = np.unique(ts[::-1], return_index=True)
+        last_idx = len(ts) - 1 - last_idx
+        u_temp, u_hum, u_pres = temp[last_idx], hum[last_idx], pres_all[pos][last_idx]
+        written.append((sensor_id, u_ts, u_temp, u_hum, u_pres))
+
+        h_ts, h_temp, h_hum, _ = state.history(sensor_id)
+        keep = ~np.isin(h_ts, u_ts)
+        all_ts = np.concatenate([h_ts[keep], u_ts])
+        order = np.argsort(all_ts, kind='stable')
+        all_ts = all_ts[order]
+        all_temp = np.concatenate([h_temp[keep], u_temp])[order]
+        all_hum = np.concatenate([h_hum[keep], u_hum])[order]
+
+        prev = np.searchsorted(all_ts, ts, side='left') - 1
+        has_prev = prev >= 0
+        prev = np.where(has_prev, prev, 0)
+        checks = (
+            ('temperatura', temp, all_temp, 'temp'),
+            ('humedad', hum, all_hum, 'hum'),
+        )
+        limit = {var: LIMITS.get(var, 'cambio_maximo') for var, *_ in checks}
+        with np.errstate(invalid='ignore'):
+            bad = {var: has_prev & (np.abs(values - ref[prev]) > limit[var]) if limit[var] is not None else np.zeros(len(ts), dtype=bool)
+                   for var, values, ref, _ in checks}
+        for i in np.flatnonzero(bad['temperatura'] | bad['humedad']):
+            flags = out.setdefault(int(pos[i]), [])
+            for var, values, ref, label in checks:
+                if bad[var][i]:
+                    flags.append({'tipo':'CONSISTENCY','descripcion': f'{label} change {float(values[i])} vs {float(ref[prev[i]])}'})
+    return out, written
+
+def _copy_rows(cur, table, columns, rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def _merge_batch(cur, batch, raw, procedure_version, state, raw_payload):
+    cur.execute(STAGE_DDL)
+    norm = batch.to_frame()
+    sensor_ids = norm['sensor_id'].astype(str)
+    ts_text = _ts_text(norm['timestamp'])
+
+    # 1) medicion -> staging con COPY
+    stage = pd.DataFrame({'fila': np.arange(len(norm)), 'sensor_id': sensor_ids.to_numpy(), 'timestamp': ts_text})
+    for var in VARIABLES:
+        stage[var] = norm[var].to_numpy()
+    stage['raw_payload'] = raw_payload.payloads(raw)
+    refs = RAW_REFS.columns(cur)
+    if refs:
+        stage['raw_archivo_id'], stage['raw_fila'] = raw_payload.refs(batch.rows)
+    buf = io.StringIO()
+    stage.to_csv(buf, header=False, index=False, na_rep='')
+    buf.seek(0)
+    cur.copy_expert(f"COPY medicion_stage ({', '.join(stage.columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+    # 2) sensores nuevos (los ya conocidos no tocan la tabla sensor)
+    ensure_sensors(cur, sensor_ids.unique().tolist())
+
+    # 3) flags: RANGE (normalize) + CONSISTENCY (cache precargada con una consulta por lote)
+    with METRICS.stage('qc', rows=len(norm)):
+        keyed = norm.assign(sensor_id=sensor_ids)
+        bounds = keyed.groupby('sensor_id')['timestamp'].agg(['min', 'max'])
+        state.warm(cur, {s: (to_ns(lo), to_ns(hi)) for s, lo, hi in bounds.itertuples()})
+        consistency, written = consistency_flags_frame(keyed, state)
+        flagged = {}
+        for k, i in enumerate(batch.flag_row.tolist()):
+            flagged.setdefault(i, []).append(batch.describe_flag(k))
+        flag_rows = []
+        for i in sorted(set(flagged) | set(consistency)):
+            for tipo, descripcion in flagged.get(i, []) + [(vf['tipo'], vf['descripcion']) for vf in consistency.get(i, [])]:
+                flag_rows.append((len(flag_rows), i, sensor_ids.iat[i], ts_text[i], tipo, descripcion))
+    if flag_rows:
+        _copy_rows(cur, 'validacion_stage', ['orden', 'fila', 'sensor_id', 'timestamp', 'tipo_flag', 'descripcion_problema'],
+                   flag_rows)
+
+    # 4) merge + validaciones en una sola sentencia
+    cur.execute(MERGE_SQL.format(columns=''.join(f', {c}' for c in refs),
+                                 updates=''.join(f', {c} = EXCLUDED.{c}' for c in refs)), (procedure_version,))
+    n_medicion, n_validacion = cur.fetchone()
+
+    # 5) agregados por hora/día: sólo los buckets que tocó el lote
+    ROLLUPS.refresh(cur, sensor_ids.to_numpy(), norm['timestamp'])
+    return n_medicion, written
+
+def insert_mediciones_bulk(conn, norm, raw=None, procedure_version='v1', batch_size=BULK_BATCH_SIZE, state=None, checkpoint=None,
+                           raw_payload=FULL):
+    """
+    norm: MeasurementBatch de normalize.normalize_batch (o DataFrame de
+      normalize_frame; se pasa a lote y los flags RANGE se recalculan)
+    raw: DataFrame crudo con el mismo índice (para raw_payload), opcional
+    raw_payload: RawPayload del archivo (qué se guarda de raw, ver src.raw_payload)
+    state: SensorStateCache para el chequeo CONSISTENCY (default: SENSOR_STATE)
+    checkpoint: callable(cur, fila_siguiente) que se ejecuta en la transacción
+      de cada lote; fila_siguiente = índice de la última fila del lote + 1
+    Inserta en lotes de batch_size filas con COPY + merge, un commit por lote.
+    Retorna la cantidad de mediciones insertadas/actualizadas.
+    """
+    state = SENSOR_STATE if state is None else state
+    norm = MeasurementBatch.from_frame(norm)
+    if len(norm):
+        PARTITIONS.ensure_months(conn, months_present(norm['timestamp']))
+    total = 0
+    for start in range(0, len(norm), batch_size):
+        part = norm[start:start + batch_size]
+        raw_part = raw.iloc[start:start + batch_size] if raw is not None else None
+        for attempt in range(2):
+            try:
+                with METRICS.stage('escritura', rows=len(part)), conn.cursor() as cur:
+                    n, written = _merge_batch(cur, part, raw_part, procedure_version, state, raw_payload)
+                    if checkpoint is not None:
+                        checkpoint(cur, int(part.index[-1]) + 1)
+                break
+            except errors.ForeignKeyViolation:
+                # algún sensor de KNOWN_SENSORS ya no existe: olvidar los del lote y reintentar una vez
+                conn.rollback()
+                if attempt:
+                    raise
+                forget_sensors(part['sensor_id'].astype(str).unique())
+            except Exception:
+                logger.exception("insert_mediciones_bulk: lote desde fila %d", start)
+                conn.rollback()
+                raise
+        conn.commit()
+        total += n
+        for sensor_id, *reading in written:
+            state.record_many(sensor_id, *reading)
+        QUERY_CACHE.invalidate({sensor_id: (int(ts[0]), int(ts[-1])) for sensor_id, ts, *_ in written if len(ts)})
+    return total
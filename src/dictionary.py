@@ -1,17 +1,234 @@
-from src.config import DB
-import psycopg2
+# src/dictionary.py
+# Diccionario de variables: sinónimos de la tabla variable_sinonimo + mapeo
+# local de respaldo, resueltos por un único VariableResolver; y los umbrales
+# de control de calidad de la tabla variable (VariableLimits).
+import json
+import os
+import time
+from pathlib import Path
+from src.pool import POOL
+
+CACHE_PATH = os.getenv('VARMAP_CACHE', str(Path.home() / '.cache' / 'clima_tesis' / 'variable_map.json'))
+CACHE_TTL = int(os.getenv('VARMAP_TTL', 3600))              # segundos antes de revisar la base
+CONNECT_TIMEOUT = int(os.getenv('VARMAP_CONNECT_TIMEOUT', 3))   # espera máxima por el pool y al conectar
+
+# mapeo local: sinónimo -> (nombre_estandar, unidad de entrada)
+LOCAL_MAP = {
+    'temp_f': ('temperatura', 'f'),
+    'temp': ('temperatura', 'c'),
+    't': ('temperatura', 'c'),
+    'temperature': ('temperatura', 'c'),
+    'h': ('humedad', 'percent'),
+    'hum': ('humedad', 'percent'),
+    'humidity': ('humedad', 'percent'),
+    'p': ('presion', 'pa'),
+    'pa': ('presion', 'pa'),
+    'pressure': ('presion', 'pa'),
+    'radiacion': ('radiacion_solar', 'w_m2'),
+    'rad': ('radiacion_solar', 'w_m2'),
+    'wind_speed': ('velocidad_viento', 'm_s'),
+    'wind': ('velocidad_viento', 'm_s'),
+}
+
+# umbrales por variable, como en la tabla variable (respaldo sin base):
+#   rango_minimo / rango_maximo: RANGE
+#   cambio_maximo: CONSISTENCY, cambio máximo contra la lectura anterior
+#   salto_maximo: SPIKE / STEP, amplitud de un pico o escalón
+#   tasa_maxima: RATE, cambio máximo por hora
+#   plano_minutos: FLATLINE, minutos con el mismo valor
+# None = chequeo desactivado para esa variable
+LIMIT_FIELDS = ('rango_minimo', 'rango_maximo', 'cambio_maximo', 'salto_maximo', 'tasa_maxima', 'plano_minutos')
+LOCAL_LIMITS = {
+    'temperatura': dict(zip(LIMIT_FIELDS, (-60, 60, 10, 5, 10, 180))),
+    'humedad': dict(zip(LIMIT_FIELDS, (0, 100, 30, 20, 40, 720))),
+    'presion': dict(zip(LIMIT_FIELDS, (300, 1100, None, 3, 6, 720))),
+    'radiacion_solar': dict(zip(LIMIT_FIELDS, (0, 2000, None, None, None, None))),
+    'velocidad_viento': dict(zip(LIMIT_FIELDS, (0, 100, None, 15, None, 360))),
+}
+
+VERSION_SQL = """
+SELECT count(*) || ':' || coalesce(md5(string_agg(nombre_sinonimo || '=' || nombre_estandar, ',' ORDER BY nombre_sinonimo)), '')
+FROM variable_sinonimo;
+"""
+
+def _connection():
+    # conexión del pool del proceso; sin base disponible falla rápido (los llamadores caen al mapeo local)
+    return POOL.connection(timeout=CONNECT_TIMEOUT, connect_timeout=CONNECT_TIMEOUT)
 
 def load_variable_map():
     """
     Retorna dict: { sinonimo -> nombre_estandar }
     """
-    conn = psycopg2.connect(
-        host=DB['host'], dbname=DB['dbname'], user=DB['user'],
-        password=DB['password'], port=DB['port']
-    )
-    cur = conn.cursor()
-    cur.execute("SELECT nombre_sinonimo, nombre_estandar FROM variable_sinonimo;")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return {r[0].lower(): r[1] for r in rows}
\ No newline at end of file
+    with _connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT nombre_sinonimo, nombre_estandar FROM variable_sinonimo;")
+        rows = cur.fetchall()
+    return {r[0].lower(): r[1] for r in rows}
+
+def fetch_synonyms(version=None):
+    """
+    (version, {sinonimo -> nombre_estandar}) desde la base. Si la versión de la
+    tabla coincide con version, no se leen los sinónimos: retorna (version, None).
+    """
+    with _connection() as conn, conn.cursor() as cur:
+        cur.execute(VERSION_SQL)
+        current = cur.fetchone()[0]
+        if current == version:
+            return current, None
+        cur.execute("SELECT nombre_sinonimo, nombre_estandar FROM variable_sinonimo;")
+        return current, {r[0].lower(): r[1] for r in cur.fetchall()}
+
+def fetch_limits():
+    """{nombre_estandar -> {columna -> valor}} de la tabla variable (sólo las columnas que existan)."""
+    with _connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT nombre_estandar, to_jsonb(v) FROM variable v;")
+        return dict(cur.fetchall())
+
+def infer_hint(key, variable):
+    # la tabla sólo da nombre_estandar; la unidad de entrada se deduce del nombre
+    if variable == 'temperatura' and key.endswith('f'):
+        return 'f'
+    if variable == 'presion' and (key == 'p' or (key.endswith('pa') and not key.endswith('hpa'))):
+        return 'pa'
+    return None
+
+class VariableResolver:
+    """
+    Resuelve nombres de columna a (variable, unidad de entrada).
+    Carga perezosa: nada se lee hasta el primer uso. Los sinónimos de la base
+    se guardan en cache_path y sólo se vuelve a consultar la base cuando pasa
+    el TTL; entonces se compara la versión de la tabla y se recargan si cambió.
+    El mapeo en memoria también vence con el TTL (procesos largos ven los
+    sinónimos nuevos); si cambió, se descartan los planes compilados.
+    Sin base disponible se usa la cache (aunque esté vencida) o sólo LOCAL_MAP.
+    """
+
+    MAX_PLANS = 256
+
+    def __init__(self, cache_path=CACHE_PATH, ttl=CACHE_TTL, fetch=fetch_synonyms):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.ttl = ttl
+        self.fetch = fetch
+        self._map = None
+        self._loaded_at = None     # time.monotonic() de la última carga de _map
+        self._plans = {}
+
+    def _read_cache(self):
+        if self.cache_path is None or not self.cache_path.exists():
+            return None
+        try:
+            return json.loads(self.cache_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, cached):
+        if self.cache_path is None:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(cached), encoding='utf-8')
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def _load_synonyms(self, force=False):
+        cached = self._read_cache()
+        if cached and not force and time.time() - cached.get('saved_at', 0) < self.ttl:
+            return cached['synonyms']
+        try:
+            version, synonyms = self.fetch(None if force or not cached else cached.get('version'))
+        except Exception:
+            return cached['synonyms'] if cached else {}
+        if synonyms is None:
+            synonyms = cached['synonyms']
+        self._write_cache({'version': version, 'saved_at': time.time(), 'synonyms': synonyms})
+        return synonyms
+
+    def _build(self, synonyms):
+        merged = {k: (v, infer_hint(k, v)) for k, v in synonyms.items()}
+        merged.update(LOCAL_MAP)   # el mapeo local trae la unidad explícita
+        return merged
+
+    @property
+    def mapping(self):
+        if self._map is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self.refresh()
+        return self._map
+
+    def refresh(self, force=False):
+        """
+        Vuelve a cargar (force=True ignora TTL y versión). Si el mapeo cambió,
+        descarta los planes compilados con el anterior.
+        """
+        new = self._build(self._load_synonyms(force=force))
+        self._loaded_at = time.monotonic()
+        if new != self._map:
+            self._map = new
+            self._plans.clear()
+
+    def resolve(self, key):
+        """(nombre_estandar, unidad) o (None, None) si la columna no es una variable conocida."""
+        return self.mapping.get(str(key).lower(), (None, None))
+
+    def plan(self, columns):
+        """
+        Plan de lectura de un encabezado: [(columna, variable, unidad)] en el
+        orden de las columnas. Se compila una vez por encabezado.
+        """
+        key = tuple(columns)
+        self.mapping          # vencido el TTL, recarga (y vacía _plans si cambió)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = []
+            for col in key:
+                out, hint = self.resolve(col)
+                if out:
+                    plan.append((col, out, hint))
+            if len(self._plans) >= self.MAX_PLANS:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+# resolver compartido por todo el proceso (no toca la base hasta el primer uso)
+RESOLVER = VariableResolver()
+
+class VariableLimits:
+    """
+    Umbrales de QC por variable. Se leen de la tabla variable en el primer uso;
+    lo que la tabla no tenga (base sin migraciones/003_qc_umbrales.sql, o sin
+    base) sale de LOCAL_LIMITS. Un NULL en la tabla desactiva el chequeo.
+    """
+
+    def __init__(self, fetch=fetch_limits):
+        self.fetch = fetch
+        self._limits = None
+
+    def _load(self):
+        limits = {var: dict(values) for var, values in LOCAL_LIMITS.items()}
+        try:
+            rows = self.fetch()
+        except Exception:
+            return limits
+        for var, row in rows.items():
+            current = limits.setdefault(var, dict.fromkeys(LIMIT_FIELDS))
+            current.update({k: row[k] for k in LIMIT_FIELDS if k in row})
+        return limits
+
+    @property
+    def limits(self):
+        if self._limits is None:
+            self._limits = self._load()
+        return self._limits
+
+    def refresh(self):
+        self._limits = self._load()
+
+    def get(self, variable, field):
+        return self.limits.get(variable, {}).get(field)
+
+    def range(self, variable):
+        """(rango_minimo, rango_maximo); None en un extremo = sin límite."""
+        return self.get(variable, 'rango_minimo'), self.get(variable, 'rango_maximo')
+
+# umbrales compartidos por todo el proceso
+LIMITS = VariableLimits()
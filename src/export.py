@@ -1,20 +1,270 @@
 # src/export.py
-import xarray as xr
+# Exportación de medicion a NetCDF4 (CF-1.8, featureType timeSeries).
+# Se lee con un cursor del lado del servidor y se escribe por bloques de
+# time_chunk instantes, así la memoria no depende del largo de la exportación.
+import argparse
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+import netCDF4
+import numpy as np
 import pandas as pd
+from src.db import VARIABLES
+from src.pool import borrowed
 
-def export_mediciones_to_netcdf(df, out_path):
-    """
-    df: pandas DataFrame con columnas: timestamp, sensor_id, var_name, value
-    Para nuestro caso primero pivotear por variable.
-    """
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_convert('UTC')
-    ds_vars = {}
-    for var in ['temperatura','humedad','presion','radiacion_solar','velocidad_viento']:
-        sub = df[df['variable']==var]
-        if sub.empty:
-            continue
-        pivot = sub.pivot_table(index='timestamp', columns='sensor_id', values='value')
-        ds_vars[var] = xr.DataArray(pivot, dims=('time','sensor'), coords={'time':pivot.index, 'sensor':pivot.columns})
-    ds = xr.Dataset(ds_vars)
-    ds.attrs['Conventions'] = 'CF-1.8'
-    ds.to_netcdf(out_path)
+TIME_CHUNK = 1024      # instantes por chunk HDF5 (y por bloque escrito)
+FETCH_ROWS = 50000     # filas por viaje del cursor del servidor
+COMPLEVEL = 4
+SPLITS = ['month', 'sensor']
+
+CF_ATTRS = {
+    'temperatura': {'standard_name': 'air_temperature', 'long_name': 'Temperatura del aire', 'units': 'degC'},
+    'humedad': {'standard_name': 'relative_humidity', 'long_name': 'Humedad relativa', 'units': 'percent'},
+    'presion': {'standard_name': 'air_pressure', 'long_name': 'Presion atmosferica', 'units': 'hPa'},
+    'radiacion_solar': {'standard_name': 'surface_downwelling_shortwave_flux_in_air', 'long_name': 'Radiacion solar', 'units': 'W m-2'},
+    'velocidad_viento': {'standard_name': 'wind_speed', 'long_name': 'Velocidad del viento', 'units': 'm s-1'},
+}
+
+SENSORS_SQL = """
+SELECT s.sensor_id, u.latitud, u.longitud
+FROM sensor s LEFT JOIN ubicacion u USING (ubicacion_id)
+WHERE EXISTS (SELECT 1 FROM medicion m
+              WHERE m.sensor_id = s.sensor_id AND m.timestamp >= %s AND m.timestamp < %s)
+  AND (%s::text[] IS NULL OR s.sensor_id = ANY(%s::text[]))
+ORDER BY s.sensor_id;
+"""
+
+ROWS_SQL = """
+SELECT (extract(epoch FROM timestamp) * 1000000)::bigint, sensor_id,
+       temperatura, humedad, presion, radiacion_solar, velocidad_viento
+FROM medicion
+WHERE timestamp >= %s AND timestamp < %s AND sensor_id = ANY(%s::text[])
+ORDER BY timestamp;
+"""
+
+class NetcdfTimeSeriesWriter:
+    """
+    Archivo NetCDF4 con dimensiones (time ilimitada, sensor). Las variables se
+    comprimen con zlib y se guardan en chunks (time_chunk, 1): leer la serie de
+    un sensor toca sólo sus chunks.
+    """
+
+    def __init__(self, path, sensors, lats=None, lons=None, time_chunk=TIME_CHUNK, complevel=COMPLEVEL):
+        self.time_chunk = time_chunk
+        self.n = 0
+        self.ds = ds = netCDF4.Dataset(path, 'w', format='NETCDF4')
+        ds.createDimension('time', None)
+        ds.createDimension('sensor', len(sensors))
+        t = ds.createVariable('time', 'i8', ('time',), chunksizes=(time_chunk,))
+        t.standard_name = 'time'
+        t.long_name = 'Tiempo de la medicion'
+        t.units = 'microseconds since 1970-01-01 00:00:00 UTC'   # exacto para timestamptz
+        t.calendar = 'standard'
+        t.axis = 'T'
+        sid = ds.createVariable('sensor_id', str, ('sensor',))
+        sid.cf_role = 'timeseries_id'
+        sid.long_name = 'Identificador del sensor'
+        sid[:] = np.array(list(sensors), dtype=object)
+        for name, values, std, units in (('lat', lats, 'latitude', 'degrees_north'),
+                                         ('lon', lons, 'longitude', 'degrees_east')):
+            v = ds.createVariable(name, 'f8', ('sensor',), fill_value=np.nan)
+            v.standard_name = std
+            v.units = units
+            v[:] = np.full(len(sensors), np.nan) if values is None else np.asarray(values, dtype=float)
+        for var in VARIABLES:
+            v = ds.createVariable(var, 'f8', ('time', 'sensor'), zlib=True, complevel=complevel, shuffle=True,
+                                  chunksizes=(time_chunk, 1), fill_value=np.nan)
+            v.setncatts(CF_ATTRS[var])
+            v.coordinates = 'lat lon sensor_id'
+            # un bloque completo de chunks (time_chunk x todos los sensores) cabe en la cache
+            v.set_var_chunk_cache(size=max(1 << 20, time_chunk * len(sensors) * 8 * 2))
+        ds.Conventions = 'CF-1.8'
+        ds.featureType = 'timeSeries'
+        ds.title = 'Mediciones de estaciones meteorologicas'
+        ds.source = 'tabla medicion (clima.tesis)'
+        ds.history = f"{datetime.now(timezone.utc):%Y-%m-%dT%H:%M:%SZ} exportado con src.export"
+
+    def append(self, ts_us, grids):
+        """ts_us: instantes (µs desde epoch, crecientes); grids: { variable -> array (len(ts_us), sensores) }"""
+        k = len(ts_us)
+        self.ds['time'][self.n:self.n + k] = np.asarray(ts_us, dtype=np.int64)
+        for var, grid in grids.items():
+            self.ds[var][self.n:self.n + k, :] = grid
+        self.n += k
+
+    def close(self):
+        if self.n:
+            t = self.ds['time']
+            self.ds.time_coverage_start = pd.Timestamp(int(t[0]), unit='us', tz='UTC').isoformat()
+            self.ds.time_coverage_end = pd.Timestamp(int(t[self.n - 1]), unit='us', tz='UTC').isoformat()
+        self.ds.close()
+
+def _grids(block, sensor_index, n_sensors):
+    # filas (ts_us, sensor_id, variables...) -> una grilla (instantes x sensores) por variable
+    ts = block['ts_us'].to_numpy()
+    uniq = np.unique(ts)
+    t_idx = np.searchsorted(uniq, ts)
+    s_idx = sensor_index.get_indexer(block['sensor_id'])
+    grids = {}
+    for var in VARIABLES:
+        grid = np.full((len(uniq), n_sensors), np.nan)
+        grid[t_idx, s_idx] = block[var].to_numpy(dtype=float)
+        grids[var] = grid
+    return uniq, grids
+
+def write_frames(writer, frames, sensors):
+    """
+    Escribe en writer una secuencia de DataFrames (ts_us, sensor_id, variables)
+    ordenados por ts_us. Se escribe de a time_chunk instantes; las filas del
+    último instante de cada frame se retienen por si sigue en el siguiente.
+    Retorna la cantidad de filas escritas.
+    """
+    sensor_index = pd.Index(sensors)
+    pending = None
+    rows = 0
+
+    def flush(block):
+        uniq, grids = _grids(block, sensor_index, len(sensors))
+        writer.append(uniq, grids)
+        return len(block)
+
+    for frame in frames:
+        pending = frame if pending is None else pd.concat([pending, frame], ignore_index=True)
+        ts = pending['ts_us'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, ts[1:] != ts[:-1]])   # primera fila de cada instante
+        # instantes completos: todos menos el último
+        while len(starts) - 1 >= writer.time_chunk:
+            cut = starts[writer.time_chunk]
+            rows += flush(pending.iloc[:cut])
+            pending = pending.iloc[cut:].reset_index(drop=True)
+            starts = starts[writer.time_chunk:] - cut
+    if pending is not None and len(pending):
+        rows += flush(pending)
+    return rows
+
+def _fetch_frames(conn, start, end, sensors, fetch_rows):
+    # cursor con nombre = cursor del lado del servidor: llegan fetch_rows filas por viaje
+    with conn.cursor(name='export_medicion') as cur:
+        cur.itersize = fetch_rows
+        cur.execute(ROWS_SQL, (start, end, list(sensors)))
+        while True:
+            batch = cur.fetchmany(fetch_rows)
+            if not batch:
+                break
+            yield pd.DataFrame.from_records(batch, columns=['ts_us', 'sensor_id'] + VARIABLES)
+
+def _sensors(conn, start, end, sensor_ids=None):
+    with conn.cursor() as cur:
+        cur.execute(SENSORS_SQL, (start, end, sensor_ids, sensor_ids))
+        return cur.fetchall()
+
+def _time_range(conn, sensor_ids=None):
+    with conn.cursor() as cur:
+        cur.execute("SELECT min(timestamp), max(timestamp) FROM medicion "
+                    "WHERE %s::text[] IS NULL OR sensor_id = ANY(%s::text[])", (sensor_ids, sensor_ids))
+        lo, hi = cur.fetchone()
+    if lo is None:
+        return None, None
+    return pd.Timestamp(lo), pd.Timestamp(hi) + pd.Timedelta(microseconds=1)
+
+def _export_file(conn, path, start, end, sensor_rows, time_chunk, complevel, fetch_rows):
+    sensors = [r[0] for r in sensor_rows]
+    writer = NetcdfTimeSeriesWriter(path, sensors, [r[1] for r in sensor_rows], [r[2] for r in sensor_rows],
+                                    time_chunk=time_chunk, complevel=complevel)
+    try:
+        rows = write_frames(writer, _fetch_frames(conn, start, end, sensors, fetch_rows), sensors)
+    finally:
+        writer.close()
+    return {'archivo': str(path), 'filas': rows, 'instantes': writer.n, 'sensores': len(sensors)}
+
+def _safe_name(s):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(s))
+
+def export_netcdf(conn, out_path, start=None, end=None, sensor_ids=None, split=None,
+                  time_chunk=TIME_CHUNK, complevel=COMPLEVEL, fetch_rows=FETCH_ROWS):
+    """
+    Exporta medicion en [start, end) a NetCDF4 sin cargar la tabla en memoria.
+    split: None (un archivo en out_path), 'month' (un archivo por mes) o
+      'sensor' (uno por sensor); con split, out_path es un directorio.
+    Retorna [{'archivo', 'filas', 'instantes', 'sensores'}] por archivo escrito.
+    conn: conexión a usar, sin tocar su transacción (None = una de POOL).
+    La memoria es del orden de time_chunk x sensores por variable.
+    """
+    if split not in (None, *SPLITS):
+        raise ValueError(f"split desconocido: {split} (opciones: {', '.join(SPLITS)})")
+    sensor_ids = list(sensor_ids) if sensor_ids else None
+    with borrowed(conn) as conn:
+        if start is None or end is None:
+            lo, hi = _time_range(conn, sensor_ids)
+            if lo is None:
+                return []
+            start = lo if start is None else start
+            end = hi if end is None else end
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        start = start.tz_localize('UTC') if start.tzinfo is None else start
+        end = end.tz_localize('UTC') if end.tzinfo is None else end
+
+        if split is None:
+            jobs = [(Path(out_path), start, end, sensor_ids)]
+        else:
+            out_dir = Path(out_path)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            if split == 'month':
+                months = pd.date_range(start.normalize().replace(day=1), end, freq='MS', inclusive='right')
+                edges = [start] + list(months) + [end]
+                jobs = [(out_dir / f"medicion_{lo:%Y-%m}.nc", lo, hi, sensor_ids)
+                        for lo, hi in zip(edges[:-1], edges[1:]) if lo < hi]
+            else:
+                jobs = [(out_dir / f"medicion_{_safe_name(s)}.nc", start, end, [s])
+                        for s, _, _ in _sensors(conn, start, end, sensor_ids)]
+
+        written = []
+        for path, lo, hi, ids in jobs:
+            sensor_rows = _sensors(conn, lo.to_pydatetime(), hi.to_pydatetime(), ids)
+            if not sensor_rows:
+                continue
+            written.append(_export_file(conn, path, lo.to_pydatetime(), hi.to_pydatetime(), sensor_rows,
+                                        time_chunk, complevel, fetch_rows))
+        return written
+
+def export_mediciones_to_netcdf(df, out_path, time_chunk=TIME_CHUNK, complevel=COMPLEVEL):
+    """
+    df: pandas DataFrame con columnas timestamp, sensor_id y una columna por
+    variable (formato de medicion / normalize_frame) o un MeasurementBatch.
+    También acepta el formato largo con columnas variable, value.
+    """
+    if 'variable' in df.columns:
+        df = df.pivot_table(index=['timestamp', 'sensor_id'], columns='variable', values='value').reset_index()
+    ts = pd.to_datetime(df['timestamp'], utc=True)
+    frame = pd.DataFrame({'ts_us': ts.dt.as_unit('us').astype('int64').to_numpy(),
+                          'sensor_id': df['sensor_id'].astype(str).to_numpy()})
+    for var in VARIABLES:
+        frame[var] = df[var].to_numpy(dtype=float) if var in df.columns else np.nan
+    frame = frame.sort_values('ts_us', kind='stable', ignore_index=True)
+    sensors = sorted(frame['sensor_id'].unique())
+    writer = NetcdfTimeSeriesWriter(out_path, sensors, time_chunk=time_chunk, complevel=complevel)
+    try:
+        write_frames(writer, [frame], sensors)
+    finally:
+        writer.close()
+
+if __name__ == "__main__":
+    from src.config import DB
+    from src.db import get_conn
+    parser = argparse.ArgumentParser(prog='python -m src.export')
+    parser.add_argument('out', help='archivo .nc (o directorio con --split)')
+    parser.add_argument('--start', help='inicio (incluido), p.ej. 2025-01-01')
+    parser.add_argument('--end', help='fin (excluido)')
+    parser.add_argument('--sensor', action='append', dest='sensors', help='sensor a exportar (repetible)')
+    parser.add_argument('--split', choices=SPLITS, default=None, help='un archivo por mes o por sensor')
+    parser.add_argument('--time-chunk', type=int, default=TIME_CHUNK, help='instantes por chunk')
+    parser.add_argument('--complevel', type=int, default=COMPLEVEL, help='nivel zlib (1-9)')
+    args = parser.parse_args()
+    conn = get_conn(DB)
+    try:
+        files = export_netcdf(conn, args.out, start=args.start, end=args.end, sensor_ids=args.sensors,
+                              split=args.split, time_chunk=args.time_chunk, complevel=args.complevel)
+    finally:
+        conn.close()
+    for f in files:
+        print(f"{f['archivo']}: {f['filas']} filas, {f['instantes']} instantes, {f['sensores']} sensores")
@@ -1,5 +1,12 @@
 # src/ingest.py
+import codecs
+import io
+from contextlib import nullcontext
 import pandas as pd
+from src.metrics import METRICS
+
+SAMPLE_BYTES = 1 << 20      # prefijo usado para detectar el encoding
+CHUNK_ROWS = 100000         # filas por chunk en lectura streaming
 
 def read_csv(path):
     try:
@@ -7,6 +14,110 @@ def read_csv(path):
     except UnicodeDecodeError:
         return pd.read_csv(path, encoding='latin-1')
 
+def detect_encoding(path, sample_bytes=SAMPLE_BYTES):
+    """
+    'utf-8' si el prefijo muestreado decodifica como utf-8, si no 'latin-1'.
+    Un carácter multibyte cortado al final de la muestra no cuenta como error.
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def csv_records(f):
+    """
+    Registros (bytes, es_fila) del CSV f abierto en binario, de a una línea:
+    uno ocupa varias líneas si un campo entre comillas sigue en la siguiente
+    (comillas impares); las líneas en blanco no son filas para pandas (ni
+    para la numeración de iter_csv).
+    """
+    pending, quotes = [], 0
+    for line in f:
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2:
+            continue
+        record = b''.join(pending) if len(pending) > 1 else line
+        pending, quotes = [], 0
+        yield record, bool(record.strip())
+    if pending:
+        record = b''.join(pending)
+        yield record, bool(record.strip())
+
+class _HeaderThenRest(io.RawIOBase):
+    # encabezado ya leído + lo que queda de f: lo que ve pandas al retomar
+    def __init__(self, header, f):
+        self.header, self.f = header, f
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.header:
+            n = min(len(b), len(self.header))
+            b[:n], self.header = self.header[:n], self.header[n:]
+            return n
+        return self.f.readinto(b)
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+def _open_after(path, rows):
+    """
+    Archivo binario que empieza con el encabezado y sigue tras las primeras
+    `rows` filas de datos. Se avanza de a un registro (memoria constante),
+    sin armar la lista de filas a saltar.
+    """
+    f = open(path, 'rb')
+    header = b''
+    records = csv_records(f)
+    for record, is_row in records:
+        header += record
+        if is_row:
+            break
+    skipped = 0
+    while skipped < rows:
+        record, is_row = next(records, (None, True))
+        if record is None:
+            break
+        skipped += is_row
+    return io.BufferedReader(_HeaderThenRest(header, f))
+
+def iter_csv(path, chunksize=CHUNK_ROWS, encoding=None, skip_rows=0):
+    """
+    Lee el CSV en chunks de chunksize filas (memoria acotada al chunk).
+    El índice de cada chunk es la posición de la fila de datos en el archivo.
+    skip_rows: filas de datos a saltar al inicio (p.ej. para retomar una carga);
+    se avanzan en streaming, sin pasar a pandas la lista de filas a saltar.
+    Si el prefijo parecía utf-8 pero más adelante hay bytes inválidos, sigue
+    en latin-1 desde la primera fila no entregada.
+    """
+    encoding = encoding or detect_encoding(path)
+    done = skip_rows
+    while True:
+        try:
+            source = _open_after(path, done) if done else nullcontext(path)
+            with source as src, pd.read_csv(src, encoding=encoding, chunksize=chunksize) as reader:
+                while True:
+                    # sólo se mide la lectura del chunk, no lo que hace el consumidor entre yields
+                    with METRICS.stage('lectura') as t:
+                        chunk = next(reader, None)
+                        t.rows = 0 if chunk is None else len(chunk)
+                    if chunk is None:
+                        break
+                    chunk.index = pd.RangeIndex(done, done + len(chunk))
+                    done += len(chunk)
+                    yield chunk
+            return
+        except UnicodeDecodeError:
+            if encoding == 'latin-1':
+                raise
+            encoding = 'latin-1'
+
 def rows_from_df(df):
     for _, r in df.iterrows():
         yield r.to_dict()
@@ -0,0 +1,65 @@
+# src/ledger.py
+# Registro de archivos cargados (tabla ingesta_archivo): hash del contenido,
+# tamaño y última fila confirmada, para saltar archivos completos y retomar
+# los que quedaron a medias.
+import hashlib
+from src.pool import execute_prepared
+
+HASH_BLOCK = 1 << 20
+
+def file_fingerprint(path):
+    """(sha256 hex del contenido, tamaño en bytes)"""
+    h = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            h.update(block)
+            size += len(block)
+    return h.hexdigest(), size
+
+def ledger_start(conn, path, digest, size, resume=True):
+    """
+    Registra el archivo (o lo reencuentra por hash, aunque haya cambiado de
+    ruta) y retorna (fila desde la que seguir, completo).
+    resume=False vuelve el registro a cero para cargar el archivo de nuevo.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO ingesta_archivo (hash_contenido, archivo, tamano_bytes)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (hash_contenido) DO UPDATE
+              SET archivo = EXCLUDED.archivo,
+                  filas_confirmadas = CASE WHEN %s THEN ingesta_archivo.filas_confirmadas ELSE 0 END,
+                  completo = CASE WHEN %s THEN ingesta_archivo.completo ELSE false END,
+                  actualizado = now()
+            RETURNING filas_confirmadas, completo
+            """,
+            (digest, path, size, resume, resume)
+        )
+        offset, done = cur.fetchone()
+    conn.commit()
+    return offset, done
+
+def checkpoint(cur, next_row, digest):
+    """
+    Avanza la última fila confirmada. Se llama con el cursor del lote, antes
+    de su commit: datos y checkpoint quedan en la misma transacción.
+    """
+    execute_prepared(
+        cur, 'clima_checkpoint',
+        "UPDATE ingesta_archivo SET filas_confirmadas = %s, actualizado = now() WHERE hash_contenido = %s",
+        (next_row, digest)
+    )
+
+def ledger_finish(conn, digest, rows):
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE ingesta_archivo SET filas_confirmadas = %s, completo = true, actualizado = now() "
+            "WHERE hash_contenido = %s",
+            (rows, digest)
+        )
+    conn.commit()
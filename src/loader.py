@@ -0,0 +1,119 @@
+# src/loader.py
+# Carga de un archivo CSV a la base con una conexión dada (la usan main y parallel).
+import logging
+import time
+from functools import partial
+from pathlib import Path
+from src.config import INGEST
+from src.ingest import iter_csv, detect_encoding
+from src.normalize import normalize_batch, records_from_frame
+from src.timestamps import TimestampParser, InvalidTimestamps
+from src.db import insert_medicion_rows, insert_mediciones_bulk, TransactionBatch
+from src.ledger import file_fingerprint, ledger_start, ledger_finish, checkpoint
+from src.raw_payload import MODES as RAW_PAYLOAD_MODES, RawPayload, store_file
+from src.pipeline import ingest_file_async
+from src.parquet import ParquetStage
+
+logger = logging.getLogger(__name__)
+
+MODES = ['row', 'bulk']
+PIPELINES = ['sequential', 'async']
+
+def ingest_file(conn, csv_path, mode=None, batch_size=None, chunk_rows=None, pipeline=None, resume=None, raw_payload=None,
+                commit_rows=None, commit_seconds=None, stage_dir=None):
+    """
+    mode: 'row' inserta fila a fila con insert_medicion (commit por fila;
+          agregados recalculados una vez por chunk);
+          'bulk' usa COPY + merge por lotes de batch_size filas.
+    El CSV se lee en chunks de chunk_rows filas; cada chunk se normaliza y se
+    escribe antes de leer el siguiente, así la memoria no depende del tamaño del archivo.
+    pipeline: 'sequential' (una etapa tras otra) o 'async' (etapas solapadas, ver src.pipeline).
+    resume: con True (default INGEST_RESUME) un archivo ya cargado completo se
+      salta y uno a medias sigue desde la última fila confirmada (src.ledger);
+      con False se carga desde el principio.
+    raw_payload: qué se guarda de cada fila original (default INGEST_RAW_PAYLOAD):
+      'full', 'none', 'unmapped' o 'reference' (ver src.raw_payload).
+    commit_rows / commit_seconds: en modo row, un commit cada tantas filas y/o
+      segundos (default INGEST_COMMIT_ROWS / INGEST_COMMIT_SECONDS; 1 fila = un
+      commit por fila, como antes). Agrupadas, cada fila va en su savepoint y
+      las que fallan se descartan sin deshacer el resto (ver db.TransactionBatch).
+    stage_dir: además de cargarlos, guardar los lotes normalizados en este
+      staging Parquet (default INGEST_STAGE_DIR; '' = no), para recargarlos
+      después sin leer el CSV (ver src.parquet).
+    La columna de tiempo y su formato se infieren una vez por archivo (src.timestamps);
+    las filas sin timestamp legible se descartan y se informan por fila.
+    Retorna {'archivo', 'filas', 'segundos', 'filas_s', 'desde', 'omitido',
+    'timestamps_invalidos', 'filas_sin_timestamp'} (+ 'metricas' en modo async;
+    + 'filas_rechazadas', 'rechazadas' [(fila, error)] con commits agrupados).
+    """
+    mode = mode or INGEST['mode']
+    batch_size = batch_size or INGEST['batch_size']
+    chunk_rows = chunk_rows or INGEST['chunk_rows']
+    pipeline = pipeline or INGEST['pipeline']
+    resume = INGEST['resume'] if resume is None else resume
+    raw_payload = raw_payload or INGEST['raw_payload']
+    commit_rows = INGEST['commit_rows'] if commit_rows is None else commit_rows
+    commit_seconds = INGEST['commit_seconds'] if commit_seconds is None else commit_seconds
+    stage_dir = INGEST['stage_dir'] if stage_dir is None else stage_dir
+    if mode not in MODES:
+        raise ValueError(f"Modo desconocido: {mode} (opciones: {', '.join(MODES)})")
+    if pipeline not in PIPELINES:
+        raise ValueError(f"Pipeline desconocido: {pipeline} (opciones: {', '.join(PIPELINES)})")
+    if raw_payload not in RAW_PAYLOAD_MODES:
+        raise ValueError(f"raw_payload desconocido: {raw_payload} (opciones: {', '.join(RAW_PAYLOAD_MODES)})")
+    p = Path(csv_path)
+    if not p.exists():
+        raise FileNotFoundError(f"Archivo no encontrado: {p.resolve()}")
+    t0 = time.perf_counter()
+    digest, size = file_fingerprint(str(p))
+    offset, done = ledger_start(conn, str(p), digest, size, resume=resume)
+    if done:
+        logger.info("%s: ya cargado (sha256 %s), se omite", p, digest[:12])
+        return {'archivo': str(p), 'filas': 0, 'segundos': time.perf_counter() - t0, 'filas_s': 0.0,
+                'desde': offset, 'omitido': True}
+    if offset:
+        logger.info("%s: se retoma desde la fila %d", p, offset)
+    ck = partial(checkpoint, digest=digest)
+    encoding = detect_encoding(str(p))
+    archivo_id = store_file(conn, str(p), digest, encoding) if raw_payload == 'reference' else None
+    raw = RawPayload(raw_payload, archivo_id)
+    tx = None
+    if mode == 'row' and (commit_rows != 1 or commit_seconds):
+        tx = TransactionBatch(conn, rows=commit_rows, seconds=commit_seconds, checkpoint=ck)
+    stage = ParquetStage(stage_dir, digest, raw, replace=not offset) if stage_dir else None
+    if pipeline == 'async':
+        stats = ingest_file_async(conn, str(p), mode=mode, batch_size=batch_size, chunk_rows=chunk_rows,
+                                  skip_rows=offset, checkpoint=ck, raw_payload=raw, tx=tx, stage=stage)
+        rows = stats['filas']
+    else:
+        rows = 0
+        timestamps, invalid = TimestampParser(), InvalidTimestamps(str(p))
+        for df in iter_csv(str(p), chunksize=chunk_rows, encoding=encoding, skip_rows=offset):
+            if df.empty:
+                continue
+            norm, valid = invalid.drop(normalize_batch(df, timestamps), df)
+            if stage is not None:
+                stage.write(norm, valid)
+            if mode == 'bulk':
+                n = insert_mediciones_bulk(conn, norm, valid, procedure_version='v1', batch_size=batch_size, checkpoint=ck,
+                                           raw_payload=raw)
+            elif tx is not None:
+                n = 0
+                for pos, m in zip(norm.index, records_from_frame(norm, valid)):
+                    m['fila'] = int(pos)
+                    n += tx.insert(m, procedure_version='v1', raw_payload=raw)
+            else:
+                rows_in = ((int(pos), m) for pos, m in zip(norm.index, records_from_frame(norm, valid)))
+                n = insert_medicion_rows(conn, rows_in, procedure_version='v1', checkpoint=ck, raw_payload=raw)
+            rows += len(df)
+            logger.info("%s: filas %d-%d -> %d mediciones (%s)", p, df.index[0], df.index[-1], n, mode)
+        stats = {'archivo': str(p), 'filas': rows, **invalid.as_dict()}
+    if tx is not None:
+        tx.commit()
+        stats.update({'filas_rechazadas': len(tx.rejected), 'rechazadas': tx.rejected[:100]})
+        if tx.rejected:
+            logger.warning("%s: %d filas rechazadas (primeras: %s)", p, len(tx.rejected), tx.rejected[:5])
+    ledger_finish(conn, digest, offset + rows)
+    elapsed = time.perf_counter() - t0
+    stats.update({'segundos': elapsed, 'filas_s': rows / elapsed if elapsed else 0.0, 'desde': offset, 'omitido': False})
+    return stats
@@ -1,30 +1,118 @@
 # src/main.py
-from src.config import DB
-from src.ingest import read_csv, rows_from_df
-from src.normalize import normalize_row
-from src.db import get_conn, insert_medicion
+from src.config import INGEST
+from src.db import POOL
+from src.loader import ingest_file, MODES, PIPELINES
+from src.raw_payload import MODES as RAW_PAYLOAD_MODES
+from src.pipeline import format_metrics
+from src.parallel import expand_inputs, run_many, format_summary
+from src.metrics import METRICS, PROFILES, format_stages, profiled, serve_prometheus
+from contextlib import nullcontext
+import argparse
+import json
 import sys
-from pathlib import Path
+import time
 import logging
 
 logging.basicConfig(filename='run_log.txt', level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
 
-def run_batch(csv_path):
-    p = Path(csv_path)
-    if not p.exists():
-        raise FileNotFoundError(f"Archivo no encontrado: {p.resolve()}")
-    df = read_csv(str(p))
-    conn = get_conn(DB)
-    for raw in rows_from_df(df):
-        m = normalize_row(raw)
-        insert_medicion(conn, m, procedure_version='v1')
-    conn.close()
+def run_batch(csv_path, mode=None, batch_size=None, chunk_rows=None, pipeline=None, resume=None, raw_payload=None,
+              commit_rows=None, commit_seconds=None, stage_dir=None):
+    """
+    Carga un CSV con una conexión del pool (ver loader.ingest_file).
+    mode: 'row' (insert_medicion por fila) o 'bulk' (COPY + merge por lotes de batch_size).
+    pipeline: 'sequential' o 'async' (lectura, normalización y escritura solapadas).
+    resume: saltar el archivo si ya se cargó completo o retomarlo desde su checkpoint.
+    raw_payload: qué se guarda de cada fila original ('full', 'none', 'unmapped', 'reference').
+    commit_rows / commit_seconds: en modo row, agrupar commits cada N filas / T segundos.
+    stage_dir: staging Parquet donde se guardan también los lotes normalizados.
+    """
+    with POOL.connection() as conn:
+        return ingest_file(conn, csv_path, mode=mode, batch_size=batch_size, chunk_rows=chunk_rows, pipeline=pipeline, resume=resume,
+                           raw_payload=raw_payload, commit_rows=commit_rows, commit_seconds=commit_seconds,
+                           stage_dir=stage_dir)
+
+def emit_metrics(stats, elapsed, path=None):
+    """
+    Métricas de la corrida como JSON (archivos, filas, segundos, etapas e idas
+    a la base de METRICS, uso del pool): una línea en run_log.txt y, con path, un archivo ('-' = stdout).
+    """
+    rows = sum(s['filas'] for s in stats)
+    report = {'archivos': len(stats), 'filas': rows, 'segundos': round(elapsed, 4),
+              'filas_s': round(rows / elapsed, 1) if elapsed else 0.0, **METRICS.snapshot(), 'pool': POOL.stats()}
+    logger.info("metricas %s", json.dumps(report))
+    if path == '-':
+        print(json.dumps(report, indent=2))
+    elif path:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Uso: python -m src.main ruta_a_csv")
+        print("Uso: python -m src.main ruta_a_csv|directorio|glob ... [--workers N] [--mode row|bulk] [--pipeline sequential|async] [--batch-size N] [--chunk-rows N] [--no-resume] [--raw-payload full|none|unmapped|reference] [--commit-rows N] [--commit-seconds T] [--stage-dir DIR] [--profile cpu|mem] [--metrics-json PATH] [--metrics-port N]")
         print("Ejemplo: python -m src.main data/ejemplo.csv")
+        print("         python -m src.main 'data/estaciones/*.csv' --workers 4 --mode bulk")
+        sys.exit(1)
+    parser = argparse.ArgumentParser(prog='python -m src.main')
+    parser.add_argument('inputs', nargs='+', help='archivos CSV, directorios o globs')
+    parser.add_argument('--mode', choices=MODES, default=None, help="modo de inserción (default: INGEST_MODE o 'row')")
+    parser.add_argument('--batch-size', type=int, default=None, help='filas por commit en modo bulk')
+    parser.add_argument('--chunk-rows', type=int, default=None, help='filas leídas del CSV por vez')
+    parser.add_argument('--pipeline', choices=PIPELINES, default=None, help="'async' solapa lectura, normalización y escritura")
+    parser.add_argument('--workers', type=int, default=None, help='procesos en paralelo (default: INGEST_WORKERS)')
+    parser.add_argument('--no-resume', dest='resume', action='store_false', default=None,
+                        help='cargar de nuevo aunque el archivo figure como cargado en ingesta_archivo')
+    parser.add_argument('--raw-payload', choices=RAW_PAYLOAD_MODES, default=None,
+                        help="qué se guarda de cada fila original (default: INGEST_RAW_PAYLOAD o 'full')")
+    parser.add_argument('--commit-rows', type=int, default=None,
+                        help='modo row: commit cada N filas, con savepoint por fila (default: INGEST_COMMIT_ROWS o 1)')
+    parser.add_argument('--commit-seconds', type=float, default=None,
+                        help='modo row: commit también cada T segundos (default: INGEST_COMMIT_SECONDS)')
+    parser.add_argument('--stage-dir', default=None,
+                        help='guardar también los lotes normalizados en este staging Parquet (ver python -m src.parquet)')
+    parser.add_argument('--profile', choices=PROFILES, default=None,
+                        help="perfilar la corrida: 'cpu' (cProfile) o 'mem' (tracemalloc); sólo el proceso principal")
+    parser.add_argument('--profile-out', default=None, help='reporte de --profile (default: profile_<cpu|mem>.txt)')
+    parser.add_argument('--metrics-json', default=None, help="escribir las métricas de la corrida en este JSON ('-' = stdout)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='exponer las métricas en http://127.0.0.1:N/metrics (formato Prometheus) durante la carga')
+    args = parser.parse_args()
+    workers = args.workers or INGEST['workers']
+    paths = expand_inputs(args.inputs)
+    if args.metrics_port:
+        serve_prometheus(args.metrics_port)
+    profile_out = args.profile_out or f"profile_{args.profile}.txt"
+    single = len(paths) == 1 and workers == 1
+    t0 = time.perf_counter()
+    with profiled(args.profile, profile_out) if args.profile else nullcontext():
+        if single:
+            stats = [run_batch(paths[0], mode=args.mode, batch_size=args.batch_size, chunk_rows=args.chunk_rows, pipeline=args.pipeline,
+                               resume=args.resume, raw_payload=args.raw_payload, commit_rows=args.commit_rows,
+                               commit_seconds=args.commit_seconds, stage_dir=args.stage_dir)]
+        else:
+            stats = run_many(paths, workers=workers, mode=args.mode, batch_size=args.batch_size, chunk_rows=args.chunk_rows, pipeline=args.pipeline,
+                             resume=args.resume, raw_payload=args.raw_payload, commit_rows=args.commit_rows,
+                             commit_seconds=args.commit_seconds, stage_dir=args.stage_dir)
+    elapsed = time.perf_counter() - t0
+    if single:
+        s = stats[0]
+        if s['omitido']:
+            print(f"{s['archivo']}: ya cargado, se omite (--no-resume para cargarlo de nuevo)")
+        if s.get('timestamps_invalidos'):
+            print(f"{s['archivo']}: {s['timestamps_invalidos']} filas sin timestamp legible, descartadas "
+                  f"(primeras: {s['filas_sin_timestamp'][:5]}; detalle en run_log.txt)")
+        if s.get('filas_rechazadas'):
+            print(f"{s['archivo']}: {s['filas_rechazadas']} filas rechazadas por la base "
+                  f"(primeras: {[fila for fila, _ in s['rechazadas'][:5]]}; detalle en run_log.txt)")
+        if 'metricas' in s:
+            print(format_metrics(s['metricas']))
+    else:
+        print(format_summary(stats, elapsed))
+    report = emit_metrics(stats, elapsed, args.metrics_json)
+    print(format_stages(report))
+    if args.profile:
+        print(f"perfil ({args.profile}): {profile_out}")
+    if any(s.get('error') for s in stats):
         sys.exit(1)
-    run_batch(sys.argv[1])
     print("Proceso finalizado correctamente.")
@@ -0,0 +1,299 @@
+# src/metrics.py
+# Instrumentación de la carga: tiempo y filas por etapa, idas a la base con
+# histograma de latencias y commits. Todo se acumula en METRICS (uno por
+# proceso; parallel junta los de los workers) y se emite como JSON al final de
+# la corrida (main), como texto Prometheus (serve_prometheus) o se resume con
+# format_stages. profiled() envuelve una corrida con cProfile o tracemalloc.
+#
+# Etapas: lectura (iter_csv), normalizacion (normalize_batch), qc (flags
+# RANGE y CONSISTENCY), escritura (insert_medicion / insert_mediciones_bulk),
+# staging (lotes a Parquet, src.parquet) y commit. Los timers se anidan: cada etapa cuenta sólo su tiempo propio
+# (el qc dentro de escritura no se cuenta dos veces), así las etapas de un
+# mismo thread suman el tiempo medido.
+import bisect
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import psycopg2.extensions
+
+STAGES = ['lectura', 'normalizacion', 'qc', 'escritura', 'staging', 'commit']
+
+# límites superiores (segundos) de los buckets de latencia, como los de Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILES = ['cpu', 'mem']
+PROFILE_TOP = 30      # líneas del reporte de --profile
+
+class Histogram:
+    """Cantidad de observaciones por bucket (el último es +Inf), suma y total."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Cota superior del bucket donde cae el cuantil q (None si no hay datos; inf si pasa el último)."""
+        total = self.count
+        if not total:
+            return None
+        seen = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += n
+            if seen >= q * total:
+                return bound
+
+    def as_dict(self):
+        return {'idas': self.count, 'segundos': round(self.sum, 6),
+                'p50_s': self.quantile(0.5), 'p95_s': self.quantile(0.95), 'buckets': list(self.counts)}
+
+class _Timer:
+    __slots__ = ('stage', 'rows', 'start', 'child')
+
+    def __init__(self, stage, rows):
+        self.stage = stage
+        self.rows = rows
+        self.start = time.perf_counter()
+        self.child = 0.0
+
+class Metrics:
+    """
+    Acumulador thread-safe de la corrida:
+      etapas: { etapa -> segundos propios, llamadas, filas }
+      db: { operación -> Histogram } (primera palabra del SQL, COPY, COMMIT, ROLLBACK;
+          POOL_ESPERA: espera por una conexión de src.pool.POOL)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {name: [0.0, 0, 0] for name in STAGES}
+            self.db = {}
+            self.started = time.time()
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """
+        Mide el bloque como etapa name. rows: filas que procesa (se puede
+        fijar dentro del bloque con t.rows). El tiempo de etapas anidadas
+        se descuenta del de la etapa que las contiene.
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        t = _Timer(name, rows)
+        stack.append(t)
+        try:
+            yield t
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - t.start
+            if stack:
+                stack[-1].child += elapsed
+            with self._lock:
+                s = self.stages.setdefault(name, [0.0, 0, 0])
+                s[0] += elapsed - t.child
+                s[1] += 1
+                s[2] += t.rows
+
+    def observe_db(self, op, seconds):
+        with self._lock:
+            if op not in self.db:
+                self.db[op] = Histogram()
+            self.db[op].observe(seconds)
+
+    def snapshot(self):
+        """Estado como dict serializable a JSON (lo que emite main y devuelven los workers)."""
+        with self._lock:
+            etapas = {}
+            for name, (seconds, calls, rows) in self.stages.items():
+                etapas[name] = {'segundos': round(seconds, 6), 'llamadas': calls, 'filas': rows,
+                                'filas_s': round(rows / seconds, 1) if seconds and rows else 0.0}
+            return {'etapas': etapas, 'db': {op: h.as_dict() for op, h in sorted(self.db.items())}}
+
+    def merge(self, snapshot):
+        """Suma un snapshot (p.ej. el de un worker de parallel)."""
+        with self._lock:
+            for name, s in snapshot['etapas'].items():
+                acc = self.stages.setdefault(name, [0.0, 0, 0])
+                acc[0] += s['segundos']
+                acc[1] += s['llamadas']
+                acc[2] += s['filas']
+            for op, h in snapshot['db'].items():
+                acc = self.db.setdefault(op, Histogram())
+                acc.counts = [a + b for a, b in zip(acc.counts, h['buckets'])]
+                acc.sum += h['segundos']
+
+    def prometheus_text(self):
+        """Formato de exposición de texto de Prometheus (versión 0.0.4)."""
+        snap = self.snapshot()
+        lines = []
+        for key, metric, help_text in (('segundos', 'clima_etapa_segundos_total', 'Tiempo propio por etapa'),
+                                       ('llamadas', 'clima_etapa_llamadas_total', 'Veces que se ejecutó la etapa'),
+                                       ('filas', 'clima_etapa_filas_total', 'Filas procesadas por etapa')):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+            lines += [f'{metric}{{etapa="{name}"}} {s[key]}' for name, s in snap['etapas'].items()]
+        metric = 'clima_db_latencia_segundos'
+        lines += [f'# HELP {metric} Latencia de las idas a la base', f'# TYPE {metric} histogram']
+        for op, h in snap['db'].items():
+            seen = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), h['buckets']):
+                seen += n
+                lines.append(f'{metric}_bucket{{op="{op}",le="{bound}"}} {seen}')
+            lines.append(f'{metric}_sum{{op="{op}"}} {h["segundos"]}')
+            lines.append(f'{metric}_count{{op="{op}"}} {h["idas"]}')
+        return '\n'.join(lines) + '\n'
+
+# compartido por todo el proceso
+METRICS = Metrics()
+
+def format_stages(snapshot):
+    lines = [f"{'etapa':15s} {'seg':>9s} {'llamadas':>9s} {'filas':>10s} {'filas/s':>10s}"]
+    for name, s in snapshot['etapas'].items():
+        if s['llamadas']:
+            lines.append(f"{name:15s} {s['segundos']:>9.2f} {s['llamadas']:>9d} {s['filas']:>10d} {s['filas_s']:>10,.0f}")
+    lines.append(f"{'db':15s} {'idas':>9s} {'seg':>9s} {'p50 ms':>10s} {'p95 ms':>10s}")
+    for op, h in snapshot['db'].items():
+        p50, p95 = (f"{q * 1000:.1f}" if q is not None else '-' for q in (h['p50_s'], h['p95_s']))
+        lines.append(f"{op:15s} {h['idas']:>9d} {h['segundos']:>9.2f} {p50:>10s} {p95:>10s}")
+    return '\n'.join(lines)
+
+# --- idas a la base ---
+
+_FIRST_WORD = re.compile(r'\s*(\w+)')
+
+def _operation(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('ascii', 'replace')
+    m = _FIRST_WORD.match(sql if isinstance(sql, str) else str(sql))
+    return m.group(1).upper() if m else '?'
+
+class MeteredCursor(psycopg2.extensions.cursor):
+    """Cursor que registra cada execute / executemany / copy_expert en METRICS.db."""
+
+    def execute(self, query, vars=None):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            METRICS.observe_db(_operation(query), time.perf_counter() - t0)
+
+    def executemany(self, query, vars_list):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            METRICS.observe_db(_operation(query), time.perf_counter() - t0)
+
+    def copy_expert(self, sql, file, size=8192):
+        t0 = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            METRICS.observe_db('COPY', time.perf_counter() - t0)
+
+class MeteredConnection(psycopg2.extensions.connection):
+    """
+    Conexión de db.get_conn: cursores MeteredCursor y commit/rollback medidos
+    (etapa commit). prepared: sentencias preparadas en la sesión (pool.execute_prepared).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = MeteredCursor
+        self.prepared = set()
+
+    def commit(self):
+        with METRICS.stage('commit'):
+            t0 = time.perf_counter()
+            try:
+                return super().commit()
+            finally:
+                METRICS.observe_db('COMMIT', time.perf_counter() - t0)
+
+    def rollback(self):
+        t0 = time.perf_counter()
+        try:
+            return super().rollback()
+        finally:
+            METRICS.observe_db('ROLLBACK', time.perf_counter() - t0)
+
+# --- endpoint Prometheus ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics = METRICS
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.metrics.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_prometheus(port, host='127.0.0.1', metrics=METRICS):
+    """
+    Sirve metrics en http://host:port/metrics desde un thread daemon (para
+    cargas largas). Retorna el servidor; server.shutdown() lo detiene.
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+# --- perfilado ---
+
+@contextmanager
+def profiled(kind, out):
+    """
+    kind 'cpu': cProfile del thread principal, top PROFILE_TOP funciones por tiempo acumulado.
+    kind 'mem': tracemalloc, top PROFILE_TOP líneas por memoria retenida al final y el pico.
+    El reporte de texto se escribe en out al salir del bloque.
+    """
+    if kind not in PROFILES:
+        raise ValueError(f"Perfil desconocido: {kind} (opciones: {', '.join(PROFILES)})")
+    if kind == 'cpu':
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            with open(out, 'w') as f:
+                f.write(buf.getvalue())
+        return
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snap = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        lines = [f"retenido: {current / 1e6:.1f} MB, pico: {peak / 1e6:.1f} MB", '']
+        for stat in snap.statistics('lineno')[:PROFILE_TOP]:
+            lines.append(str(stat))
+        with open(out, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -1,115 +1,86 @@
 # src/normalize.py
-from datetime import timezone
+import logging
+from functools import partial
+import numpy as np
 import pandas as pd
+from .config import INGEST
 from .utils import f_to_c, pa_to_hpa, decimal_to_percent
+from .dictionary import RESOLVER, LIMITS
+from .timestamps import TIMESTAMP_COLUMNS, TimestampParser, parse_value
+from .batch import MeasurementBatch
+from .metrics import METRICS
 import math
 
-# intento cargar diccionario desde DB (opcional)
-try:
-    from .dictionary import load_variable_map
-    VAR_MAP_DB = load_variable_map()  # e.g. {'temp_f':'temperatura', 'p':'presion'}
-except Exception:
-    VAR_MAP_DB = {}
-
-# fallback local mapping (como ya tenías)
-LOCAL_MAP = {
-    'temp_f': ('temperatura','f'),
-    'temp': ('temperatura','c'),
-    't': ('temperatura','c'),
-    'temperature': ('temperatura','c'),
-    'h': ('humedad','percent'),
-    'hum': ('humedad','percent'),
-    'humidity': ('humedad','percent'),
-    'p': ('presion','pa'),
-    'pa': ('presion','pa'),
-    'pressure': ('presion','pa'),
-    # ...
-}
+logger = logging.getLogger(__name__)
 
 def resolve_variable(key):
-    k = key.lower()
-    if k in VAR_MAP_DB:
-        # DB only gives nombre_estandar; try to infer hint from key (pa vs f)
-        est = VAR_MAP_DB[k]
-        # heurística: if key contains 'f' -> temp f, if 'pa' or key=='p' -> pa
-        if 'f' in k:
-            return est, 'f'
-        if 'pa' in k or k=='p':
-            return est, 'pa'
-        # default: return est with no hint
-        return est, None
-    return LOCAL_MAP.get(k, (None, None))
-# Mapeo simple (expande según tu diccionario)
-VARIABLE_MAP = {
-    'temp_f': ('temperatura', 'f'),
-    'temp': ('temperatura', 'c'),
-    't': ('temperatura', 'c'),
-    'temperature': ('temperatura', 'c'),
-    'h': ('humedad', 'percent'),
-    'hum': ('humedad', 'percent'),
-    'humidity': ('humedad', 'percent'),
-    'p': ('presion', 'pa'),
-    'pa': ('presion', 'pa'),
-    'pressure': ('presion', 'pa'),
-    'radiacion': ('radiacion_solar','w_m2'),
-    'rad': ('radiacion_solar','w_m2'),
-    'wind_speed': ('velocidad_viento','m_s'),
-    'wind': ('velocidad_viento','m_s'),
-}
-
-RANGES = {
-    'temperatura': (-60, 60),    # °C
-    'humedad': (0, 100),         # %
-    'presion': (300, 1100),      # hPa
-    'radiacion_solar': (0, 2000),
-    'velocidad_viento': (0, 100)
-}
+    """(nombre_estandar, unidad de entrada) de una columna, o (None, None)."""
+    return RESOLVER.resolve(key)
+
+VARIABLES = ['temperatura', 'humedad', 'presion', 'radiacion_solar', 'velocidad_viento']
+SKIP_COLUMNS = ['sensor_id', 'time', 'timestamp', 'ts', 'datetime', 'lat', 'lon']
+# varias columnas de un encabezado con la misma variable (p.ej. temp y temp_f), por fila:
+#   last   gana la última columna con dato (como siempre)
+#   first  gana la primera columna con dato
+#   error  el archivo no se carga
+CONFLICT_POLICIES = ['last', 'first', 'error']
+MAX_PLANS = 256
 
 def parse_timestamp(row):
-    for k in ['time','timestamp','ts','datetime','date']:
+    # primera columna de tiempo con un valor legible; None si ninguna
+    for k in TIMESTAMP_COLUMNS:
         if k in row and pd.notna(row[k]):
-            try:
-                return pd.to_datetime(row[k], utc=True)
-            except Exception:
-                continue
-    # fallback: now UTC
-    return pd.Timestamp.now(tz=timezone.utc)
+            ts = parse_value(row[k])
+            if ts is not None:
+                return ts
+    return None
+
+def _round3_value(val):
+    return round(val, 3)
+
+def _f_to_c_value(val):
+    return round(f_to_c(val), 3)
+
+def _pa_to_hpa_value(val):
+    # input in Pa -> convert to hPa
+    return round(pa_to_hpa(val), 3)
+
+def _humidity_value(val):
+    # if between 0 and 1 assume fraction
+    if 0 <= val <= 1:
+        return round(decimal_to_percent(val), 3)
+    return round(val, 3)
+
+def value_converter(out, hint):
+    """Conversión de un float a la unidad estándar de out (redondeada a 3 decimales)."""
+    if out == 'temperatura' and hint == 'f':
+        return _f_to_c_value
+    if out == 'presion' and hint == 'pa':
+        return _pa_to_hpa_value
+    if out == 'humedad':
+        return _humidity_value
+    return _round3_value
 
 def apply_conversions(field_key, value):
     """
     Return (normalized_field_name, normalized_value)
     """
-    key = str(field_key).lower()
-    if key in VARIABLE_MAP:
-        out, hint = VARIABLE_MAP[key]
-        val = float(value)
-        if out == 'temperatura':
-            if hint == 'f':
-                return out, round(f_to_c(val), 3)
-            else:
-                return out, round(val, 3)
-        if out == 'presion':
-            # input in Pa -> convert to hPa
-            if hint == 'pa':
-                return out, round(pa_to_hpa(val), 3)
-            else:
-                return out, round(val, 3)
-        if out == 'humedad':
-            # if between 0 and 1 assume fraction
-            if 0 <= val <= 1:
-                return out, round(decimal_to_percent(val), 3)
-            return out, round(val, 3)
-        # for others
-        return out, round(val, 3)
+    out, hint = RESOLVER.resolve(field_key)
+    if out:
+        return out, value_converter(out, hint)(float(value))
     # unknown
     return None, None
 
+def out_of_range(value, lo, hi):
+    # rango_minimo / rango_maximo de la tabla variable (None = sin límite)
+    return (lo is not None and value < lo) | (hi is not None and value > hi)
+
 def validate_values(normalized):
     flags = []
     for k,v in normalized.items():
-        if k in RANGES and v is not None:
-            lo, hi = RANGES[k]
-            if v < lo or v > hi:
+        if k in VARIABLES and v is not None:
+            lo, hi = LIMITS.range(k)
+            if out_of_range(v, lo, hi):
                 flags.append({'tipo': 'RANGE', 'descripcion': f'{k}={v} fuera de rango [{lo},{hi}]'})
     return flags
 
@@ -121,30 +92,22 @@ def normalize_row(row):
         temperatura, humedad, presion, radiacion_solar, velocidad_viento,
         raw: original dict,
         validation_flags: [ {tipo, descripcion}, ... ] }
+    Las columnas se resuelven una vez por encabezado (conversion_plan).
     """
     ts = parse_timestamp(row)
-    normalized = {
-        'temperatura': None,
-        'humedad': None,
-        'presion': None,
-        'radiacion_solar': None,
-        'velocidad_viento': None
-    }
+    normalized = dict.fromkeys(VARIABLES)
 
-    for k,v in row.items():
-        if k in ['sensor_id','time','timestamp','ts','datetime','lat','lon']:
-            continue
-        if pd.isna(v):
+    for col, out, convert, _ in conversion_plan(row.keys()).steps:
+        v = row[col]
+        if v is None or v is pd.NA or v != v:
             continue
-        out_k, out_v = apply_conversions(k, v)
-        if out_k:
-            normalized[out_k] = out_v
+        normalized[out] = convert(float(v))
 
     flags = validate_values(normalized)
 
     result = {
-        'sensor_id': row.get('sensor_id') or row.get('sensor') or 'unknown',
-        'timestamp': ts.to_pydatetime(),
+        'sensor_id': str(_sensor(row.get('sensor_id')) or _sensor(row.get('sensor')) or 'unknown'),
+        'timestamp': ts.to_pydatetime() if ts is not None else None,
         'temperatura': normalized['temperatura'],
         'humedad': normalized['humedad'],
         'presion': normalized['presion'],
@@ -154,3 +117,174 @@ def normalize_row(row):
         'validation_flags': flags
     }
     return result
+
+
+# --- plan de conversión por encabezado ---
+
+class ConversionPlan:
+    """
+    Qué hacer con cada columna de un encabezado, resuelto una sola vez:
+      steps: [(columna, variable, convertir un float, convertir una columna)]
+        en el orden en que se aplican; cada una pisa a las anteriores de su
+        variable donde tiene dato (así gana la que indica la política)
+      conflicts: { variable -> [columnas] } si más de una columna da la variable
+      unknown: columnas que no son variable, sensor ni tiempo (sólo quedan en raw)
+    """
+
+    __slots__ = ('columns', 'steps', 'conflicts', 'unknown', 'policy')
+
+    def __init__(self, columns, resolved, policy='last'):
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError(f"Política de conflictos desconocida: {policy} (opciones: {', '.join(CONFLICT_POLICIES)})")
+        self.columns = tuple(columns)
+        self.policy = policy
+        by_var = {}
+        for col, out, _ in resolved:
+            by_var.setdefault(out, []).append(col)
+        self.conflicts = {out: cols for out, cols in by_var.items() if len(cols) > 1}
+        if self.conflicts and policy == 'error':
+            detail = '; '.join(f"{out} <- {', '.join(cols)}" for out, cols in self.conflicts.items())
+            raise ValueError(f"Columnas en conflicto: {detail} (INGEST_COLUMN_CONFLICTS=error)")
+        known = {col for col, _, _ in resolved} | set(SKIP_COLUMNS) | set(TIMESTAMP_COLUMNS) | {'sensor'}
+        self.unknown = [col for col in self.columns if col not in known]
+        ordered = resolved[::-1] if policy == 'first' else resolved
+        self.steps = [(col, out, value_converter(out, hint), partial(_convert_column, out=out, hint=hint))
+                      for col, out, hint in ordered]
+
+# encabezado -> (plan del resolver con el que se compiló, ConversionPlan)
+_PLANS = {}
+
+def conversion_plan(columns, policy=None):
+    """
+    ConversionPlan del encabezado columns, compilado la primera vez que se ve
+    ese encabezado (en cualquier archivo) y reusado mientras el mapeo de
+    RESOLVER no cambie. policy: default INGEST_COLUMN_CONFLICTS.
+    """
+    policy = policy or INGEST['column_conflicts']
+    key = (tuple(columns), policy)
+    cached = _PLANS.get(key)
+    resolved = RESOLVER.plan([col for col in key[0] if col not in SKIP_COLUMNS])
+    if cached is not None and cached[0] is resolved:
+        return cached[1]
+    plan = ConversionPlan(key[0], resolved, policy)
+    if plan.conflicts:
+        logger.warning("encabezado %s: varias columnas por variable %s, gana la %s con dato",
+                       list(key[0]), plan.conflicts, 'primera' if policy == 'first' else 'última')
+    if plan.unknown:
+        logger.info("encabezado %s: columnas sin variable (sólo en raw): %s", list(key[0]), plan.unknown)
+    if len(_PLANS) >= MAX_PLANS:
+        _PLANS.clear()
+    _PLANS[key] = (resolved, plan)
+    return plan
+
+# --- versión vectorizada (un DataFrame completo por llamada) ---
+
+def _round3(values):
+    """
+    Equivalente exacto de round(v, 3) sobre un array.
+    np.round escala por 1000 y puede caer del otro lado en los casos cercanos
+    a .0005; esos (pocos) casos se recalculan con round() de Python.
+    """
+    out = np.round(values, 3)
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = values * 1000.0
+        near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        out[i] = round(float(values[i]), 3)
+    return out
+
+def _convert_column(values, out, hint):
+    """Misma lógica que apply_conversions, aplicada a una columna entera."""
+    if out == 'temperatura' and hint == 'f':
+        values = f_to_c(values)
+    elif out == 'presion' and hint == 'pa':
+        values = pa_to_hpa(values)
+    elif out == 'humedad':
+        # si está entre 0 y 1 se asume fracción
+        with np.errstate(invalid='ignore'):
+            fraction = (values >= 0) & (values <= 1)
+        values = np.where(fraction, decimal_to_percent(values), values)
+    return _round3(values)
+
+def parse_timestamps(df, timestamps=None):
+    """
+    Versión columnar de parse_timestamp: misma prioridad de columnas, cada una
+    con el formato inferido por timestamps (un TimestampParser por archivo).
+    NaT donde ninguna columna tiene un valor legible.
+    """
+    timestamps = TimestampParser() if timestamps is None else timestamps
+    return timestamps.parse(df)
+
+def _sensor(v):
+    # celda vacía leída por pandas (NaN / NA): sin sensor, como None o ''
+    return None if v is pd.NA or (isinstance(v, float) and v != v) else v
+
+def sensor_ids(df):
+    # str(_sensor(sensor_id) or _sensor(sensor) or 'unknown'), por columna:
+    # la veracidad y el texto se evalúan una vez por valor distinto. Texto como
+    # lo escribe la base (sensor_id TEXT): una columna numérica da '7', no 7
+    out = pd.Series('unknown', index=df.index, dtype=object)
+    for k in ('sensor', 'sensor_id'):
+        if k not in df.columns:
+            continue
+        col = df[k].astype(object)
+        codes, uniques = pd.factorize(col, use_na_sentinel=False)
+        truthy = np.array([bool(_sensor(u)) for u in uniques], dtype=bool)[codes]
+        out = col.where(truthy, out)
+    codes, uniques = pd.factorize(out)
+    return pd.Series(np.array([str(u) for u in uniques], dtype=object)[codes], index=df.index)
+
+def range_flags(norm):
+    """
+    Flags RANGE como máscaras booleanas; devuelve una tupla de flags por fila
+    (tupla vacía si la fila no tiene problemas).
+    """
+    return MeasurementBatch.from_frame(norm).flag_dicts()
+
+def normalize_batch(df, timestamps=None):
+    """
+    Input: DataFrame crudo (un archivo o un chunk)
+    timestamps: TimestampParser del archivo (formato inferido una vez y reusado
+      en todos sus chunks); sin él se infiere de df.
+    Output: MeasurementBatch con el índice de df como filas: sensor_id,
+      timestamp (NaT = sin timestamp legible), una columna float por variable
+      (NaN = sin dato) y los flags RANGE como arrays de códigos.
+    """
+    with METRICS.stage('normalizacion', rows=len(df)):
+        values = {}
+        for col, out, _, convert in conversion_plan(df.columns).steps:
+            raw = df[col].astype('float64').to_numpy()
+            converted = convert(raw)
+            # como en normalize_row: cada paso pisa a los anteriores donde tiene dato
+            present = ~np.isnan(raw)
+            values[out] = np.where(present, converted, values.get(out, np.nan))
+        return MeasurementBatch.from_columns(sensor_ids(df).to_numpy(), parse_timestamps(df, timestamps),
+                                             values, df.index.to_numpy())
+
+def normalize_frame(df, timestamps=None):
+    """
+    normalize_batch visto como DataFrame, con el mismo índice y columnas:
+      sensor_id (categórica), timestamp (datetime64 UTC, NaT = sin timestamp legible),
+      temperatura, humedad, presion, radiacion_solar, velocidad_viento (float, NaN = sin dato),
+      validation_flags (tupla de {tipo, descripcion} por fila)
+    Fila a fila equivale a normalize_row (ver records_from_frame).
+    """
+    return normalize_batch(df, timestamps).to_frame(flags=True)
+
+def records_from_frame(norm, df=None):
+    """
+    Genera los dicts que produciría normalize_row para cada fila de norm
+    (DataFrame de normalize_frame o MeasurementBatch).
+    Si se pasa el DataFrame crudo, 'raw' se arma desde él.
+    """
+    columns = list(df.columns) if df is not None else []
+    raws = df.itertuples(index=False, name=None) if df is not None else iter(())
+    values = {var: norm[var].tolist() for var in VARIABLES}
+    for i, (sensor_id, ts, flags) in enumerate(zip(norm['sensor_id'], norm['timestamp'], norm['validation_flags'])):
+        m = {'sensor_id': sensor_id, 'timestamp': ts.to_pydatetime() if ts is not pd.NaT else None}
+        for var in VARIABLES:
+            v = values[var][i]
+            m[var] = None if v != v else v
+        m['raw'] = dict(zip(columns, next(raws))) if df is not None else {}
+        m['validation_flags'] = list(flags)
+        yield m
@@ -0,0 +1,162 @@
+# src/parallel.py
+# Carga de muchos CSV en paralelo: un proceso por worker, cada uno con su conexión.
+#
+# Para no reordenar filas de un mismo sensor (el chequeo CONSISTENCY y las
+# caches de src.sensor_state suponen un único escritor por sensor), los
+# archivos que comparten algún sensor se agrupan y cada grupo lo procesa un
+# solo worker, en orden de nombre de archivo.
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import pandas as pd
+from src.db import POOL
+from src.ingest import detect_encoding, CHUNK_ROWS
+from src.loader import ingest_file
+from src.metrics import METRICS
+from src.normalize import sensor_ids
+
+logger = logging.getLogger(__name__)
+
+SENSOR_COLUMNS = ['sensor_id', 'sensor']
+
+def expand_inputs(inputs):
+    """Archivos, directorios (todos sus *.csv) o globs -> lista ordenada de CSV sin repetidos."""
+    paths = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            found = sorted(str(f) for f in p.glob('*.csv'))
+        elif glob.has_magic(item):
+            found = sorted(glob.glob(item, recursive=True))
+        else:
+            found = [item]
+        paths.extend(found)
+    return list(dict.fromkeys(paths))
+
+def sensors_in_file(path):
+    """
+    Sensores de un archivo leyendo sólo las columnas de sensor, con la misma
+    regla que normalize (sensor_id, si no sensor, si no 'unknown') y el mismo
+    texto con que se escriben: celdas vacías -> 'unknown', no se descartan.
+    """
+    encoding = detect_encoding(path)
+    header = pd.read_csv(path, encoding=encoding, nrows=0).columns
+    cols = [c for c in SENSOR_COLUMNS if c in header]
+    if not cols:
+        return {'unknown'}
+    sensors = set()
+    with pd.read_csv(path, encoding=encoding, usecols=cols, chunksize=CHUNK_ROWS,
+                     encoding_errors='replace') as reader:
+        for chunk in reader:
+            sensors.update(sensor_ids(chunk).unique())
+    return sensors or {'unknown'}
+
+def _scan_sensors(path):
+    # un archivo ilegible queda en su propio grupo; el error se reporta al cargarlo
+    try:
+        return sensors_in_file(path)
+    except Exception:
+        return {('archivo', path)}
+
+def group_by_sensor(files_sensors):
+    """
+    files_sensors: [(archivo, {sensores})] en orden de carga.
+    Une los archivos que comparten sensores (union-find); cada grupo conserva el orden.
+    """
+    parent = list(range(len(files_sensors)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, (_, sensors) in enumerate(files_sensors):
+        for s in sensors:
+            if s in owner:
+                parent[find(i)] = find(owner[s])
+            else:
+                owner[s] = i
+    groups = {}
+    for i, (path, _) in enumerate(files_sensors):
+        groups.setdefault(find(i), []).append(path)
+    return list(groups.values())
+
+# --- worker ---
+
+_conn = None
+
+def _init_worker():
+    # el pool del hijo arranca vacío (ver pool.ConnectionPool); el worker toma una y la conserva
+    global _conn
+    _conn = POOL.getconn()
+
+def _ingest_group(paths, mode, batch_size, chunk_rows, pipeline, resume=None, raw_payload=None, commit_rows=None,
+                  commit_seconds=None, stage_dir=None):
+    # el worker se reusa entre grupos: cada grupo devuelve sólo sus métricas
+    METRICS.reset()
+    stats = []
+    for path in paths:
+        try:
+            stats.append(ingest_file(_conn, path, mode=mode, batch_size=batch_size, chunk_rows=chunk_rows, pipeline=pipeline,
+                                     resume=resume, raw_payload=raw_payload, commit_rows=commit_rows,
+                                     commit_seconds=commit_seconds, stage_dir=stage_dir))
+        except Exception as e:
+            _conn.rollback()
+            logger.exception("%s: error en la carga", path)
+            stats.append({'archivo': path, 'filas': 0, 'segundos': 0.0, 'filas_s': 0.0, 'error': str(e)})
+    return stats, METRICS.snapshot()
+
+def run_many(inputs, workers=None, mode=None, batch_size=None, chunk_rows=None, pipeline=None, resume=None, raw_payload=None,
+             commit_rows=None, commit_seconds=None, stage_dir=None):
+    """
+    Carga todos los CSV de inputs con hasta workers procesos.
+    Retorna las estadísticas por archivo, en el orden de los archivos.
+    Las métricas de cada grupo se suman a METRICS del proceso a medida que terminan.
+    """
+    t0 = time.perf_counter()
+    paths = expand_inputs(inputs)
+    if not paths:
+        raise FileNotFoundError(f"No se encontraron CSV en: {', '.join(inputs)}")
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        files_sensors = list(zip(paths, pool.map(_scan_sensors, paths)))
+    groups = group_by_sensor(files_sensors)
+    logger.info("%d archivos en %d grupos de sensores, %d workers", len(paths), len(groups), workers)
+
+    stats = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(groups)), initializer=_init_worker) as pool:
+        futures = [pool.submit(_ingest_group, g, mode, batch_size, chunk_rows, pipeline, resume, raw_payload,
+                               commit_rows, commit_seconds, stage_dir) for g in groups]
+        for f in as_completed(futures):
+            group_stats, snapshot = f.result()
+            stats.extend(group_stats)
+            METRICS.merge(snapshot)
+    order = {p: i for i, p in enumerate(paths)}
+    stats.sort(key=lambda s: order[s['archivo']])
+    logger.info("%d archivos, %d filas en %.2f s", len(paths), sum(s['filas'] for s in stats), time.perf_counter() - t0)
+    return stats
+
+def format_summary(stats, elapsed=None):
+    lines = [f"{'archivo':40s} {'filas':>10s} {'seg':>8s} {'filas/s':>10s}"]
+    for s in stats:
+        line = f"{s['archivo'][-40:]:40s} {s['filas']:>10d} {s['segundos']:>8.2f} {s['filas_s']:>10,.0f}"
+        if s.get('error'):
+            line += f"  ERROR: {s['error']}"
+        elif s.get('omitido'):
+            line += "  (ya cargado)"
+        elif s.get('desde'):
+            line += f"  (retomado desde fila {s['desde']})"
+        if s.get('timestamps_invalidos'):
+            line += f"  ({s['timestamps_invalidos']} filas sin timestamp)"
+        lines.append(line)
+    total_rows = sum(s['filas'] for s in stats)
+    if elapsed:
+        lines.append(f"{'total':40s} {total_rows:>10d} {elapsed:>8.2f} {total_rows / elapsed:>10,.0f}")
+    else:
+        lines.append(f"{'total':40s} {total_rows:>10d}")
+    return '\n'.join(lines)
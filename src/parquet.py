@@ -0,0 +1,378 @@
+# src/parquet.py
+# Mediciones en Parquet, particionadas por sensor y mes (Hive:
+# sensor_id=<s>/mes=<AAAA-MM>/*.parquet; por día quedarían archivos de ~1440
+# filas y leer un mes abriría miles), con pyarrow (opcional: se importa
+# recién al usarlo). Los row groups llevan min/max de timestamp (el export
+# escribe ordenado por sensor y tiempo; el staging, en el orden del CSV).
+#   staging   ingest_file(..., stage_dir=...) / stage_file guardan cada lote ya
+#             normalizado; load_staged lo vuelve a cargar en la base sin leer
+#             ni normalizar el CSV otra vez (los flags se recalculan al cargar).
+#   export    export_parquet copia medicion en [start, end) con los filtros de
+#             tiempo y sensor resueltos en la base (particiones de medicion y
+#             PK), vía COPY; read_dataset lee un dataset filtrando por partición
+#             y por las estadísticas de timestamp de cada row group.
+#   python -m src.parquet stage data/*.csv --root staging/
+#   python -m src.parquet load staging/ --start 2025-01-01 --end 2025-02-01
+#   python -m src.parquet export exportado/ --start 2025-01-01 --end 2025-02-01 [--sensor s1]
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.db import VARIABLES, BULK_BATCH_SIZE, insert_mediciones_bulk
+from src.batch import MeasurementBatch
+from src.ingest import iter_csv, detect_encoding, CHUNK_ROWS
+from src.ledger import file_fingerprint
+from src.metrics import METRICS
+from src.pool import borrowed
+from src.normalize import normalize_batch
+from src.raw_payload import FULL, RAW_REFS, RawPayload
+from src.timestamps import TimestampParser, InvalidTimestamps
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMNS = ['sensor_id', 'mes']
+COMPRESSION = 'zstd'
+READ_ROWS = 200000      # filas por lote al leer el staging / el COPY del export
+ROW_GROUP_ROWS = 131072
+
+EXPORT_SQL = """
+COPY (
+    SELECT sensor_id, (extract(epoch FROM timestamp) * 1000000)::bigint,
+           temperatura, humedad, presion, radiacion_solar, velocidad_viento
+    FROM medicion
+    WHERE timestamp >= %s AND timestamp < %s{sensores}
+    ORDER BY sensor_id, timestamp
+) TO STDOUT WITH (FORMAT csv)
+"""
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError("src.parquet necesita pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+def available():
+    try:
+        _arrow()
+    except ImportError:
+        return False
+    return True
+
+def _partitioning(pa):
+    # esquema explícito: sin él, sensores '1', '2' se leerían como números
+    return pa.dataset.partitioning(pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS]), flavor='hive')
+
+def _write_options(pa):
+    return pa.dataset.ParquetFileFormat().make_write_options(compression=COMPRESSION)
+
+def _months(ts_ns):
+    """'AAAA-MM' (UTC) por fila, desde epoch en ns."""
+    months, inverse = np.unique(ts_ns.astype('datetime64[ns]').astype('datetime64[M]'), return_inverse=True)
+    return np.datetime_as_string(months)[inverse].astype(object)
+
+def batch_table(batch, payloads=None, archivo=None):
+    """
+    MeasurementBatch -> pyarrow.Table con las columnas del staging: sensor_id,
+    mes (particiones), timestamp (µs UTC), variables (NaN -> null), fila,
+    archivo (sha256 del CSV) y raw_payload (JSON de src.raw_payload o null).
+    """
+    pa = _arrow()
+    ts_ns = batch.timestamp.asi8
+    # código -1 (sin sensor) -> null
+    sensors = np.append(batch.sensors, None)[batch.sensor_codes]
+    n = len(batch)
+    if payloads is None or isinstance(payloads, str):
+        payloads = [payloads] * n
+    columns = {
+        'sensor_id': pa.array(sensors, type=pa.string()),
+        'mes': pa.array(_months(ts_ns), type=pa.string()),
+        'timestamp': pa.array(ts_ns // 1000, type=pa.int64()).cast(pa.timestamp('us', tz='UTC')),
+    }
+    for j, var in enumerate(VARIABLES):
+        columns[var] = pa.array(batch.values[j], type=pa.float64(), from_pandas=True)
+    columns['fila'] = pa.array(batch.rows, type=pa.int64())
+    columns['archivo'] = pa.array([archivo] * n, type=pa.string())
+    columns['raw_payload'] = pa.array(payloads, type=pa.string())
+    return pa.table(columns)
+
+def table_batch(table):
+    """pyarrow.Table del staging o de export_parquet -> MeasurementBatch (flags RANGE recalculados)."""
+    pa = _arrow()
+    ts = table['timestamp'].cast(pa.timestamp('us', tz='UTC')).cast(pa.int64()).to_numpy()
+    timestamps = pd.DatetimeIndex(ts * 1000, tz='UTC')
+    values = {var: table[var].to_numpy() for var in VARIABLES if var in table.column_names}
+    rows = table['fila'].to_numpy() if 'fila' in table.column_names else None
+    return MeasurementBatch.from_columns(table['sensor_id'].to_numpy(zero_copy_only=False), timestamps, values, rows)
+
+class ParquetStage:
+    """
+    Staging de un archivo: cada lote normalizado se escribe en root como
+    sensor_id=<s>/mes=<AAAA-MM>/<hash>-<fila>-<i>.parquet (hash: los primeros
+    16 caracteres del sha256 del CSV; fila: la primera del lote).
+    raw_payload: RawPayload de la carga; lo que se guardaría en la base se
+      guarda en la columna raw_payload (en 'reference', nada: alcanza con archivo y fila).
+    replace: borrar antes lo que hubiera de este archivo (carga desde el
+      principio). Al retomar una carga a medias se agrega; una fila repetida
+      entre lotes se resuelve en el upsert de load_staged.
+    """
+
+    def __init__(self, root, digest, raw_payload=FULL, replace=True):
+        self.pa = _arrow()
+        self.root = Path(root)
+        self.digest = digest
+        self.prefix = digest[:16]
+        self.raw_payload = raw_payload
+        self.rows = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        if replace:
+            for old in self.root.glob(f'*/*/{self.prefix}-*.parquet'):
+                old.unlink()
+
+    def write(self, batch, raw=None):
+        """batch: MeasurementBatch de normalize_batch; raw: el chunk crudo (para raw_payload)."""
+        if not len(batch):
+            return 0
+        with METRICS.stage('staging', rows=len(batch)):
+            payloads = self.raw_payload.payloads(raw) if raw is not None else None
+            table = batch_table(batch, payloads, self.digest)
+            self.pa.dataset.write_dataset(
+                table, self.root, format='parquet', partitioning=_partitioning(self.pa),
+                basename_template=f'{self.prefix}-{int(batch.rows[0])}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore', file_options=_write_options(self.pa),
+                max_rows_per_group=ROW_GROUP_ROWS)
+        self.rows += len(batch)
+        return len(batch)
+
+def stage_file(csv_path, root, chunk_rows=None, raw_payload='full'):
+    """
+    Lee y normaliza el CSV (sin base) y lo deja en el staging root.
+    Retorna {'archivo', 'filas', 'mediciones', ...timestamps inválidos}.
+    """
+    p = Path(csv_path)
+    digest, _ = file_fingerprint(str(p))
+    # sin base no hay archivo_crudo: 'reference' no aplica
+    stage = ParquetStage(root, digest, RawPayload(raw_payload))
+    rows = 0
+    timestamps, invalid = TimestampParser(), InvalidTimestamps(str(p))
+    for df in iter_csv(str(p), chunksize=chunk_rows or CHUNK_ROWS, encoding=detect_encoding(str(p))):
+        if df.empty:
+            continue
+        norm, valid = invalid.drop(normalize_batch(df, timestamps), df)
+        stage.write(norm, valid)
+        rows += len(df)
+    return {'archivo': str(p), 'filas': rows, 'mediciones': stage.rows, **invalid.as_dict()}
+
+class StagedPayload(RawPayload):
+    """raw_payload ya resuelto en el staging (columna raw_payload del lote) + referencia a archivo_crudo."""
+
+    def __init__(self, archivo_id=None):
+        super().__init__('full' if archivo_id is None else 'reference', archivo_id)
+
+    def payloads(self, raw):
+        return None if raw is None else raw['raw_payload'].tolist()
+
+def _utc(t):
+    t = pd.Timestamp(t)
+    return t.tz_localize('UTC') if t.tzinfo is None else t.tz_convert('UTC')
+
+def _filter(pa, start=None, end=None, sensor_ids=None):
+    # las condiciones sobre sensor_id y mes descartan directorios; las de
+    # timestamp, row groups (por sus estadísticas min/max)
+    ds, conditions = pa.dataset, []
+    if sensor_ids:
+        conditions.append(ds.field('sensor_id').isin(list(sensor_ids)))
+    if start is not None:
+        start = _utc(start)
+        conditions.append(ds.field('mes') >= f'{start:%Y-%m}')
+        conditions.append(ds.field('timestamp') >= pa.scalar(start.to_pydatetime(), pa.timestamp('us', tz='UTC')))
+    if end is not None:
+        end = _utc(end)
+        conditions.append(ds.field('mes') <= f'{end:%Y-%m}')
+        conditions.append(ds.field('timestamp') < pa.scalar(end.to_pydatetime(), pa.timestamp('us', tz='UTC')))
+    expr = None
+    for c in conditions:
+        expr = c if expr is None else expr & c
+    return expr
+
+def open_dataset(root):
+    pa = _arrow()
+    return pa.dataset.dataset(root, format='parquet', partitioning=_partitioning(pa))
+
+def read_dataset(root, start=None, end=None, sensor_ids=None, columns=None):
+    """
+    DataFrame con las filas de un dataset (staging o export_parquet) en
+    [start, end) de sensor_ids (None = todos). Sólo se leen las particiones
+    y row groups que pueden tener filas del rango.
+    """
+    pa = _arrow()
+    table = open_dataset(root).to_table(columns=columns, filter=_filter(pa, start, end, sensor_ids))
+    return table.to_pandas()
+
+def _archivo_ids(conn, digests):
+    # archivo_crudo de cada CSV que se cargó alguna vez en modo reference
+    if not digests:
+        return {}
+    with conn.cursor() as cur:
+        if not RAW_REFS.enabled(cur):
+            return {}
+        cur.execute("SELECT hash_contenido, archivo_id FROM archivo_crudo WHERE hash_contenido = ANY(%s)", (list(digests),))
+        return dict(cur.fetchall())
+
+def load_staged(conn, root, start=None, end=None, sensor_ids=None, batch_size=BULK_BATCH_SIZE,
+                read_rows=READ_ROWS, procedure_version='v1'):
+    """
+    Carga en medicion el staging root (o lo que haya en [start, end) de
+    sensor_ids) con insert_mediciones_bulk, sin volver a leer los CSV. Los
+    flags RANGE y CONSISTENCY se calculan con los límites actuales; el
+    raw_payload es el que se guardó al hacer el staging (y la referencia a
+    archivo_crudo si el CSV está guardado ahí).
+    Retorna {'filas', 'mediciones', 'segundos'}.
+    """
+    pa = _arrow()
+    t0 = time.perf_counter()
+    dataset = open_dataset(root)
+    names = set(dataset.schema.names)
+    columns = [c for c in ['sensor_id', 'timestamp', *VARIABLES, 'fila', 'archivo', 'raw_payload'] if c in names]
+    scanner = dataset.scanner(columns=columns, filter=_filter(pa, start, end, sensor_ids), batch_size=read_rows)
+    archivo_ids = {}
+    rows = written = 0
+
+    def flush(batches):
+        table = pa.Table.from_batches(batches)
+        archivos = table['archivo'].to_numpy(zero_copy_only=False) if 'archivo' in names else np.full(table.num_rows, None)
+        new = {a for a in pd.unique(archivos) if a is not None and a not in archivo_ids}
+        if new:
+            archivo_ids.update(dict.fromkeys(new))
+            archivo_ids.update(_archivo_ids(conn, new))
+        n = 0
+        # un insert por archivo de origen: cada uno con su referencia a archivo_crudo
+        for archivo, pos in pd.Series(np.arange(table.num_rows)).groupby(pd.Series(archivos, dtype=object),
+                                                                         dropna=False, sort=False).indices.items():
+            part = table.take(pa.array(pos))
+            raw = pd.DataFrame({'raw_payload': part['raw_payload'].to_numpy(zero_copy_only=False)
+                                if 'raw_payload' in names else None}, index=range(part.num_rows))
+            payload = StagedPayload(archivo_ids.get(archivo) if isinstance(archivo, str) else None)
+            n += insert_mediciones_bulk(conn, table_batch(part), raw, procedure_version=procedure_version,
+                                        batch_size=batch_size, raw_payload=payload)
+        return table.num_rows, n
+
+    pending, size = [], 0
+    batches = iter(scanner.to_batches())
+    while True:
+        with METRICS.stage('lectura') as timer:
+            rb = next(batches, None)
+            timer.rows = 0 if rb is None else rb.num_rows
+        if rb is None or (size and size + rb.num_rows > read_rows):
+            if pending:
+                r, n = flush(pending)
+                rows, written = rows + r, written + n
+            pending, size = [], 0
+        if rb is None:
+            break
+        if rb.num_rows:
+            pending.append(rb)
+            size += rb.num_rows
+    elapsed = time.perf_counter() - t0
+    logger.info("staging %s: %d filas -> %d mediciones en %.2f s", root, rows, written, elapsed)
+    return {'filas': rows, 'mediciones': written, 'segundos': elapsed}
+
+def export_parquet(conn, out_dir, start=None, end=None, sensor_ids=None, read_rows=READ_ROWS):
+    """
+    Exporta medicion en [start, end) (de sensor_ids; None = todos) a un
+    dataset Parquet en out_dir, particionado por sensor y mes. Los filtros van
+    en la consulta (la base sólo recorre las particiones de medicion y el
+    rango de la PK que corresponden) y las filas salen con COPY, sin pasar por
+    tuplas de Python. Las particiones (sensor, mes) que se exportan se
+    reemplazan; las demás del directorio quedan.
+    conn: conexión a usar, sin tocar su transacción (None = una de POOL).
+    Retorna {'directorio', 'filas', 'archivos'}.
+    """
+    from src.export import _time_range   # export importa netCDF4
+    pa = _arrow()
+    sensor_ids = list(sensor_ids) if sensor_ids else None
+    if start is None or end is None:
+        with borrowed(conn) as c:
+            lo, hi = _time_range(c, sensor_ids)
+        if lo is None:
+            return {'directorio': str(out_dir), 'filas': 0, 'archivos': 0}
+        start = lo if start is None else start
+        end = hi if end is None else end
+    start, end = _utc(start), _utc(end)
+    query = EXPORT_SQL.format(sensores=' AND sensor_id = ANY(%s::text[])' if sensor_ids else '')
+    params = (start.to_pydatetime(), end.to_pydatetime()) + ((sensor_ids,) if sensor_ids else ())
+    names = ['sensor_id', 'ts_us'] + VARIABLES
+    types = {'sensor_id': pa.string(), 'ts_us': pa.int64(), **{var: pa.float64() for var in VARIABLES}}
+    schema = pa.schema([('sensor_id', pa.string()), ('mes', pa.string()),
+                        ('timestamp', pa.timestamp('us', tz='UTC'))] + [(var, pa.float64()) for var in VARIABLES])
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rows = 0
+    # el COPY se vuelca a un archivo temporal y se lee por bloques: memoria acotada
+    with tempfile.TemporaryFile() as spool:
+        with borrowed(conn) as c, c.cursor() as cur, METRICS.stage('lectura'):
+            cur.copy_expert(cur.mogrify(query, params).decode(), spool)
+        spool.seek(0)
+        reader = pa.csv.open_csv(spool, read_options=pa.csv.ReadOptions(column_names=names, block_size=1 << 24),
+                                 convert_options=pa.csv.ConvertOptions(column_types=types))
+
+        def batches():
+            nonlocal rows
+            for rb in reader:
+                ts = rb.column('ts_us').cast(pa.timestamp('us', tz='UTC'))
+                mes = pa.array(_months(rb.column('ts_us').to_numpy(zero_copy_only=False) * 1000), type=pa.string())
+                rows += rb.num_rows
+                yield pa.RecordBatch.from_arrays([rb.column('sensor_id'), mes, ts] + [rb.column(v) for v in VARIABLES],
+                                                 schema=schema)
+
+        written = []
+        with METRICS.stage('escritura') as timer:
+            pa.dataset.write_dataset(batches(), out_dir, schema=schema, format='parquet',
+                                     partitioning=_partitioning(pa), basename_template='medicion-{i}.parquet',
+                                     existing_data_behavior='delete_matching', file_options=_write_options(pa),
+                                     max_rows_per_group=ROW_GROUP_ROWS, file_visitor=written.append)
+            timer.rows = rows
+    logger.info("export parquet %s: %d filas en %d archivos", out_dir, rows, len(written))
+    return {'directorio': str(out_dir), 'filas': rows, 'archivos': len(written)}
+
+if __name__ == "__main__":
+    from src.db import POOL
+    parser = argparse.ArgumentParser(prog='python -m src.parquet')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_stage = sub.add_parser('stage', help='CSV -> staging Parquet (sin base)')
+    p_stage.add_argument('inputs', nargs='+', help='archivos CSV')
+    p_stage.add_argument('--root', required=True, help='directorio del staging')
+    p_stage.add_argument('--chunk-rows', type=int, default=None)
+    p_stage.add_argument('--raw-payload', choices=['full', 'none', 'unmapped'], default='full')
+    for name, help_text in (('load', 'staging -> medicion'), ('export', 'medicion -> dataset Parquet')):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('root', help='directorio del dataset')
+        p.add_argument('--start', help='inicio (incluido), p.ej. 2025-01-01')
+        p.add_argument('--end', help='fin (excluido)')
+        p.add_argument('--sensor', action='append', dest='sensors', help='sensor (repetible)')
+    p_load = sub.choices['load']
+    p_load.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    p_load.add_argument('--clean', action='store_true', help='borrar el staging después de cargarlo completo')
+    args = parser.parse_args()
+    if args.cmd == 'stage':
+        for path in args.inputs:
+            s = stage_file(path, args.root, chunk_rows=args.chunk_rows, raw_payload=args.raw_payload)
+            print(f"{s['archivo']}: {s['filas']} filas -> {s['mediciones']} mediciones en {args.root}")
+    elif args.cmd == 'load':
+        with POOL.connection() as conn:
+            s = load_staged(conn, args.root, start=args.start, end=args.end, sensor_ids=args.sensors,
+                            batch_size=args.batch_size)
+        print(f"{args.root}: {s['filas']} filas -> {s['mediciones']} mediciones en {s['segundos']:.2f} s")
+        if args.clean and not (args.start or args.end or args.sensors):
+            shutil.rmtree(args.root)
+    else:
+        with POOL.connection() as conn:
+            s = export_parquet(conn, args.root, start=args.start, end=args.end, sensor_ids=args.sensors)
+        print(f"{s['directorio']}: {s['filas']} filas en {s['archivos']} archivos")
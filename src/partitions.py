@@ -0,0 +1,208 @@
+# src/partitions.py
+# Particiones mensuales de medicion (ver migraciones/001_medicion_particionada.sql):
+# crear las que faltan antes de cargar y desenganchar / archivar las viejas
+# (con sus validaciones).
+import argparse
+import logging
+import re
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'medicion'
+DEFAULT_PARTITION = 'medicion_default'
+AHEAD_MONTHS = 3          # meses futuros creados por create_ahead
+MAX_NEW_MONTHS = 36       # particiones nuevas por llamada a ensure; más -> van a la default
+ARCHIVE_SCHEMA = 'archivo'
+
+PARTITIONS_SQL = """
+SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(%s);
+"""
+
+def partition_name(month, table=TABLE):
+    """(año, mes) -> 'medicion_p202501'"""
+    return f"{table}_p{month[0]:04d}{month[1]:02d}"
+
+def month_of(name, table=TABLE):
+    m = re.fullmatch(re.escape(table) + r'_p(\d{4})(\d{2})', name)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+def next_month(month):
+    y, m = month
+    return (y + 1, 1) if m == 12 else (y, m + 1)
+
+def month_start(month):
+    return f"{month[0]:04d}-{month[1]:02d}-01 00:00:00+00"
+
+def months_between(start, end):
+    """Meses (UTC) que tocan [start, end], como tuplas (año, mes)."""
+    lo, hi = (pd.Timestamp(t) for t in (start, end))
+    lo = lo.tz_convert('UTC') if lo.tzinfo else lo
+    hi = hi.tz_convert('UTC') if hi.tzinfo else hi
+    month, last = (lo.year, lo.month), (hi.year, hi.month)
+    out = []
+    while month <= last:
+        out.append(month)
+        month = next_month(month)
+    return out
+
+def months_present(timestamps):
+    """Meses (UTC) con al menos un timestamp, ordenados: no todo el rango entre min y max."""
+    ts = pd.to_datetime(pd.Series(timestamps), utc=True).dropna()
+    codes = np.unique(ts.dt.year.to_numpy() * 12 + ts.dt.month.to_numpy() - 1)
+    return [(int(c // 12), int(c % 12) + 1) for c in codes]
+
+def is_partitioned(cur, table=TABLE):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", (table,))
+    return cur.fetchone()[0]
+
+class PartitionManager:
+    """
+    Crea bajo demanda las particiones mensuales de medicion. Recuerda los meses
+    ya vistos, así ensure() no consulta el catálogo en cada lote. Si la tabla
+    no está particionada (base sin migrar) no hace nada.
+    """
+
+    def __init__(self, table=TABLE, default=DEFAULT_PARTITION):
+        self.table = table
+        self.default = default
+        self._months = set()
+        self._partitioned = None
+
+    def clear(self):
+        self._months.clear()
+        self._partitioned = None
+
+    def existing(self, cur):
+        cur.execute(PARTITIONS_SQL, (self.table,))
+        return {r[0] for r in cur.fetchall()}
+
+    def pending(self, start, end):
+        """Si ensure(start, end) tendría que ir al catálogo (meses todavía no vistos)."""
+        if self._partitioned is False or start is None or end is None:
+            return False
+        return any(m not in self._months for m in months_between(start, end))
+
+    def ensure(self, conn, start, end):
+        """
+        Crea (y hace commit de) las particiones de los meses entre start y end
+        que no existan; las filas de esos meses que hubieran caído en la
+        partición default se mueven a la nueva. Retorna los nombres creados.
+        """
+        if self._partitioned is False:
+            return []
+        return self.ensure_months(conn, months_between(start, end))
+
+    def ensure_months(self, conn, months):
+        """
+        Como ensure, para una lista de meses (año, mes), p.ej. months_present
+        de un lote. Si faltan más de MAX_NEW_MONTHS (un timestamp basura como
+        1970 o 2099 en medio de datos de 2025) no crea ninguna: esas filas
+        quedan en la partición default y se avisa en el log.
+        """
+        if self._partitioned is False:
+            return []
+        missing = [m for m in months if m not in self._months]
+        if not missing:
+            return []
+        if len(missing) > MAX_NEW_MONTHS:
+            logger.warning("%d meses sin partición (%s a %s), más que MAX_NEW_MONTHS=%d: las filas van a %s; "
+                           "crear las particiones a mano si son datos válidos",
+                           len(missing), partition_name(missing[0], self.table),
+                           partition_name(missing[-1], self.table), MAX_NEW_MONTHS, self.default)
+            return []
+        created = []
+        with conn.cursor() as cur:
+            if self._partitioned is None:
+                self._partitioned = is_partitioned(cur, self.table)
+            if self._partitioned:
+                # un solo proceso crea particiones a la vez (workers en paralelo)
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (self.table,))
+                existing = self.existing(cur)
+                for month in missing:
+                    name = partition_name(month, self.table)
+                    if name not in existing:
+                        self._create(cur, month, name)
+                        created.append(name)
+        conn.commit()
+        self._months.update(missing)
+        return created
+
+    def _create(self, cur, month, name):
+        lo, hi = month_start(month), month_start(next_month(month))
+        ident = sql.Identifier(name)
+        cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(ident, sql.Identifier(self.table)))
+        cur.execute(
+            sql.SQL("WITH moved AS (DELETE FROM {} WHERE timestamp >= %s AND timestamp < %s RETURNING *) "
+                    "INSERT INTO {} SELECT * FROM moved").format(sql.Identifier(self.default), ident),
+            (lo, hi)
+        )
+        cur.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(self.table), ident), (lo, hi))
+
+    def create_ahead(self, conn, months=AHEAD_MONTHS, now=None):
+        """Particiones del mes actual y de los months siguientes."""
+        now = pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now)
+        return self.ensure(conn, now, now + pd.DateOffset(months=months))
+
+    def archive(self, conn, before, drop=False, schema=ARCHIVE_SCHEMA):
+        """
+        Desengancha las particiones de meses que terminan antes de before.
+        Quedan como tablas sueltas en el esquema schema (consultables, fuera de
+        medicion) o se borran con drop=True. Sus validaciones (validacion no
+        tiene FK a medicion) siguen el mismo camino en la misma transacción:
+        pasan a schema.validacion o se borran. Retorna los nombres afectados.
+        """
+        before = pd.Timestamp(before)
+        before = before.tz_convert('UTC') if before.tzinfo else before.tz_localize('UTC')
+        done = []
+        with conn.cursor() as cur:
+            if not is_partitioned(cur, self.table):
+                return done
+            for name in sorted(self.existing(cur)):
+                month = month_of(name, self.table)
+                if month is None or pd.Timestamp(month_start(next_month(month))) > before:
+                    continue
+                ident = sql.Identifier(name)
+                cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(self.table), ident))
+                if drop:
+                    cur.execute(sql.SQL("DELETE FROM validacion v USING {} m WHERE v.medicion_id = m.medicion_id")
+                                .format(ident))
+                    cur.execute(sql.SQL("DROP TABLE {}").format(ident))
+                else:
+                    archived = sql.Identifier(schema, 'validacion')
+                    cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema)))
+                    cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} (LIKE validacion INCLUDING INDEXES)")
+                                .format(archived))
+                    cur.execute(sql.SQL("WITH moved AS (DELETE FROM validacion v USING {} m "
+                                        "WHERE v.medicion_id = m.medicion_id RETURNING v.*) "
+                                        "INSERT INTO {} SELECT * FROM moved").format(ident, archived))
+                    cur.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(ident, sql.Identifier(schema)))
+                self._months.discard(month)
+                done.append(name)
+        conn.commit()
+        return done
+
+# administrador compartido por todo el proceso
+PARTITIONS = PartitionManager()
+
+if __name__ == "__main__":
+    from src.config import DB
+    from src.db import get_conn
+    parser = argparse.ArgumentParser(prog='python -m src.partitions')
+    parser.add_argument('--ahead', type=int, default=AHEAD_MONTHS, help='meses futuros a crear')
+    parser.add_argument('--archive-before', help="desenganchar particiones de meses anteriores a esta fecha (p.ej. 2024-01)")
+    parser.add_argument('--drop', action='store_true', help='borrar (en vez de mover al esquema archivo) las desenganchadas')
+    args = parser.parse_args()
+    conn = get_conn(DB)
+    try:
+        for name in PARTITIONS.create_ahead(conn, args.ahead):
+            print("creada:", name)
+        if args.archive_before:
+            for name in PARTITIONS.archive(conn, args.archive_before, drop=args.drop):
+                print("borrada:" if args.drop else f"archivada en {ARCHIVE_SCHEMA}:", name)
+    finally:
+        conn.close()
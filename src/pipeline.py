@@ -0,0 +1,189 @@
+# src/pipeline.py
+# Pipeline asyncio: lectura, normalización y escritura se solapan, unidas por
+# colas acotadas (backpressure). El trabajo bloqueante corre en threads; la
+# escritura usa un único thread dedicado con la conexión psycopg2.
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from src.config import INGEST
+from src.ingest import iter_csv, detect_encoding
+from src.normalize import normalize_batch, records_from_frame
+from src.timestamps import TimestampParser, InvalidTimestamps
+from src.db import insert_medicion_rows, insert_mediciones_bulk
+from src.raw_payload import FULL
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 4     # chunks en espera entre etapas
+
+_END = object()
+
+class StageMetrics:
+    """Tiempo trabajando (busy) y esperando la cola de entrada o de salida (wait) de una etapa."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.rows = 0
+        self.busy = 0.0
+        self.wait_in = 0.0
+        self.wait_out = 0.0
+
+    def as_dict(self):
+        return {'items': self.items, 'filas': self.rows, 'busy_s': round(self.busy, 4),
+                'espera_entrada_s': round(self.wait_in, 4), 'espera_salida_s': round(self.wait_out, 4)}
+
+class MeteredQueue:
+    """asyncio.Queue acotada que registra la profundidad en cada put."""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.samples = 0
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    async def put(self, item, stage):
+        t0 = time.perf_counter()
+        await self.queue.put(item)
+        stage.wait_out += time.perf_counter() - t0
+        depth = self.queue.qsize()
+        self.samples += 1
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    async def get(self, stage):
+        t0 = time.perf_counter()
+        item = await self.queue.get()
+        stage.wait_in += time.perf_counter() - t0
+        return item
+
+    def as_dict(self):
+        return {'capacidad': self.queue.maxsize, 'max': self.depth_max,
+                'media': round(self.depth_sum / self.samples, 2) if self.samples else 0.0}
+
+async def _read_stage(path, encoding, chunk_rows, out, m, skip_rows=0):
+    it = iter_csv(path, chunksize=chunk_rows, encoding=encoding, skip_rows=skip_rows)
+    while True:
+        t0 = time.perf_counter()
+        df = await asyncio.to_thread(next, it, None)
+        m.busy += time.perf_counter() - t0
+        if df is None:
+            break
+        if df.empty:
+            continue
+        m.items += 1
+        m.rows += len(df)
+        await out.put(df, m)
+    await out.put(_END, m)
+
+async def _normalize_stage(inp, out, m, timestamps, invalid):
+    while True:
+        df = await inp.get(m)
+        if df is _END:
+            break
+        t0 = time.perf_counter()
+        norm = await asyncio.to_thread(normalize_batch, df, timestamps)
+        norm, df = invalid.drop(norm, df)
+        m.busy += time.perf_counter() - t0
+        m.items += 1
+        m.rows += len(norm)
+        await out.put((df, norm), m)
+    await out.put(_END, m)
+
+def _write(conn, df, norm, mode, batch_size, checkpoint=None, raw_payload=FULL, tx=None, stage=None):
+    if stage is not None:
+        stage.write(norm, df)
+    if mode == 'bulk':
+        return insert_mediciones_bulk(conn, norm, df, procedure_version='v1', batch_size=batch_size, checkpoint=checkpoint,
+                                      raw_payload=raw_payload)
+    if tx is not None:
+        n = 0
+        for pos, rec in zip(norm.index, records_from_frame(norm, df)):
+            rec['fila'] = int(pos)
+            n += tx.insert(rec, procedure_version='v1', raw_payload=raw_payload)
+        return n
+    rows = ((int(pos), rec) for pos, rec in zip(norm.index, records_from_frame(norm, df)))
+    return insert_medicion_rows(conn, rows, procedure_version='v1', checkpoint=checkpoint, raw_payload=raw_payload)
+
+async def _write_stage(conn, inp, mode, batch_size, executor, m, checkpoint=None, raw_payload=FULL, tx=None, stage=None):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await inp.get(m)
+        if item is _END:
+            break
+        df, norm = item
+        t0 = time.perf_counter()
+        await loop.run_in_executor(executor, _write, conn, df, norm, mode, batch_size, checkpoint, raw_payload, tx, stage)
+        m.busy += time.perf_counter() - t0
+        m.items += 1
+        m.rows += len(norm)
+
+async def run_pipeline(conn, csv_path, mode=None, batch_size=None, chunk_rows=None, queue_size=QUEUE_SIZE,
+                       skip_rows=0, checkpoint=None, raw_payload=FULL, tx=None, stage=None):
+    """
+    Carga un CSV con las tres etapas solapadas. Retorna las mismas estadísticas
+    que loader.ingest_file (filas = filas leídas) más 'metricas': por etapa (items, filas, busy/espera)
+    y por cola (profundidad máxima y media); 'cuello' es la etapa con más busy.
+    skip_rows / checkpoint: ver loader.ingest_file.
+    raw_payload: RawPayload del archivo (ver src.raw_payload).
+    tx: db.TransactionBatch para agrupar commits en modo row (lo confirma el llamador).
+    stage: parquet.ParquetStage donde se guardan también los lotes (en el thread de escritura).
+    """
+    mode = mode or INGEST['mode']
+    batch_size = batch_size or INGEST['batch_size']
+    chunk_rows = chunk_rows or INGEST['chunk_rows']
+    p = Path(csv_path)
+    if not p.exists():
+        raise FileNotFoundError(f"Archivo no encontrado: {p.resolve()}")
+    t0 = time.perf_counter()
+    encoding = detect_encoding(str(p))
+    stages = {name: StageMetrics(name) for name in ('lectura', 'normalizacion', 'escritura')}
+    q_norm = MeteredQueue('a_normalizar', queue_size)
+    q_write = MeteredQueue('a_escribir', queue_size)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+    timestamps, invalid = TimestampParser(), InvalidTimestamps(str(p))
+    tasks = [
+        asyncio.create_task(_read_stage(str(p), encoding, chunk_rows, q_norm, stages['lectura'], skip_rows)),
+        asyncio.create_task(_normalize_stage(q_norm, q_write, stages['normalizacion'], timestamps, invalid)),
+        asyncio.create_task(_write_stage(conn, q_write, mode, batch_size, executor, stages['escritura'],
+                                        checkpoint, raw_payload, tx, stage)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - t0
+    # filas leídas del archivo (las sin timestamp no llegan a escritura)
+    rows = stages['lectura'].rows
+    metricas = {
+        'etapas': {name: s.as_dict() for name, s in stages.items()},
+        'colas': {q.name: q.as_dict() for q in (q_norm, q_write)},
+        'cuello': max(stages.values(), key=lambda s: s.busy).name,
+    }
+    logger.info("%s: %d filas en %.2f s (async, cuello: %s) %s", p, rows, elapsed, metricas['cuello'], metricas)
+    return {'archivo': str(p), 'filas': rows, 'segundos': elapsed,
+            'filas_s': rows / elapsed if elapsed else 0.0, 'metricas': metricas, **invalid.as_dict()}
+
+def ingest_file_async(conn, csv_path, mode=None, batch_size=None, chunk_rows=None, queue_size=QUEUE_SIZE,
+                      skip_rows=0, checkpoint=None, raw_payload=FULL, tx=None, stage=None):
+    """Versión síncrona de run_pipeline."""
+    return asyncio.run(run_pipeline(conn, csv_path, mode=mode, batch_size=batch_size, chunk_rows=chunk_rows,
+                                    queue_size=queue_size, skip_rows=skip_rows, checkpoint=checkpoint,
+                                    raw_payload=raw_payload, tx=tx, stage=stage))
+
+def format_metrics(metricas):
+    lines = [f"{'etapa':15s} {'items':>6s} {'filas':>10s} {'busy s':>8s} {'esp. ent':>9s} {'esp. sal':>9s}"]
+    for name, s in metricas['etapas'].items():
+        lines.append(f"{name:15s} {s['items']:>6d} {s['filas']:>10d} {s['busy_s']:>8.2f} "
+                     f"{s['espera_entrada_s']:>9.2f} {s['espera_salida_s']:>9.2f}")
+    for name, q in metricas['colas'].items():
+        lines.append(f"cola {name}: max {q['max']}/{q['capacidad']}, media {q['media']}")
+    lines.append(f"cuello de botella: {metricas['cuello']}")
+    return '\n'.join(lines)
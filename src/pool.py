@@ -0,0 +1,193 @@
+# src/pool.py
+# Conexiones a la base compartidas por el proceso: POOL entrega conexiones de
+# db.get_conn (MeteredConnection) a main, parallel, dictionary y
+# debug_pipeline, y execute_prepared ejecuta las consultas calientes como
+# sentencias preparadas del servidor. src.db reexporta ambos; este módulo no
+# importa src.db para que dictionary (que db importa) pueda usarlo.
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from src.config import DB
+from src.metrics import METRICS, MeteredConnection
+
+class PoolTimeout(RuntimeError):
+    """No se liberó ninguna conexión del pool dentro del timeout pedido."""
+
+def connect(config, **kwargs):
+    # la conexión de db.get_conn (está acá para no importar src.db)
+    return psycopg2.connect(
+        host=config['host'],
+        dbname=config['dbname'],
+        user=config['user'],
+        password=config['password'],
+        port=config['port'],
+        connect_timeout=kwargs.pop('connect_timeout', config.get('connect_timeout')),
+        connection_factory=MeteredConnection,
+        **kwargs
+    )
+
+class ConnectionPool:
+    """
+    Pool thread-safe de hasta max_size conexiones. getconn espera (con
+    timeout opcional) si todas están en uso; cada espera queda en
+    METRICS.db['POOL_ESPERA'] y en stats(). Al devolver una conexión se
+    deshace la transacción abierta que tuviera. Después de un fork (workers
+    de parallel) el proceso hijo empieza con el pool vacío: las conexiones
+    del padre no se comparten ni se cierran desde el hijo.
+    """
+
+    def __init__(self, config=DB, max_size=None):
+        self.config = config
+        self.max_size = max_size or config.get('pool_size', 4)
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._size = 0           # conexiones abiertas (libres + en uso + abriéndose)
+        self._waits = 0
+        self._wait_s = 0.0
+        self._wait_max = 0.0
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._cond = threading.Condition()
+            self._reset()
+
+    def getconn(self, timeout=None, connect_timeout=None):
+        """
+        Conexión libre del pool (o una nueva si hay lugar). timeout: segundos
+        máximos de espera (None = sin límite); si vence, PoolTimeout.
+        connect_timeout: para la conexión nueva, si hay que abrirla.
+        """
+        self._check_fork()
+        t0 = time.perf_counter()
+        deadline = None if timeout is None else t0 + timeout
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    self._record_wait(time.perf_counter() - t0)
+                    raise PoolTimeout(f"sin conexiones libres en el pool ({self.max_size}) tras {timeout} s")
+                self._cond.wait(remaining)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._size += 1
+            self._record_wait(time.perf_counter() - t0)
+        if conn is None:
+            try:
+                kwargs = {} if connect_timeout is None else {'connect_timeout': connect_timeout}
+                conn = connect(self.config, **kwargs)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def _record_wait(self, seconds):
+        # con el lock tomado
+        self._waits += 1
+        self._wait_s += seconds
+        self._wait_max = max(self._wait_max, seconds)
+        METRICS.observe_db('POOL_ESPERA', seconds)
+
+    def putconn(self, conn):
+        """Devuelve conn al pool (con su transacción deshecha); una conexión rota se descarta."""
+        self._check_fork()
+        keep = not conn.closed
+        if keep:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                keep = False
+                conn.close()
+        with self._cond:
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None, connect_timeout=None):
+        """with POOL.connection() as conn: ... (se devuelve al pool al salir)."""
+        conn = self.getconn(timeout=timeout, connect_timeout=connect_timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Cierra las conexiones libres (las que están en uso se descartan al devolverlas)."""
+        self._check_fork()
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {'max': self.max_size, 'abiertas': self._size, 'libres': len(self._idle),
+                    'esperas': self._waits, 'espera_s': round(self._wait_s, 6), 'espera_max_s': round(self._wait_max, 6)}
+
+# compartido por todo el proceso
+POOL = ConnectionPool()
+
+@contextmanager
+def borrowed(conn=None):
+    """
+    with borrowed(conn) as c: ... para lecturas. Con conn, se usa esa tal
+    cual: su transacción queda a cargo del que llama (no se confirma ni se
+    deshace). Sin conn, una de POOL (al devolverla se cierra la lectura).
+    """
+    if conn is not None:
+        yield conn
+        return
+    with POOL.connection() as pooled:
+        yield pooled
+
+# --- sentencias preparadas ---
+
+_PARAM = re.compile(r'%\((\w+)\)s|%s')
+
+def _numbered(query):
+    """query con %s / %(nombre)s -> (query con $1..$n, nombres en orden o None por posición)."""
+    names = []
+
+    def sub(m):
+        name = m.group(1)
+        if name is None or name not in names:
+            names.append(name)
+            return f'${len(names)}'
+        return f'${names.index(name) + 1}'
+
+    return _PARAM.sub(sub, query), names
+
+def execute_prepared(cur, name, query, params):
+    """
+    Ejecuta query (una sola sentencia, con %s o %(nombre)s) como sentencia
+    preparada del servidor: PREPARE la primera vez en cada conexión, después
+    sólo EXECUTE (el plan no se vuelve a armar en cada fila). Las conexiones
+    sin registro de sentencias (no MeteredConnection) o con DB_PREPARE=0
+    (p.ej. detrás de pgbouncer en modo transacción) ejecutan query directo.
+    """
+    prepared = getattr(getattr(cur, 'connection', None), 'prepared', None)
+    if prepared is None or not DB.get('prepare', True):
+        return cur.execute(query, params)
+    numbered, names = _numbered(query)
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {numbered}")
+        prepared.add(name)
+    values = [params[n] for n in names] if isinstance(params, dict) else list(params)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))})" if values else f"EXECUTE {name}", values)
@@ -0,0 +1,229 @@
+# src/qc.py
+# Control de calidad temporal sobre la serie completa de cada sensor, con
+# operaciones vectorizadas (numpy): RANGE, CONSISTENCY, SPIKE, STEP, RATE y
+# FLATLINE. Los umbrales salen de la tabla variable (dictionary.LIMITS).
+# La carga ya marca RANGE y CONSISTENCY fila a fila; run_qc vuelve a pasar
+# todas las reglas sobre lo guardado y reescribe esos flags en bloque.
+#   python -m src.qc --start 2025-01-01 --end 2025-02-01 [--sensor s1 ...]
+import argparse
+import io
+import numpy as np
+import pandas as pd
+from src.dictionary import LIMITS
+
+VARIABLES = ['temperatura', 'humedad', 'presion', 'radiacion_solar', 'velocidad_viento']
+RULES = ('RANGE', 'CONSISTENCY', 'SPIKE', 'STEP', 'RATE', 'FLATLINE')
+
+# RATE: cada lectura se compara con la última al menos 10 minutos anterior (o
+# con la anterior si no hay), para no medir el ruido entre lecturas de alta
+# frecuencia; los saltos cortos los cubren SPIKE y STEP
+RATE_MIN_GAP_S = 600
+CONTEXT = pd.Timedelta(hours=1)     # lecturas leídas antes/después de la ventana (mínimo)
+NS_PER_S = 1_000_000_000
+
+# etiquetas de CONSISTENCY, como las escribe la carga (db.consistency_flags)
+LABELS = {'temperatura': 'temp', 'humedad': 'hum'}
+
+def _prev(x, same):
+    # valor de la lectura anterior del mismo sensor (NaN en la primera)
+    out = np.full(len(x), np.nan)
+    out[1:] = np.where(same[1:], x[:-1], np.nan)
+    return out
+
+def _next(x, same):
+    out = np.full(len(x), np.nan)
+    out[:-1] = np.where(same[1:], x[1:], np.nan)
+    return out
+
+def range_mask(x, lo, hi):
+    with np.errstate(invalid='ignore'):
+        bad = np.zeros(len(x), dtype=bool)
+        if lo is not None:
+            bad |= x < lo
+        if hi is not None:
+            bad |= x > hi
+    return bad
+
+def spike_mask(x, prev, nxt, limit):
+    """Pico: el valor se aparta de sus dos vecinos más de limit (y no es una rampa entre ellos)."""
+    with np.errstate(invalid='ignore'):
+        return np.abs(x - (prev + nxt) / 2) - np.abs(nxt - prev) / 2 > limit
+
+def step_mask(x, prev, spikes, limit):
+    """Escalón: salto mayor que limit respecto de la lectura anterior que no es parte de un pico."""
+    prev_spike = np.zeros(len(x), dtype=bool)
+    prev_spike[1:] = spikes[:-1]
+    with np.errstate(invalid='ignore'):
+        return (np.abs(x - prev) > limit) & ~spikes & ~prev_spike
+
+def rate_per_hour(t, x, same):
+    """Cambio por hora contra la última lectura del sensor con al menos RATE_MIN_GAP_S de distancia."""
+    n = len(x)
+    ref = np.arange(n) - 1
+    starts = np.flatnonzero(~same)
+    for a, b in zip(starts, np.append(starts[1:], n)):
+        seg = t[a:b]
+        j = np.searchsorted(seg, seg - RATE_MIN_GAP_S * NS_PER_S, side='right') - 1
+        ref[a:b] = np.where(j >= 0, a + j, np.arange(a, b) - 1)
+    ref[starts] = -1
+    rate = np.full(n, np.nan)
+    ok = ref >= 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate[ok] = np.abs(x[ok] - x[ref[ok]]) / np.maximum((t[ok] - t[ref[ok]]) / NS_PER_S, RATE_MIN_GAP_S) * 3600
+    return rate
+
+def flatline_runs(t, x, same):
+    """
+    Duración (s) del tramo de valores idénticos al que pertenece cada lectura.
+    Un NaN corta el tramo; se marca el tramo entero, no sólo su final.
+    """
+    n = len(x)
+    change = np.ones(n, dtype=bool)
+    change[1:] = ~same[1:] | (x[1:] != x[:-1])
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:] - 1, n - 1)
+    run = np.cumsum(change) - 1
+    duration = (t[ends] - t[starts]) / NS_PER_S
+    return np.where(np.isnan(x), 0.0, duration[run])
+
+def qc_frame(df, limits=LIMITS, rules=RULES):
+    """
+    df: sensor_id, timestamp y las columnas de VARIABLES (MeasurementBatch,
+      normalize_frame o filas de medicion), un timestamp por sensor.
+    Corre las reglas sobre la serie de cada sensor ordenada por tiempo.
+    Retorna un DataFrame fila (posición en df), tipo_flag, descripcion_problema,
+    ordenado por fila.
+    """
+    n = len(df)
+    out = {'fila': [], 'tipo_flag': [], 'descripcion_problema': []}
+    if n:
+        codes = pd.factorize(df['sensor_id'])[0]
+        t_all = pd.DatetimeIndex(df['timestamp']).as_unit('ns').asi8
+        order = np.lexsort((t_all, codes))
+        t = t_all[order]
+        same = np.zeros(n, dtype=bool)
+        same[1:] = codes[order][1:] == codes[order][:-1]
+
+    def add(tipo, mask, describe):
+        rows = np.flatnonzero(mask)
+        out['fila'].extend(order[rows].tolist())
+        out['tipo_flag'].extend([tipo] * len(rows))
+        out['descripcion_problema'].extend(describe(i) for i in rows)
+
+    for var in VARIABLES if n else ():
+        x = df[var].to_numpy(dtype=float)[order]
+        prev, nxt = _prev(x, same), _next(x, same)
+        lo, hi = limits.range(var)
+        if 'RANGE' in rules and (lo is not None or hi is not None):
+            add('RANGE', range_mask(x, lo, hi), lambda i: f'{var}={x[i]} fuera de rango [{lo},{hi}]')
+        limit = limits.get(var, 'cambio_maximo')
+        if 'CONSISTENCY' in rules and limit is not None:
+            with np.errstate(invalid='ignore'):
+                bad = np.abs(x - prev) > limit
+            label = LABELS.get(var, var)
+            add('CONSISTENCY', bad, lambda i: f'{label} change {x[i]} vs {prev[i]}')
+        limit = limits.get(var, 'salto_maximo')
+        if limit is not None and ('SPIKE' in rules or 'STEP' in rules):
+            spikes = spike_mask(x, prev, nxt, limit)
+            if 'SPIKE' in rules:
+                add('SPIKE', spikes, lambda i: f'{var}={x[i]} pico entre {prev[i]} y {nxt[i]}')
+            if 'STEP' in rules:
+                add('STEP', step_mask(x, prev, spikes, limit), lambda i: f'{var} salto {prev[i]} -> {x[i]}')
+        limit = limits.get(var, 'tasa_maxima')
+        if 'RATE' in rules and limit is not None:
+            rate = rate_per_hour(t, x, same)
+            with np.errstate(invalid='ignore'):
+                bad = rate > limit
+            add('RATE', bad, lambda i: f'{var} cambia {rate[i]:.3g}/h (max {limit}/h)')
+        limit = limits.get(var, 'plano_minutos')
+        if 'FLATLINE' in rules and limit is not None:
+            runs = flatline_runs(t, x, same)
+            add('FLATLINE', runs >= limit * 60, lambda i: f'{var}={x[i]} sin cambios {runs[i] / 60:.0f} min')
+    flags = pd.DataFrame(out)
+    return flags.sort_values('fila', kind='stable').reset_index(drop=True)
+
+# --- pasada sobre lo guardado en medicion ---
+
+SENSORS_SQL = """
+SELECT sensor_id FROM sensor
+WHERE (%(ids)s::text[] IS NULL OR sensor_id = ANY(%(ids)s::text[]))
+ORDER BY sensor_id;
+"""
+
+SERIES_SQL = f"""
+SELECT medicion_id, sensor_id, timestamp, {', '.join(VARIABLES)}
+FROM medicion
+WHERE sensor_id = %(s)s AND timestamp >= %(desde)s AND timestamp < %(hasta)s
+ORDER BY timestamp;
+"""
+
+def context(limits=LIMITS):
+    """Margen de lecturas a cada lado de la ventana: el tramo FLATLINE más largo configurado."""
+    minutes = [limits.get(var, 'plano_minutos') or 0 for var in VARIABLES]
+    return max(CONTEXT, pd.Timedelta(minutes=max(minutes)))
+
+def run_qc(conn, start, end, sensor_ids=None, limits=LIMITS, rules=RULES):
+    """
+    Pasa las reglas sobre la serie guardada de cada sensor en [start, end),
+    con context() de margen para que las lecturas del borde tengan vecinos.
+    Por sensor, en una transacción: borra los flags de tipo rules de esas
+    mediciones y escribe los nuevos con COPY.
+    Retorna {sensor_id -> {'filas', 'flags'}} de los sensores con datos.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    start = start.tz_convert('UTC') if start.tzinfo else start.tz_localize('UTC')
+    end = end.tz_convert('UTC') if end.tzinfo else end.tz_localize('UTC')
+    margin = context(limits)
+    with conn.cursor() as cur:
+        cur.execute(SENSORS_SQL, {'ids': list(sensor_ids) if sensor_ids is not None else None})
+        sensors = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    stats = {}
+    for sensor_id in sensors:
+        with conn.cursor() as cur:
+            cur.execute(SERIES_SQL, {'s': sensor_id, 'desde': (start - margin).to_pydatetime(),
+                                     'hasta': (end + margin).to_pydatetime()})
+            rows = cur.fetchall()
+            if not rows:
+                conn.rollback()
+                continue
+            series = pd.DataFrame.from_records(rows, columns=['medicion_id', 'sensor_id', 'timestamp'] + VARIABLES)
+            series['timestamp'] = pd.to_datetime(series['timestamp'], utc=True)
+            series[VARIABLES] = series[VARIABLES].astype(float)
+            inside = ((series['timestamp'] >= start) & (series['timestamp'] < end)).to_numpy()
+            flags = qc_frame(series, limits, rules)
+            flags = flags[inside[flags['fila'].to_numpy()]]
+            ids = series['medicion_id'].to_numpy()
+            cur.execute("DELETE FROM validacion WHERE medicion_id = ANY(%s) AND tipo_flag = ANY(%s)",
+                        (ids[inside].tolist(), list(rules)))
+            if len(flags):
+                buf = io.StringIO()
+                flags.assign(medicion_id=ids[flags['fila'].to_numpy()])[['medicion_id', 'tipo_flag', 'descripcion_problema']] \
+                    .to_csv(buf, header=False, index=False)
+                buf.seek(0)
+                cur.copy_expert("COPY validacion (medicion_id, tipo_flag, descripcion_problema) FROM STDIN WITH (FORMAT csv)", buf)
+        conn.commit()
+        stats[sensor_id] = {'filas': int(inside.sum()), 'flags': flags['tipo_flag'].value_counts().to_dict()}
+    return stats
+
+if __name__ == "__main__":
+    from src.config import DB
+    from src.db import get_conn
+    parser = argparse.ArgumentParser(prog='python -m src.qc')
+    parser.add_argument('--start', required=True, help='inicio de la ventana (ISO, UTC si no trae zona)')
+    parser.add_argument('--end', required=True, help='fin de la ventana (excluido)')
+    parser.add_argument('--sensor', action='append', help='sensor_id (repetible); default: todos')
+    parser.add_argument('--rules', default=','.join(RULES), help=f"reglas separadas por coma (default: {','.join(RULES)})")
+    args = parser.parse_args()
+    rules = tuple(r.strip().upper() for r in args.rules.split(',') if r.strip())
+    unknown = set(rules) - set(RULES)
+    if unknown:
+        parser.error(f"reglas desconocidas: {', '.join(sorted(unknown))}")
+    conn = get_conn(DB)
+    try:
+        stats = run_qc(conn, args.start, args.end, sensor_ids=args.sensor, rules=rules)
+    finally:
+        conn.close()
+    for sensor_id, s in stats.items():
+        detail = ', '.join(f"{k} {v}" for k, v in sorted(s['flags'].items())) or 'sin flags'
+        print(f"{sensor_id}: {s['filas']} filas, {detail}")
@@ -0,0 +1,310 @@
+# src/query.py
+# Lectura de medicion para dashboards y scripts:
+#   latest       última lectura de cada sensor
+#   window       serie de los sensores en [start, end) (iter_window: por páginas)
+#   nearest      lectura de un sensor más cercana a un instante
+# Todas recorren la PK (sensor_id, timestamp) de medicion. iter_window pagina
+# por keyset, sensor por sensor (timestamp > el último leído, LIMIT page_rows):
+# una ventana grande se procesa de a páginas, sin OFFSET ni un cursor del
+# servidor abierto entre una y otra. Los resultados son DataFrames armados
+# desde arrays NumPy (sensor_id, timestamp UTC y una columna float por variable).
+# QUERY_CACHE guarda los resultados (LRU con TTL, uno por proceso); src.db lo
+# invalida al confirmar cada carga, sólo en los sensores y el intervalo de
+# tiempo que tocó. Lo que carguen otros procesos (workers de parallel, otra
+# corrida de main) se ve a lo sumo QUERY_CACHE_TTL segundos tarde.
+#   python -m src.query latest [--sensor s1]
+#   python -m src.query window --start 2025-01-01 --end 2025-01-02 --sensor s1 [--out serie.csv]
+#   python -m src.query nearest s1 2025-01-01T12:00:00Z [--max-distance 10min]
+import argparse
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from src.config import QUERY
+from src.batch import VARIABLES
+from src.pool import POOL, borrowed
+
+INF = math.inf
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)      # resolución de timestamptz
+
+# instante exacto como entero (µs desde epoch): se arma con numpy, sin datetimes por fila
+TS_US = "(extract(epoch FROM m.timestamp) * 1000000)::bigint"
+
+# una lectura por sensor: un recorrido de la PK hacia atrás, LIMIT 1
+LATEST_SQL = """
+SELECT s.sensor_id, {ts}{columns}
+FROM {sensors}
+CROSS JOIN LATERAL (
+    SELECT timestamp{columns_raw} FROM medicion
+    WHERE sensor_id = s.sensor_id ORDER BY timestamp DESC LIMIT 1
+) m
+ORDER BY s.sensor_id;
+"""
+
+# una página de la ventana de un sensor, a continuación de la anterior
+PAGE_SQL = """
+SELECT {ts}{columns} FROM medicion m
+WHERE m.sensor_id = %(sensor)s AND m.timestamp > %(despues)s AND m.timestamp < %(hasta)s
+ORDER BY m.timestamp LIMIT %(filas)s;
+"""
+
+# la lectura anterior (o en el instante) y la siguiente
+NEAREST_SQL = """
+(SELECT {ts}{columns} FROM medicion m
+ WHERE m.sensor_id = %(sensor)s AND m.timestamp <= %(ts)s ORDER BY m.timestamp DESC LIMIT 1)
+UNION ALL
+(SELECT {ts}{columns} FROM medicion m
+ WHERE m.sensor_id = %(sensor)s AND m.timestamp > %(ts)s ORDER BY m.timestamp LIMIT 1);
+"""
+
+class QueryCache:
+    """
+    LRU de resultados con TTL. Cada entrada sabe qué sensores (None = todos)
+    y qué intervalo [lo, hi] (ns) cubre su resultado: invalidate() descarta
+    sólo las que comparten un sensor con un intervalo escrito que se les
+    superpone. get devuelve una copia (se puede modificar sin tocar la cache).
+    generation cambia con cada invalidate: un resultado leído antes de un
+    commit no se guarda después (put con la generation del comienzo).
+    """
+
+    def __init__(self, max_entries=None, ttl=None, max_rows=None):
+        self.max_entries = QUERY['cache_entries'] if max_entries is None else max_entries
+        self.ttl = QUERY['cache_ttl'] if ttl is None else ttl
+        self.max_rows = QUERY['cache_rows'] if max_rows is None else max_rows
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()     # key -> (vence, sensores, (lo, hi), DataFrame)
+        self.generation = 0
+        self.hits = self.misses = self.invalidated = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        frame = entry[3].copy()
+        frame.attrs['cache'] = True
+        return frame
+
+    def put(self, key, frame, sensors, lo, hi, generation):
+        if not self.max_entries or self.ttl <= 0 or len(frame) > self.max_rows:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, None if sensors is None else frozenset(sensors),
+                                  (lo, hi), frame.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, ranges):
+        """ranges: { sensor_id -> (desde, hasta) } en ns, escrito y confirmado (el formato de SensorStateCache.warm)."""
+        with self._lock:
+            self.generation += 1
+            if not self._entries or not ranges:
+                return 0
+            stale = [key for key, (_, sensors, (lo, hi), _) in self._entries.items()
+                     if any((sensors is None or s in sensors) and a <= hi and lo <= b for s, (a, b) in ranges.items())]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entradas': len(self._entries), 'aciertos': self.hits, 'fallos': self.misses,
+                    'invalidadas': self.invalidated}
+
+# compartida por todo el proceso
+QUERY_CACHE = QueryCache()
+
+# --- armado de consultas y resultados ---
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+def _sensor_key(sensor_ids):
+    # None = todos; si no, tupla ordenada sin repetidos (la misma clave de cache en cualquier orden)
+    if sensor_ids is None:
+        return None
+    if isinstance(sensor_ids, str):
+        sensor_ids = [sensor_ids]
+    return tuple(sorted({str(s) for s in sensor_ids}))
+
+def _variables(variables):
+    if variables is None:
+        return tuple(VARIABLES)
+    variables = [variables] if isinstance(variables, str) else list(variables)
+    unknown = [v for v in variables if v not in VARIABLES]
+    if unknown:
+        raise ValueError(f"Variables desconocidas: {', '.join(unknown)} (opciones: {', '.join(VARIABLES)})")
+    return tuple(variables)
+
+def _sql(template, variables, **kwargs):
+    return template.format(ts=TS_US, columns=''.join(f', m.{v}' for v in variables),
+                           columns_raw=''.join(f', {v}' for v in variables), **kwargs)
+
+def _frame(sensor_ids, rows, variables):
+    """filas (ts_us, variables...) -> DataFrame sensor_id, timestamp y variables (NULL = NaN)."""
+    data = list(zip(*rows)) if rows else [()] * (1 + len(variables))
+    out = {'sensor_id': np.array(sensor_ids, dtype=object),
+           'timestamp': pd.to_datetime(np.array(data[0], dtype=np.int64), unit='us', utc=True)}
+    for var, values in zip(variables, data[1:]):
+        out[var] = np.array(values, dtype=float)
+    return pd.DataFrame(out)
+
+# --- consultas ---
+
+def latest(sensor_ids=None, variables=None, conn=None, cache=True):
+    """
+    Última lectura de cada sensor (None = todos los de la tabla sensor): una
+    fila por sensor con datos, ordenadas por sensor_id. Es la última fila de
+    medicion del sensor aunque tenga variables en NULL.
+    conn: conexión a usar, sin tocar su transacción (default: una de POOL).
+    cache=False no lee ni guarda.
+    """
+    sensors, variables = _sensor_key(sensor_ids), _variables(variables)
+    key = ('latest', sensors, variables)
+    hit = QUERY_CACHE.get(key) if cache else None
+    if hit is not None:
+        return hit
+    generation = QUERY_CACHE.generation
+    source = 'sensor s' if sensors is None else 'unnest(%(sensores)s::text[]) AS s(sensor_id)'
+    with borrowed(conn) as c, c.cursor() as cur:
+        cur.execute(_sql(LATEST_SQL, variables, sensors=source), {'sensores': list(sensors or ())})
+        rows = cur.fetchall()
+    df = _frame([r[0] for r in rows], [r[1:] for r in rows], variables)
+    if cache:
+        # cambia con una lectura posterior a la última de algún sensor (con uno sin datos, con cualquiera)
+        complete = sensors is not None and len(rows) == len(sensors)
+        lo = min(r[1] for r in rows) * 1000 if complete and rows else -INF
+        QUERY_CACHE.put(key, df, sensors, lo, INF, generation)
+    return df
+
+def _sensor_list(cur, sensors):
+    if sensors is not None:
+        return list(sensors)
+    cur.execute("SELECT sensor_id FROM sensor ORDER BY sensor_id")
+    return [r[0] for r in cur.fetchall()]
+
+def iter_window(sensor_ids, start, end, variables=None, page_rows=None, conn=None):
+    """
+    La ventana [start, end) en páginas: DataFrames de a lo sumo page_rows
+    filas (default QUERY_PAGE_ROWS), sensor por sensor (en orden de
+    sensor_id) y en orden de timestamp. Cada página es una consulta keyset
+    sobre la PK; entre páginas no queda nada abierto en el servidor salvo la
+    transacción. No pasa por la cache.
+    """
+    sensors, variables = _sensor_key(sensor_ids), _variables(variables)
+    page_rows = page_rows or QUERY['page_rows']
+    start, end = _utc(start), _utc(end)
+    sql = _sql(PAGE_SQL, variables)
+    with borrowed(conn) as c, c.cursor() as cur:
+        for sensor in _sensor_list(cur, sensors):
+            params = {'sensor': sensor, 'despues': start.to_pydatetime() - MICROSECOND,
+                      'hasta': end.to_pydatetime(), 'filas': page_rows}
+            while True:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                yield _frame([sensor] * len(rows), rows, variables)
+                if len(rows) < page_rows:
+                    break
+                params['despues'] = EPOCH + timedelta(microseconds=rows[-1][0])
+
+def window(sensor_ids, start, end, variables=None, conn=None, cache=True):
+    """
+    La ventana [start, end) entera en un DataFrame (ordenado por sensor y
+    tiempo). Las de más de QUERY_CACHE_ROWS filas no se guardan en la cache;
+    para recorrer una ventana grande sin juntarla en memoria, iter_window.
+    """
+    sensors, variables = _sensor_key(sensor_ids), _variables(variables)
+    start, end = _utc(start), _utc(end)
+    key = ('window', sensors, start.value, end.value, variables)
+    hit = QUERY_CACHE.get(key) if cache else None
+    if hit is not None:
+        return hit
+    generation = QUERY_CACHE.generation
+    pages = list(iter_window(sensors, start, end, variables, conn=conn))
+    df = pd.concat(pages, ignore_index=True) if pages else _frame([], [], variables)
+    if cache:
+        QUERY_CACHE.put(key, df, sensors, start.value, end.value - 1, generation)
+    return df
+
+def nearest(sensor_id, ts, variables=None, max_distance=None, conn=None, cache=True):
+    """
+    Lectura de sensor_id más cercana a ts (a igual distancia, la anterior):
+    DataFrame de una fila, vacío si el sensor no tiene datos o si la más
+    cercana está a más de max_distance (Timedelta o texto, p.ej. '10min').
+    """
+    sensor_id, variables, ts = str(sensor_id), _variables(variables), _utc(ts)
+    key = ('nearest', sensor_id, ts.value, variables)
+    df = QUERY_CACHE.get(key) if cache else None
+    if df is None:
+        generation = QUERY_CACHE.generation
+        with borrowed(conn) as c, c.cursor() as cur:
+            cur.execute(_sql(NEAREST_SQL, variables), {'sensor': sensor_id, 'ts': ts.to_pydatetime()})
+            rows = cur.fetchall()
+        target = ts.value // 1000
+        rows = sorted(rows, key=lambda r: (abs(r[0] - target), r[0]))[:1]
+        df = _frame([sensor_id] * len(rows), rows, variables)
+        if cache:
+            # sólo una lectura nueva más cerca que la encontrada cambia el resultado
+            d = abs(rows[0][0] - target) * 1000 if rows else INF
+            QUERY_CACHE.put(key, df, (sensor_id,), ts.value - d, ts.value + d, generation)
+    if max_distance is not None and len(df) and abs(df['timestamp'].iat[0] - ts) > pd.Timedelta(max_distance):
+        return df.iloc[:0]
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='python -m src.query')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('latest', help='última lectura por sensor')
+    p.add_argument('--sensor', action='append', dest='sensors', help='sensor (repetible; default todos)')
+    p = sub.add_parser('window', help='serie en [start, end)')
+    p.add_argument('--start', required=True, help='inicio (incluido)')
+    p.add_argument('--end', required=True, help='fin (excluido)')
+    p.add_argument('--sensor', action='append', dest='sensors', help='sensor (repetible; default todos)')
+    p.add_argument('--out', help='CSV de salida (se escribe página por página)')
+    p = sub.add_parser('nearest', help='lectura más cercana a un instante')
+    p.add_argument('sensor')
+    p.add_argument('ts')
+    p.add_argument('--max-distance', help='p.ej. 10min')
+    for p in sub.choices.values():
+        p.add_argument('--var', action='append', dest='variables', choices=VARIABLES, help='variable (repetible)')
+    args = parser.parse_args()
+    try:
+        if args.cmd == 'latest':
+            print(latest(args.sensors, args.variables).to_string(index=False))
+        elif args.cmd == 'nearest':
+            print(nearest(args.sensor, args.ts, args.variables, max_distance=args.max_distance).to_string(index=False))
+        elif args.out:
+            rows = 0
+            for i, page in enumerate(iter_window(args.sensors, args.start, args.end, args.variables)):
+                page.to_csv(args.out, mode='a' if i else 'w', header=not i, index=False)
+                rows += len(page)
+            print(f"{args.out}: {rows} filas")
+        else:
+            print(window(args.sensors, args.start, args.end, args.variables).to_string(index=False))
+    finally:
+        POOL.closeall()
@@ -0,0 +1,204 @@
+# src/raw_payload.py
+# Qué se guarda de la fila original de cada medición (INGEST_RAW_PAYLOAD / --raw-payload):
+#   full       la fila completa como JSONB en medicion.raw_payload (como antes)
+#   none       nada
+#   unmapped   sólo las columnas que no quedan en columnas tipadas (sensor,
+#              tiempo y variables se descartan; lat, lon, batería... se guardan)
+#   reference  el CSV se guarda una vez, en bloques comprimidos (archivo_crudo y
+#              archivo_crudo_bloque), y cada medición lleva sólo
+#              (raw_archivo_id, raw_fila); read_raw_row la recupera
+# reference requiere migraciones/004_raw_payload.sql.
+import gzip
+import io
+import pandas as pd
+from src.dictionary import RESOLVER
+from src.ingest import csv_records
+from src.timestamps import TIMESTAMP_COLUMNS
+from src.pool import borrowed
+
+MODES = ['full', 'none', 'unmapped', 'reference']
+REF_COLUMNS = ['raw_archivo_id', 'raw_fila']
+SENSOR_COLUMNS = ['sensor_id', 'sensor']
+GZIP_LEVEL = 6
+BLOCK_BYTES = 4 << 20     # bytes del CSV por bloque comprimido de archivo_crudo_bloque
+
+def mapped_columns(columns):
+    """Columnas cuyo valor ya queda en medicion: sensor, tiempo y las que resuelven a una variable."""
+    typed = {col for col, _, _ in RESOLVER.plan(columns)}
+    return {c for c in columns if c in SENSOR_COLUMNS or c in TIMESTAMP_COLUMNS or c in typed}
+
+class RawPayload:
+    """
+    Política de raw_payload de un archivo.
+    archivo_id: fila de archivo_crudo del archivo (sólo en modo reference, ver store_file).
+    """
+
+    def __init__(self, mode='full', archivo_id=None):
+        if mode not in MODES:
+            raise ValueError(f"raw_payload desconocido: {mode} (opciones: {', '.join(MODES)})")
+        if mode == 'reference' and archivo_id is None:
+            raise ValueError("raw_payload 'reference' necesita el archivo_id de store_file")
+        self.mode = mode
+        self.archivo_id = archivo_id
+        self._kept = {}      # encabezado -> columnas que se guardan
+
+    def kept_columns(self, columns):
+        key = tuple(columns)
+        if key not in self._kept:
+            if self.mode == 'full':
+                kept = list(key)
+            elif self.mode == 'unmapped':
+                mapped = mapped_columns(key)
+                kept = [c for c in key if c not in mapped]
+            else:
+                kept = []
+            self._kept[key] = kept
+        return self._kept[key]
+
+    def payloads(self, raw):
+        """Carga masiva: JSON por fila de raw (DataFrame crudo), o None si no se guarda nada."""
+        if raw is None:
+            return '{}' if self.mode == 'full' else None
+        kept = self.kept_columns(raw.columns)
+        if not kept:
+            return None
+        return raw[kept].to_json(orient='records', lines=True, date_format='iso').splitlines()
+
+    def payload(self, row):
+        """Fila a fila: dict con las columnas que se guardan, o None."""
+        if row is None:
+            return {} if self.mode == 'full' else None
+        kept = self.kept_columns(row.keys())
+        return {k: row[k] for k in kept} if kept else None
+
+    def refs(self, rows):
+        """(raw_archivo_id, raw_fila) por fila del archivo, o (None, None) fuera de reference."""
+        if self.mode != 'reference':
+            return None, None
+        return self.archivo_id, rows
+
+FULL = RawPayload('full')
+
+class RawRefs:
+    """
+    Si medicion tiene las columnas raw_archivo_id / raw_fila (migración 004).
+    Sin ellas sólo se puede usar full, none o unmapped.
+    """
+
+    def __init__(self):
+        self._enabled = None
+
+    def clear(self):
+        self._enabled = None
+
+    def enabled(self, cur):
+        if self._enabled is None:
+            cur.execute("SELECT count(*) = %s FROM pg_attribute WHERE attrelid = to_regclass('medicion') "
+                        "AND attname = ANY(%s) AND NOT attisdropped", (len(REF_COLUMNS), REF_COLUMNS))
+            self._enabled = cur.fetchone()[0]
+        return self._enabled
+
+    def columns(self, cur):
+        return REF_COLUMNS if self.enabled(cur) else []
+
+# compartido por todo el proceso
+RAW_REFS = RawRefs()
+
+# bloques de archivo_crudo_bloque que tienen alguna de las filas pedidas
+BLOCKS_SQL = """
+SELECT b.fila_desde, b.fila_hasta, b.contenido FROM archivo_crudo_bloque b
+WHERE b.archivo_id = %(archivo)s AND EXISTS (
+    SELECT 1 FROM unnest(%(filas)s::bigint[]) AS f(fila) WHERE f.fila >= b.fila_desde AND f.fila < b.fila_hasta)
+ORDER BY b.fila_desde;
+"""
+
+def csv_blocks(f, block_bytes=BLOCK_BYTES):
+    """
+    Parte el CSV f (abierto en binario) en bloques de ~block_bytes que
+    terminan en fin de registro, leyendo de a una línea. Retorna
+    (encabezado, generador de (fila_desde, fila_hasta, bytes)); las filas se
+    numeran como las de datos de iter_csv.
+    """
+    records = csv_records(f)
+    header = b''
+    for record, is_row in records:
+        header += record
+        if is_row:
+            break
+
+    def blocks():
+        start = n = size = 0
+        parts = []
+        for record, is_row in records:
+            parts.append(record)
+            size += len(record)
+            n += is_row
+            if size >= block_bytes and n > start:
+                yield start, n, b''.join(parts)
+                start, size, parts = n, 0, []
+        if n > start:
+            yield start, n, b''.join(parts)
+
+    return header, blocks()
+
+def store_file(conn, path, digest, encoding, block_bytes=BLOCK_BYTES):
+    """
+    Guarda el CSV en archivo_crudo (una vez por contenido) y retorna su
+    archivo_id. Se lee de a bloques de ~block_bytes cortados en fin de fila,
+    cada uno comprimido por separado en archivo_crudo_bloque con su rango de
+    filas: la memoria no depende del tamaño del archivo y read_raw_rows
+    descomprime sólo los bloques que necesita. Se llama antes de cargar el
+    archivo en modo reference.
+    """
+    with conn.cursor() as cur:
+        if not RAW_REFS.enabled(cur):
+            raise RuntimeError("raw_payload 'reference' requiere migraciones/004_raw_payload.sql")
+        cur.execute("SELECT archivo_id FROM archivo_crudo WHERE hash_contenido = %s", (digest,))
+        row = cur.fetchone()
+        if row is None:
+            with open(path, 'rb') as f:
+                header, blocks = csv_blocks(f, block_bytes)
+                cur.execute(
+                    "INSERT INTO archivo_crudo (hash_contenido, archivo, encoding, encabezado) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT (hash_contenido) DO NOTHING RETURNING archivo_id",
+                    (digest, str(path), encoding, header)
+                )
+                row = cur.fetchone()
+                if row is None:
+                    # otro proceso lo guardó mientras tanto
+                    cur.execute("SELECT archivo_id FROM archivo_crudo WHERE hash_contenido = %s", (digest,))
+                    row = cur.fetchone()
+                else:
+                    for desde, hasta, data in blocks:
+                        cur.execute("INSERT INTO archivo_crudo_bloque (archivo_id, fila_desde, fila_hasta, contenido) "
+                                    "VALUES (%s, %s, %s, %s)", (row[0], desde, hasta, gzip.compress(data, compresslevel=GZIP_LEVEL)))
+    conn.commit()
+    return row[0]
+
+def read_raw_rows(conn, archivo_id, rows):
+    """
+    Filas originales (dicts, por número de fila de datos) de un archivo
+    guardado en modo reference; sólo se leen y descomprimen los bloques que
+    las contienen. conn: conexión a usar, sin tocar su transacción (None =
+    una de POOL).
+    """
+    wanted = sorted({int(r) for r in rows})
+    out = {}
+    with borrowed(conn) as c, c.cursor() as cur:
+        cur.execute("SELECT encoding, encabezado FROM archivo_crudo WHERE archivo_id = %s", (archivo_id,))
+        found = cur.fetchone()
+        if found is None:
+            return out
+        encoding, header = found
+        cur.execute(BLOCKS_SQL, {'archivo': archivo_id, 'filas': wanted})
+        for desde, hasta, data in cur:
+            df = pd.read_csv(io.BytesIO(bytes(header) + gzip.decompress(bytes(data))),
+                             encoding=encoding, encoding_errors='replace')
+            records = df.to_dict('records')
+            for fila in wanted:
+                if desde <= fila < hasta:
+                    out[fila] = records[fila - desde]
+    return out
+
+def read_raw_row(conn, archivo_id, fila):
+    return read_raw_rows(conn, archivo_id, [fila]).get(fila)
@@ -0,0 +1,149 @@
+# src/rollups.py
+# Agregados por sensor y hora (medicion_hora) y por sensor y día (medicion_dia),
+# mantenidos por la carga: cada lote recalcula sólo los buckets que tocó.
+# get_series elige entre medicion y los agregados según la resolución pedida.
+import numpy as np
+import pandas as pd
+from src.pool import borrowed
+
+# las mismas columnas que src.db.VARIABLES (db importa este módulo)
+VARIABLES = ['temperatura', 'humedad', 'presion', 'radiacion_solar', 'velocidad_viento']
+AGGREGATES = ('n', 'sum', 'min', 'max')      # por variable: cantidad, suma, mínimo, máximo
+COLUMNS = [f'{var}_{agg}' for var in VARIABLES for agg in AGGREGATES]
+ORIGIN = '1970-01-01 00:00:00+00'            # origen de date_bin (buckets UTC)
+
+def _raw_aggregates(alias):
+    return ', '.join(f'count({alias}.{v}), sum({alias}.{v}), min({alias}.{v}), max({alias}.{v})' for v in VARIABLES)
+
+def _rollup_aggregates(alias):
+    return ', '.join(f'sum({alias}.{v}_n), sum({alias}.{v}_sum), min({alias}.{v}_min), max({alias}.{v}_max)' for v in VARIABLES)
+
+_UPDATE = ', '.join(f'{c} = EXCLUDED.{c}' for c in ['n'] + COLUMNS)
+
+# Recalcula desde medicion las horas tocadas y, desde medicion_hora, sus días.
+# LATERAL: un recorrido de la PK (sensor_id, timestamp) por bucket, en vez de
+# que el planificador junte los buckets contra toda la tabla.
+# Dos sentencias en un solo viaje; corre en la transacción del lote.
+REFRESH_SQL = f"""
+INSERT INTO medicion_hora (sensor_id, bucket, n, {', '.join(COLUMNS)})
+SELECT t.sensor_id, t.bucket, a.*
+FROM unnest(%(sensores)s::text[], %(horas)s::timestamptz[]) AS t(sensor_id, bucket)
+CROSS JOIN LATERAL (
+    SELECT count(*), {_raw_aggregates('m')} FROM medicion m
+    WHERE m.sensor_id = t.sensor_id AND m.timestamp >= t.bucket AND m.timestamp < t.bucket + interval '1 hour'
+) a
+ON CONFLICT (sensor_id, bucket) DO UPDATE SET {_UPDATE};
+INSERT INTO medicion_dia (sensor_id, bucket, n, {', '.join(COLUMNS)})
+SELECT d.sensor_id, d.bucket, a.*
+FROM (SELECT DISTINCT sensor_id, date_bin('1 day', bucket, '{ORIGIN}') AS bucket
+      FROM unnest(%(sensores)s::text[], %(horas)s::timestamptz[]) AS t(sensor_id, bucket)) d
+CROSS JOIN LATERAL (
+    SELECT sum(h.n), {_rollup_aggregates('h')} FROM medicion_hora h
+    WHERE h.sensor_id = d.sensor_id AND h.bucket >= d.bucket AND h.bucket < d.bucket + interval '24 hours'
+) a
+ON CONFLICT (sensor_id, bucket) DO UPDATE SET {_UPDATE};
+"""
+
+SOURCES = {'hour': ('medicion_hora', pd.Timedelta(hours=1)), 'day': ('medicion_dia', pd.Timedelta(days=1))}
+RESOLUTIONS = {'raw': None, 'hour': '1h', 'day': '1D'}
+
+def touched_hours(sensor_ids, timestamps):
+    """Pares (sensor, hora UTC) distintos de un lote, como dos listas para REFRESH_SQL."""
+    hours = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).floor('h')
+    pairs = pd.DataFrame({'s': np.asarray(sensor_ids, dtype=object), 'h': hours}).drop_duplicates()
+    return pairs['s'].tolist(), [h.to_pydatetime() for h in pairs['h']]
+
+class Rollups:
+    """
+    Refresco incremental de medicion_hora / medicion_dia. Si las tablas no
+    existen (base sin migraciones/002_rollups.sql) no hace nada.
+    """
+
+    def __init__(self):
+        self._enabled = None
+
+    def clear(self):
+        self._enabled = None
+
+    def enabled(self, cur):
+        if self._enabled is None:
+            cur.execute("SELECT to_regclass('medicion_hora') IS NOT NULL AND to_regclass('medicion_dia') IS NOT NULL")
+            self._enabled = cur.fetchone()[0]
+        return self._enabled
+
+    def refresh(self, cur, sensor_ids, timestamps):
+        """Recalcula los buckets (sensor, hora) y (sensor, día) de las filas dadas."""
+        if not len(sensor_ids) or not self.enabled(cur):
+            return 0
+        sensores, horas = touched_hours(sensor_ids, timestamps)
+        cur.execute(REFRESH_SQL, {'sensores': sensores, 'horas': horas})
+        return len(horas)
+
+# compartido por todo el proceso
+ROLLUPS = Rollups()
+
+def _source_for(step):
+    # el agregado más grueso cuyo bucket divide exactamente al paso pedido
+    for name in ('day', 'hour'):
+        table, size = SOURCES[name]
+        if step >= size and step % size == pd.Timedelta(0):
+            return table
+    return 'medicion'
+
+def get_series(conn, sensor_ids, start, end, resolution='raw'):
+    """
+    Serie de los sensores en [start, end).
+    conn: conexión a usar, sin tocar su transacción (None = una de POOL).
+    resolution: 'raw' (filas de medicion), 'hour', 'day' o un paso de pandas
+      ('15min', '6h', '7D', ...). Con paso múltiplo de un día se lee medicion_dia,
+      múltiplo de una hora medicion_hora, y si no se agrega medicion al vuelo.
+    Raw: columnas sensor_id, timestamp y una por variable.
+    Agregado: sensor_id, timestamp (inicio del bucket, UTC), n y por variable
+      la media ({var}), {var}_min, {var}_max y {var}_n.
+    Los buckets se eligen por su inicio; con start alineado al paso, leer un
+    agregado da lo mismo que agregar medicion. df.attrs['fuente'] dice qué tabla se usó.
+    """
+    sensor_ids = list(sensor_ids) if sensor_ids is not None else None
+    params = {'sensores': sensor_ids, 'desde': start, 'hasta': end}
+    where_sensor = "(%(sensores)s::text[] IS NULL OR sensor_id = ANY(%(sensores)s::text[]))"
+    resolution = RESOLUTIONS.get(resolution, resolution)
+    if resolution is None:
+        query = (f"SELECT sensor_id, timestamp, {', '.join(VARIABLES)} FROM medicion "
+                 f"WHERE {where_sensor} AND timestamp >= %(desde)s AND timestamp < %(hasta)s "
+                 "ORDER BY sensor_id, timestamp")
+        source = 'medicion'
+        columns = ['sensor_id', 'timestamp'] + VARIABLES
+    else:
+        step = pd.Timedelta(resolution)
+        source = _source_for(step)
+        params['paso'] = step.to_pytimedelta()
+        if source == 'medicion':
+            time_col, n, aggs = 'timestamp', 'count(*)', _raw_aggregates('m')
+        else:
+            time_col, n, aggs = 'bucket', 'sum(m.n)', _rollup_aggregates('m')
+        query = (f"SELECT sensor_id, date_bin(%(paso)s, {time_col}, '{ORIGIN}') AS t, {n}, {aggs} "
+                 f"FROM {source} m WHERE {where_sensor} AND {time_col} >= %(desde)s AND {time_col} < %(hasta)s "
+                 "GROUP BY 1, 2 ORDER BY 1, 2")
+        columns = ['sensor_id', 'timestamp', 'n'] + COLUMNS
+    with borrowed(conn) as c, c.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    # armado columnar con numpy: con pocos buckets el costo de pandas domina
+    data = dict(zip(columns, zip(*rows))) if rows else {c: () for c in columns}
+    out = {'sensor_id': np.array(data['sensor_id'], dtype=object),
+           'timestamp': pd.to_datetime(list(data['timestamp']), utc=True)}
+    if resolution is None:
+        for var in VARIABLES:
+            out[var] = np.array(data[var], dtype=float)
+    else:
+        out['n'] = np.array(data['n'], dtype=np.int64)
+        for var in VARIABLES:
+            n_var = np.array(data[f'{var}_n'], dtype=np.int64)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[var] = np.where(n_var > 0, np.array(data[f'{var}_sum'], dtype=float) / n_var, np.nan)
+            out[f'{var}_min'] = np.array(data[f'{var}_min'], dtype=float)
+            out[f'{var}_max'] = np.array(data[f'{var}_max'], dtype=float)
+            out[f'{var}_n'] = n_var
+    df = pd.DataFrame(out)
+    df.attrs['fuente'] = source
+    return df
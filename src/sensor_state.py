@@ -0,0 +1,165 @@
+# src/sensor_state.py
+# Cache en memoria de las lecturas recientes de cada sensor, para el chequeo
+# CONSISTENCY sin consultar medicion en cada inserción.
+from bisect import bisect_left
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+MAX_SENSORS = 10000    # sensores en cache (LRU)
+MAX_HISTORY = 256      # lecturas retenidas por sensor
+
+INF = float('inf')
+
+# Para cada sensor: la lectura anterior a 'desde', todas las de [desde, hasta]
+# y una marca si existe alguna posterior a 'hasta'. Una sola consulta por lote.
+WARM_SQL = """
+SELECT s.sensor_id, m.tipo, m.timestamp, m.temperatura, m.humedad, m.presion
+FROM unnest(%s::text[], %s::timestamptz[], %s::timestamptz[]) AS s(sensor_id, desde, hasta)
+CROSS JOIN LATERAL (
+    (SELECT 'prev' AS tipo, timestamp, temperatura, humedad, presion FROM medicion
+      WHERE sensor_id = s.sensor_id AND timestamp < s.desde ORDER BY timestamp DESC LIMIT 1)
+    UNION ALL
+    (SELECT 'win', timestamp, temperatura, humedad, presion FROM medicion
+      WHERE sensor_id = s.sensor_id AND timestamp >= s.desde AND timestamp <= s.hasta)
+    UNION ALL
+    (SELECT 'next', timestamp, NULL, NULL, NULL FROM medicion
+      WHERE sensor_id = s.sensor_id AND timestamp > s.hasta ORDER BY timestamp LIMIT 1)
+) m;
+"""
+
+def to_ns(ts):
+    return pd.Timestamp(ts).value
+
+class _History:
+    """
+    Lecturas de un sensor ordenadas por timestamp (ns). La cache es completa
+    en [floor, ceil]: cualquier lectura de la base en ese intervalo está aquí.
+    floor None = no hay lecturas anteriores; ceil INF = no hay posteriores.
+    """
+    __slots__ = ('ts', 'values', 'floor', 'ceil')
+
+    def __init__(self, floor, ceil):
+        self.ts = []
+        self.values = []   # (temperatura, humedad, presion)
+        self.floor = floor
+        self.ceil = ceil
+
+    def covers(self, start, end):
+        return (self.floor is None or start > self.floor) and end <= self.ceil
+
+    def put(self, ts, values):
+        i = bisect_left(self.ts, ts)
+        if i < len(self.ts) and self.ts[i] == ts:
+            self.values[i] = values
+        else:
+            self.ts.insert(i, ts)
+            self.values.insert(i, values)
+
+    def trim(self, max_history):
+        extra = len(self.ts) - max_history
+        if extra > 0:
+            del self.ts[:extra]
+            del self.values[:extra]
+            self.floor = self.ts[0]
+
+class SensorStateCache:
+    """
+    Lecturas recientes por sensor con tamaño acotado y desalojo LRU.
+    warm() carga con una consulta todos los sensores de un lote que no estén
+    cubiertos; record() la mantiene al día a medida que se escriben filas.
+    Supone que este proceso es el único que escribe esos sensores mientras
+    están en cache (main reparte los sensores entre workers).
+    """
+
+    def __init__(self, max_sensors=MAX_SENSORS, max_history=MAX_HISTORY):
+        self.max_sensors = max_sensors
+        self.max_history = max_history
+        self._sensors = OrderedDict()
+
+    def __len__(self):
+        return len(self._sensors)
+
+    def __contains__(self, sensor_id):
+        return sensor_id in self._sensors
+
+    def clear(self):
+        self._sensors.clear()
+
+    def discard(self, sensor_id):
+        self._sensors.pop(sensor_id, None)
+
+    def covers(self, sensor_id, start, end):
+        h = self._sensors.get(sensor_id)
+        return h is not None and h.covers(start, end)
+
+    def warm(self, cur, ranges):
+        """
+        ranges: { sensor_id -> (ts_min_ns, ts_max_ns) } de un lote.
+        Una sola consulta para los sensores que la cache no cubre; de cada uno
+        quedan las max_history lecturas más nuevas (floor avanza como en record).
+        """
+        missing = [s for s, (start, end) in ranges.items() if not self.covers(s, start, end)]
+        if missing:
+            starts = [pd.Timestamp(ranges[s][0], tz='UTC').to_pydatetime() for s in missing]
+            ends = [pd.Timestamp(ranges[s][1], tz='UTC').to_pydatetime() for s in missing]
+            cur.execute(WARM_SQL, (missing, starts, ends))
+            loaded = {s: _History(None, INF) for s in missing}
+            for sensor_id, tipo, ts, temp, hum, pres in cur.fetchall():
+                h = loaded[sensor_id]
+                if tipo == 'next':
+                    h.ceil = ranges[sensor_id][1]
+                    continue
+                if tipo == 'prev':
+                    h.floor = to_ns(ts)
+                h.put(to_ns(ts), (temp, hum, pres))
+            for h in loaded.values():
+                h.trim(self.max_history)      # un lote grande no llena la cache: las más nuevas
+            self._sensors.update(loaded)
+        for s in ranges:
+            self._sensors.move_to_end(s)
+        self._evict(keep=ranges)
+
+    def _evict(self, keep=()):
+        while len(self._sensors) > self.max_sensors:
+            oldest = next(iter(self._sensors))
+            if oldest in keep:
+                break
+            self._sensors.popitem(last=False)
+
+    def previous(self, sensor_id, ts):
+        """Lectura más cercana estrictamente anterior a ts: (temp, hum, pres, ts_ns) o None."""
+        h = self._sensors[sensor_id]
+        i = bisect_left(h.ts, ts)
+        if i == 0:
+            return None
+        return h.values[i - 1] + (h.ts[i - 1],)
+
+    def history(self, sensor_id):
+        """(ts, temperatura, humedad, presion) como arrays; None -> NaN"""
+        h = self._sensors[sensor_id]
+        values = np.array(h.values, dtype=float).reshape(-1, 3)
+        return np.array(h.ts, dtype=np.int64), values[:, 0], values[:, 1], values[:, 2]
+
+    def record(self, sensor_id, ts, temperatura, humedad, presion):
+        """Registra una lectura ya escrita (commit hecho)."""
+        h = self._sensors.get(sensor_id)
+        if h is None:
+            return
+        h.put(ts, (temperatura, humedad, presion))
+        h.trim(self.max_history)
+        self._sensors.move_to_end(sensor_id)
+
+    def record_many(self, sensor_id, ts, temperatura, humedad, presion):
+        """Igual que record para arrays ordenados por ts; sólo importan las max_history más nuevas."""
+        h = self._sensors.get(sensor_id)
+        if h is None:
+            return
+        keep = slice(-self.max_history, None)
+        for row in zip(ts[keep].tolist(), temperatura[keep].tolist(), humedad[keep].tolist(), presion[keep].tolist()):
+            h.put(row[0], tuple(None if v != v else v for v in row[1:]))
+        h.trim(self.max_history)
+        self._sensors.move_to_end(sensor_id)
+
+# cache compartida por todo el proceso
+SENSOR_STATE = SensorStateCache()
@@ -0,0 +1,226 @@
+# src/timestamps.py
+# Columna de tiempo y formato inferidos una vez por archivo (de una muestra) y
+# aplicados a cada chunk con un parser fijo: ISO-8601, epoch s/ms/us/ns o un
+# strftime explícito. Lo que no se puede leer queda NaT y se informa por fila.
+import logging
+import math
+import re
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_COLUMNS = ['time', 'timestamp', 'ts', 'datetime', 'date']
+SAMPLE_ROWS = 1000       # filas no vacías usadas para inferir el formato de una columna
+MAX_REPORTED = 100       # filas sin timestamp detalladas (log y estadísticas) por archivo
+# enteros que son fechas compactas y no epoch (20250101, 202501011230, 20250101123000)
+COMPACT_FORMATS = {8: '%Y%m%d', 12: '%Y%m%d%H%M', 14: '%Y%m%d%H%M%S'}
+
+# sufijo de zona ISO explícito: '-05:00' o '-0500' (largo del sufijo -> patrón)
+OFFSET_SUFFIX = {6: re.compile(r'[+-]\d\d:\d\d$'), 5: re.compile(r'[+-]\d{4}$')}
+
+# epoch: unidad según el orden de magnitud (1.7e9 s, 1.7e12 ms, 1.7e15 us, 1.7e18 ns)
+EPOCH_UNITS = [(1e11, 's'), (1e14, 'ms'), (1e17, 'us'), (float('inf'), 'ns')]
+
+# celdas de texto que parse_value lee como número sin pasar por pandas
+INTEGER_TEXT = re.compile(r'-?\d+')
+DECIMAL_TEXT = re.compile(r'-?\d+\.\d+')
+# ISO que datetime.fromisoformat lee igual que pandas (hasta µs; Z o ±HH:MM / ±HHMM)
+ISO_TEXT = re.compile(r'\d{4}-\d\d-\d\d([T ]\d\d:\d\d(:\d\d(\.\d{1,6})?)?)?(Z|[+-]\d\d:?\d\d)?')
+
+def epoch_unit(values):
+    magnitude = np.nanmedian(np.abs(values))
+    return next(unit for limit, unit in EPOCH_UNITS if magnitude < limit)
+
+def _match(parsed):
+    return parsed.notna().mean() if len(parsed) else 0.0
+
+def _as_text(values):
+    # enteros leídos como float por culpa de NaN: '20250101.0' -> '20250101'
+    if pd.api.types.is_float_dtype(values) and np.all(np.mod(values.to_numpy(), 1) == 0):
+        return values.astype('int64').astype(str)
+    return values.astype(str)
+
+def infer_format(sample):
+    """
+    (tipo, formato) para una muestra no vacía de una columna:
+    ('epoch', unidad), ('iso', largo del sufijo de zona o None), ('format', strftime) o ('mixed', None).
+    Más de la mitad numérica: epoch (o fecha compacta tipo 20250101).
+    Entre ISO y los formatos adivinados gana el que lee más filas de la muestra.
+    """
+    numeric = pd.to_numeric(sample, errors='coerce')
+    if numeric.notna().mean() > 0.5:
+        # columna numérica (algunas celdas ilegibles no la cambian)
+        digits = _as_text(numeric.dropna())
+        fmt = COMPACT_FORMATS.get(int(digits.str.len().median()))
+        if fmt and _match(pd.to_datetime(digits, format=fmt, utc=True, errors='coerce')) == 1.0:
+            return 'format', fmt
+        return 'epoch', epoch_unit(numeric.to_numpy(dtype=float))
+    text = _as_text(sample)
+    best, best_match = ('mixed', None), 0.0
+    with warnings.catch_warnings():
+        # guess_datetime_format avisa cuando el formato adivinado contradice dayfirst
+        warnings.simplefilter('ignore', UserWarning)
+        guesses = [guess_datetime_format(text.iat[0], dayfirst=d) for d in (False, True)]
+    # iso primero: ante un empate gana; entre dd/mm y mm/dd gana el que lea más filas
+    for kind, fmt in [('iso', _offset_length(text))] + [('format', g) for g in guesses if g]:
+        match = _match(parse_column(text, kind, fmt, retry=False))
+        if match > best_match:
+            best, best_match = (kind, fmt), match
+    return best
+
+def _offset_length(text):
+    # todos con el mismo tipo de sufijo de zona -> se parsea sin zona y se corrige (mucho más rápido)
+    for length, pattern in OFFSET_SUFFIX.items():
+        if text.map(lambda v: bool(pattern.search(v))).all():
+            return length
+    return None
+
+def _parse_iso_offset(text, length):
+    """ISO con sufijo ±HH:MM / ±HHMM de largo fijo: fecha local sin zona menos el offset."""
+    local = pd.to_datetime(text.str[:-length], format='ISO8601', errors='coerce')
+    codes, suffixes = pd.factorize(text.str[-length:])
+    minutes = np.full(len(suffixes) + 1, np.nan)
+    for i, suffix in enumerate(suffixes):
+        if OFFSET_SUFFIX[length].fullmatch(suffix):
+            sign = -1 if suffix[0] == '-' else 1
+            minutes[i] = sign * (int(suffix[1:3]) * 60 + int(suffix[-2:]))
+    offset = pd.to_timedelta(minutes[codes], unit='min')   # códigos -1 (NaN) -> NaT
+    return (local - offset.to_numpy()).dt.tz_localize('UTC')
+
+def parse_column(values, kind, fmt, retry=True):
+    """Parsea una columna con el formato inferido; NaT donde no calza."""
+    if kind == 'epoch':
+        return pd.to_datetime(pd.to_numeric(values, errors='coerce'), unit=fmt, utc=True, errors='coerce')
+    text = _as_text(values)
+    if kind == 'iso' and fmt:
+        parsed = _parse_iso_offset(text, fmt)
+    elif kind == 'iso':
+        parsed = pd.to_datetime(text, format='ISO8601', utc=True, errors='coerce')
+    elif kind == 'format':
+        parsed = pd.to_datetime(text, format=fmt, utc=True, errors='coerce')
+    else:
+        return pd.to_datetime(text, format='mixed', utc=True, errors='coerce')
+    # las pocas filas con otro formato que el inferido se leen una a una
+    failed = parsed.isna().to_numpy()
+    if retry and failed.any():
+        parsed[failed] = pd.to_datetime(text[failed], format='mixed', utc=True, errors='coerce')
+    return parsed
+
+def _parse_number(v):
+    # infer_format + parse_column de una columna de un solo número: fecha compacta o epoch
+    if not math.isfinite(v):
+        return None
+    if v == int(v):
+        digits = str(int(v))
+        fmt = COMPACT_FORMATS.get(len(digits))
+        if fmt:
+            try:
+                return pd.Timestamp(datetime.strptime(digits, fmt), tz='UTC')
+            except ValueError:
+                pass
+    unit = next(unit for limit, unit in EPOCH_UNITS if abs(v) < limit)
+    ts = pd.to_datetime(v, unit=unit, utc=True, errors='coerce')
+    return None if pd.isna(ts) else ts
+
+def parse_value(value):
+    """
+    Una celda (camino fila a fila), con las mismas reglas que una columna. None si no se puede.
+    Números y texto ISO se leen directo (es lo que infer_format elegiría para
+    esa celda sola); sólo el resto (otros formatos, otras formas de número
+    como '1e9') pasa por infer_format.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _parse_number(value)
+    if isinstance(value, str):
+        if INTEGER_TEXT.fullmatch(value):
+            return _parse_number(int(value))
+        if DECIMAL_TEXT.fullmatch(value):
+            return _parse_number(float(value))
+        if ISO_TEXT.fullmatch(value):
+            # ISO gana los empates en infer_format: si se lee como ISO, es eso
+            try:
+                ts = pd.Timestamp(datetime.fromisoformat(value))
+                return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+            except ValueError:
+                pass           # p.ej. hora 25: lo decide infer_format
+    values = pd.Series([value])
+    ts = parse_column(values, *infer_format(values)).iat[0]
+    return None if pd.isna(ts) else ts
+
+class TimestampParser:
+    """
+    Parser de timestamps de un archivo. La primera vez que ve datos en cada
+    columna candidata infiere su formato y lo reutiliza en los chunks siguientes.
+    Por fila se usa la primera columna (en el orden de TIMESTAMP_COLUMNS) que
+    tenga un valor legible; si ninguna, NaT.
+    """
+
+    def __init__(self, columns=TIMESTAMP_COLUMNS, sample_rows=SAMPLE_ROWS):
+        self.columns = list(columns)
+        self.sample_rows = sample_rows
+        self.formats = {}      # columna -> (tipo, formato)
+
+    def source_column(self, df):
+        """Primera columna candidata presente en df (la que se informa en los errores)."""
+        return next((k for k in self.columns if k in df.columns), None)
+
+    def _format(self, column, values):
+        if column not in self.formats:
+            # muestra repartida en todo el chunk: p.ej. para ver días > 12 en dd/mm
+            step = max(len(values) // self.sample_rows, 1)
+            self.formats[column] = infer_format(values.iloc[::step])
+        return self.formats[column]
+
+    def parse(self, df):
+        """Serie datetime64[ns, UTC] con el índice de df; NaT = sin timestamp legible."""
+        ts = np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+        pending = np.ones(len(df), dtype=bool)
+        for k in self.columns:
+            if k not in df.columns or not pending.any():
+                continue
+            mask = pending & df[k].notna().to_numpy()
+            if not mask.any():
+                continue
+            values = df[k][mask]
+            parsed = parse_column(values, *self._format(k, values)).dt.as_unit('ns')
+            ok = parsed.notna().to_numpy()
+            rows = np.flatnonzero(mask)[ok]
+            ts[rows] = parsed[ok].dt.tz_localize(None).to_numpy()
+            pending[rows] = False
+        return pd.Series(ts, index=df.index).dt.tz_localize('UTC')
+
+class InvalidTimestamps:
+    """
+    Filas de un archivo sin timestamp legible: se descartan antes de escribir
+    y se informan una por una (log + estadísticas), hasta MAX_REPORTED.
+    """
+
+    def __init__(self, path, columns=TIMESTAMP_COLUMNS, limit=MAX_REPORTED):
+        self.path = path
+        self.columns = list(columns)
+        self.limit = limit
+        self.count = 0
+        self.rows = []       # (fila, valor crudo)
+
+    def drop(self, norm, df):
+        """(norm, df) sin las filas con timestamp NaT, registrándolas (norm: MeasurementBatch o DataFrame)."""
+        bad = norm['timestamp'].isna().to_numpy()
+        if not bad.any():
+            return norm, df
+        column = next((k for k in self.columns if k in df.columns), None)
+        for i in norm.index[bad][:max(self.limit - len(self.rows), 0)]:
+            value = df.at[i, column] if column else None
+            value = None if pd.isna(value) else value
+            logger.warning("%s: fila %d sin timestamp legible (%s=%r), se descarta", self.path, i, column, value)
+            self.rows.append((int(i), value))
+        self.count += int(bad.sum())
+        return norm[~bad], df[~bad]
+
+    def as_dict(self):
+        return {'timestamps_invalidos': self.count, 'filas_sin_timestamp': list(self.rows)}
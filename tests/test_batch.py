@@ -0,0 +1,43 @@
+# tests/test_batch.py
+import numpy as np
+import pandas as pd
+from src.batch import MeasurementBatch
+from src.normalize import normalize_batch, normalize_frame
+from src.qc import qc_frame
+
+RAW = pd.DataFrame({
+    'sensor_id': ['s1', 's2', 's1', 's2', 's1'],
+    'time': [f'2025-01-01T00:0{i}:00Z' for i in range(5)],
+    'temp': [20.0, 99.0, None, 21.0, -80.0],
+    'hum': [50, 150, 40, None, 45],
+}, index=[10, 11, 12, 13, 14])
+
+def test_frame_view_shares_memory_with_batch():
+    batch = normalize_batch(RAW)
+    frame = batch.to_frame()
+    assert np.shares_memory(frame['temperatura'].to_numpy(), batch.values)
+    assert np.shares_memory(frame['sensor_id'].array.codes, batch.sensor_codes)
+    assert np.shares_memory(pd.DatetimeIndex(frame['timestamp']).asi8, batch.timestamp.asi8)
+    assert list(frame.index) == [10, 11, 12, 13, 14]
+    # validation_flags igual al de normalize_frame, armado desde los códigos
+    flags = normalize_frame(RAW)['validation_flags'].tolist()
+    assert [[f['descripcion'] for f in row] for row in flags] == [
+        [], ['temperatura=99.0 fuera de rango [-60,60]', 'humedad=150.0 fuera de rango [0,100]'],
+        [], [], ['temperatura=-80.0 fuera de rango [-60,60]']]
+
+def test_slice_and_take_keep_flags_aligned():
+    batch = normalize_batch(RAW)
+    part = batch[1:4]
+    assert np.shares_memory(part.values, batch.values)
+    assert part.flag_row.tolist() == [0, 0] and list(part.index) == [11, 12, 13]
+    taken = batch[np.array([True, False, True, False, True])]
+    assert taken.flag_row.tolist() == [2] and taken['temperatura'].tolist()[2] == -80.0
+    taken.add_flags('CONSISTENCY', 'temperatura', [0], ref=[30.0])
+    assert taken.describe_flag(0) == ('CONSISTENCY', 'temp change 20.0 vs 30.0')
+
+def test_batch_is_accepted_where_frames_were():
+    batch = normalize_batch(RAW)
+    assert MeasurementBatch.from_frame(batch) is batch
+    again = MeasurementBatch.from_frame(normalize_frame(RAW))
+    assert np.array_equal(again.flag_row, batch.flag_row)
+    assert qc_frame(batch).equals(qc_frame(normalize_frame(RAW)))
@@ -0,0 +1,25 @@
+# tests/test_benchmarks.py
+from benchmarks.generator import station_frame
+from benchmarks.suite import compare
+from src.normalize import normalize_frame
+
+def test_station_frame_controls():
+    df = station_frame(2000, n_sensors=8, synonyms=2, unit_mix=1.0, missing=0.0, out_of_range=0.1, seed=3)
+    assert df['sensor_id'].nunique() == 8
+    # todos en unidades alternativas: temperatura sólo en temp_f
+    assert 'temp_f' in df.columns and 'temp' not in df.columns
+    assert {'hum', 'humidity', 'p', 'pressure'} <= set(df.columns)
+    norm = normalize_frame(df)
+    assert norm['temperatura'].notna().all() and norm['humedad'].max() <= 130
+    flagged = (norm['validation_flags'].map(len) > 0).mean()
+    assert 0.05 < flagged < 0.15
+    assert station_frame(50, seed=1).equals(station_frame(50, seed=1))
+
+def test_compare_flags_slowdowns():
+    base = {'casos': {'a': {'items': 100, 'mediana_s': 1.0}, 'b': {'items': 100, 'mediana_s': 1.0}}}
+    current = {'casos': {'a': {'items': 200, 'mediana_s': 3.0}, 'b': {'items': 100, 'mediana_s': 0.5},
+                         'c': {'items': 10, 'mediana_s': 0.1}}}
+    states = {name: (state, change) for name, _, _, change, state in compare(base, current, threshold=0.2)}
+    assert states['a'][0] == 'LENTO' and abs(states['a'][1] - 0.5) < 1e-9
+    assert states['b'][0] == 'rapido'
+    assert states['c'] == ('sin base', None)
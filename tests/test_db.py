@@ -0,0 +1,104 @@
+# tests/test_db.py
+import pandas as pd
+from src.db import consistency_flags, consistency_flags_frame
+from src.normalize import normalize_frame, records_from_frame
+from src.sensor_state import SensorStateCache, to_ns
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute(self, sql, params=None):
+        self.queries += 1
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+def ts(s):
+    return pd.Timestamp(s, tz='UTC')
+
+def test_consistency_uses_nearest_earlier_reading():
+    # archivo fuera de orden; en la base ya hay una lectura de s2 a las 00:00
+    df = pd.DataFrame({
+        'sensor_id': ['s1', 's1', 's2', 's1', 's1', 's2'],
+        'time': ['2025-01-01T00:10:00Z', '2025-01-01T00:20:00Z', '2025-01-01T00:10:00Z',
+                 '2025-01-01T00:05:00Z', '2025-01-01T00:20:00Z', '2025-01-01T00:20:00Z'],
+        'temp': [20.0, 35.0, 10.0, 21.0, 19.0, None],
+        'hum': [50, 50, 40, 90, 55, 95],
+    })
+    norm = normalize_frame(df)
+    state = SensorStateCache()
+    cur = FakeCursor([('s2', 'prev', ts('2025-01-01T00:00:00'), 30.0, 40.0, None)])
+    state.warm(cur, {'s1': (to_ns(ts('2025-01-01T00:05')), to_ns(ts('2025-01-01T00:20'))),
+                     's2': (to_ns(ts('2025-01-01T00:10')), to_ns(ts('2025-01-01T00:20')))})
+    flags, written = consistency_flags_frame(norm, state)
+
+    # s1 queda 00:05 (21, 90) -> 00:10 (20, 50) -> 00:20 (19, 55; la última fila gana)
+    assert sorted(flags) == [0, 1, 2, 5]
+    assert flags[0] == [{'tipo': 'CONSISTENCY', 'descripcion': 'hum change 50.0 vs 90.0'}]
+    assert flags[1] == [{'tipo': 'CONSISTENCY', 'descripcion': 'temp change 35.0 vs 20.0'}]
+    assert flags[2] == [{'tipo': 'CONSISTENCY', 'descripcion': 'temp change 10.0 vs 30.0'}]
+    assert flags[5] == [{'tipo': 'CONSISTENCY', 'descripcion': 'hum change 95.0 vs 40.0'}]
+
+    # el camino fila a fila (insert_medicion) usa la misma cache con previous()
+    for sensor_id, *reading in written:
+        state.record_many(sensor_id, *reading)
+    m = next(records_from_frame(normalize_frame(pd.DataFrame(
+        {'sensor_id': ['s1'], 'time': ['2025-01-01T00:15:00Z'], 'temp': [35.0]}))))
+    last = state.previous('s1', to_ns(m['timestamp']))
+    assert last[:2] == (20.0, 50.0)
+    assert consistency_flags(m, last)[0]['descripcion'] == 'temp change 35.0 vs 20.0'
+
+def test_sensor_state_warm_once_and_bounded():
+    state = SensorStateCache(max_sensors=2, max_history=3)
+    cur = FakeCursor([])
+    t0 = to_ns(ts('2025-01-01'))
+    state.warm(cur, {'a': (t0, t0), 'b': (t0, t0)})
+    state.warm(cur, {'a': (t0 + 1, t0 + 5)})
+    assert cur.queries == 1          # sin lecturas posteriores: la cache ya cubre 'a'
+
+    for i in range(5):
+        state.record('a', t0 + i, float(i), None, None)
+    assert state.previous('a', t0 + 4) == (3.0, None, None, t0 + 3)
+    assert not state.covers('a', t0 + 1, t0 + 1)    # quedaron sólo las 3 más nuevas
+    assert state.covers('a', t0 + 3, t0 + 10)
+
+    state.warm(cur, {'c': (t0, t0)})
+    assert 'b' not in state and 'a' in state and 'c' in state
+
+def test_sensor_state_warm_keeps_only_the_newest_readings():
+    state = SensorStateCache(max_history=3)
+    t0 = to_ns(ts('2025-01-01'))
+    rows = [('a', 'prev', ts('2024-12-31'), 1.0, None, None)]
+    rows += [('a', 'win', pd.Timestamp(t0 + i * 1000, tz='UTC'), float(i), None, None) for i in range(5)]
+    state.warm(FakeCursor(rows), {'a': (t0, t0 + 4000)})
+    assert state.history('a')[0].tolist() == [t0 + 2000, t0 + 3000, t0 + 4000]
+    assert not state.covers('a', t0, t0 + 4000) and state.covers('a', t0 + 3000, t0 + 4000)
+
+def test_numeric_sensor_column_gives_text_ids_on_row_and_batch_paths():
+    from src.ingest import rows_from_df
+    from src.normalize import normalize_row
+    df = pd.DataFrame({'sensor_id': [7, 7], 'time': ['2025-01-01T00:00:00Z', '2025-01-01T00:10:00Z'],
+                       'temp': [20.0, 21.0]})
+    assert [normalize_row(r)['sensor_id'] for r in rows_from_df(df)] == ['7', '7']
+    norm = normalize_frame(df)
+    assert [m['sensor_id'] for m in records_from_frame(norm, df)] == ['7', '7']
+    # la base devuelve sensor_id como texto: warm encuentra el sensor del lote
+    state = SensorStateCache()
+    t0 = to_ns(ts('2025-01-01'))
+    state.warm(FakeCursor([('7', 'win', ts('2025-01-01'), 20.0, None, None)]), {'7': (t0, t0 + 1000)})
+    assert state.previous('7', t0 + 1000)[0] == 20.0
+
+def test_ensure_sensors_registers_each_sensor_once():
+    from src.db import KNOWN_SENSORS, ensure_sensors, forget_sensors
+    cur = FakeCursor([])
+    forget_sensors(['t1', 't2', 't3'])
+    assert ensure_sensors(cur, ['t1', 't2', 't1']) == ['t1', 't2']
+    assert cur.params == (['t1', 't2'],)
+    assert ensure_sensors(cur, ['t2', 't1']) == []
+    assert ensure_sensors(cur, ['t3', 't1']) == ['t3']
+    assert cur.queries == 2
+    forget_sensors(['t1', 't2', 't3'])
+    assert not {'t1', 't2', 't3'} & KNOWN_SENSORS
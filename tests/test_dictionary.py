@@ -0,0 +1,67 @@
+# tests/test_dictionary.py
+import json
+from src import dictionary
+from src.dictionary import VariableResolver
+
+class FakeFetch:
+    def __init__(self, version, synonyms):
+        self.version = version
+        self.synonyms = synonyms
+        self.calls = []
+
+    def __call__(self, version=None):
+        self.calls.append(version)
+        if version == self.version:
+            return self.version, None
+        return self.version, dict(self.synonyms)
+
+def test_resolver_is_lazy_and_merges_db_with_local(tmp_path):
+    fetch = FakeFetch('v1', {'temperature_f': 'temperatura', 'temp': 'humedad', 'presion_pa': 'presion'})
+    r = VariableResolver(cache_path=tmp_path / 'map.json', ttl=3600, fetch=fetch)
+    assert fetch.calls == []
+    assert r.resolve('Temperature_F') == ('temperatura', 'f')
+    assert r.resolve('presion_pa') == ('presion', 'pa')
+    assert r.resolve('temp') == ('temperatura', 'c')      # el mapeo local manda
+    assert r.resolve('desconocida') == (None, None)
+    assert r.plan(['sensor_id', 'temp', 'hum']) == [('temp', 'temperatura', 'c'), ('hum', 'humedad', 'percent')]
+    assert len(fetch.calls) == 1
+
+def test_resolver_cache_ttl_and_table_version(tmp_path):
+    path = tmp_path / 'map.json'
+    fetch = FakeFetch('v1', {'temperature_f': 'temperatura'})
+    VariableResolver(cache_path=path, ttl=3600, fetch=fetch).mapping
+    # dentro del TTL: ni siquiera se consulta la versión
+    VariableResolver(cache_path=path, ttl=3600, fetch=fetch).mapping
+    assert fetch.calls == [None]
+    # TTL vencido, misma versión: se revalida sin recargar
+    VariableResolver(cache_path=path, ttl=0, fetch=fetch).mapping
+    assert fetch.calls == [None, 'v1']
+    # la tabla cambió: se recarga y se reescribe la cache
+    fetch.version, fetch.synonyms = 'v2', {'tempf': 'temperatura'}
+    r = VariableResolver(cache_path=path, ttl=0, fetch=fetch)
+    assert r.resolve('tempf') == ('temperatura', 'f')
+    assert json.loads(path.read_text())['version'] == 'v2'
+
+def test_resolver_offline_uses_stale_cache_or_local_map(tmp_path):
+    def offline(version=None):
+        raise OSError('sin conexión')
+    path = tmp_path / 'map.json'
+    assert VariableResolver(cache_path=path, ttl=0, fetch=offline).resolve('temp_f') == ('temperatura', 'f')
+    VariableResolver(cache_path=path, fetch=FakeFetch('v1', {'temperature_f': 'temperatura'})).mapping
+    r = VariableResolver(cache_path=path, ttl=0, fetch=offline)
+    assert r.resolve('temperature_f') == ('temperatura', 'f')
+
+def test_resolver_reloads_in_memory_map_after_ttl(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(dictionary.time, 'monotonic', lambda: now[0])
+    fetch = FakeFetch('v1', {'tempf': 'temperatura'})
+    r = VariableResolver(cache_path=None, ttl=60, fetch=fetch)
+    plan = r.plan(['tempf', 'rad_x'])
+    assert plan == [('tempf', 'temperatura', 'f')]
+    now[0] += 30
+    assert r.plan(['tempf', 'rad_x']) is plan and fetch.calls == [None]
+    # vencido el TTL: se recarga; la tabla cambió, el plan viejo se descarta
+    fetch.version, fetch.synonyms = 'v2', {'tempf': 'temperatura', 'rad_x': 'radiacion_solar'}
+    now[0] += 31
+    assert r.plan(['tempf', 'rad_x']) == [('tempf', 'temperatura', 'f'), ('rad_x', 'radiacion_solar', None)]
+    assert len(fetch.calls) == 2
@@ -0,0 +1,49 @@
+# tests/test_export.py
+import numpy as np
+import pandas as pd
+import xarray as xr
+from src.export import NetcdfTimeSeriesWriter, export_mediciones_to_netcdf, write_frames
+from src.db import VARIABLES
+
+def frame(rows):
+    df = pd.DataFrame(rows, columns=['ts_us', 'sensor_id', 'temperatura'])
+    for var in VARIABLES[1:]:
+        df[var] = np.nan
+    return df
+
+def test_write_frames_keeps_instants_split_across_fetches(tmp_path):
+    path = tmp_path / 'a.nc'
+    sensors = ['s1', 's2']
+    # el instante 2 llega partido entre el primer y el segundo frame
+    frames = [frame([(1, 's1', 10.0), (1, 's2', 20.0), (2, 's1', 11.0)]),
+              frame([(2, 's2', 21.0), (3, 's2', 22.0), (4, 's1', 13.0)])]
+    writer = NetcdfTimeSeriesWriter(str(path), sensors, time_chunk=2)
+    rows = write_frames(writer, frames, sensors)
+    writer.close()
+
+    assert rows == 6
+    ds = xr.open_dataset(path, decode_times=False)
+    assert ds['time'].values.tolist() == [1, 2, 3, 4]
+    np.testing.assert_array_equal(ds['temperatura'].values,
+                                  [[10, 20], [11, 21], [np.nan, 22], [13, np.nan]])
+    assert ds['temperatura'].encoding['chunksizes'] == (2, 1)
+    assert ds['temperatura'].encoding['zlib']
+    ds.close()
+
+def test_export_dataframe_accepts_wide_and_long_format(tmp_path):
+    wide = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2025-01-01T00:10Z', '2025-01-01T00:00Z', '2025-01-01T00:00Z']),
+        'sensor_id': ['s2', 's1', 's2'],
+        'temperatura': [21.0, 20.0, 19.5],
+        'humedad': [50.0, np.nan, 55.0],
+    })
+    long = wide.melt(id_vars=['timestamp', 'sensor_id'], var_name='variable', value_name='value')
+    for name, df in (('wide.nc', wide), ('long.nc', long)):
+        export_mediciones_to_netcdf(df, tmp_path / name)
+        ds = xr.open_dataset(tmp_path / name)
+        assert ds.attrs['Conventions'] == 'CF-1.8'
+        assert ds['sensor_id'].values.tolist() == ['s1', 's2']
+        assert ds['temperatura'].attrs['standard_name'] == 'air_temperature'
+        np.testing.assert_array_equal(ds['temperatura'].values, [[20.0, 19.5], [np.nan, 21.0]])
+        np.testing.assert_array_equal(ds['humedad'].values, [[np.nan, 55.0], [np.nan, 50.0]])
+        ds.close()
@@ -0,0 +1,39 @@
+# tests/test_ingest.py
+import pandas as pd
+from src.ingest import detect_encoding, iter_csv
+
+def write_csv(path, rows, encoding='utf-8'):
+    text = 'sensor_id,time,temp\n' + ''.join(f'{s},2025-01-01T00:{i:02d}:00Z,{i}\n' for i, s in enumerate(rows))
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+def test_detect_encoding(tmp_path):
+    assert detect_encoding(write_csv(tmp_path / 'a.csv', ['año'] * 3)) == 'utf-8'
+    assert detect_encoding(write_csv(tmp_path / 'b.csv', ['año'] * 3, 'latin-1')) == 'latin-1'
+
+def test_iter_csv_chunks_keep_file_positions(tmp_path):
+    path = write_csv(tmp_path / 'a.csv', [f's{i % 3}' for i in range(10)])
+    chunks = list(iter_csv(path, chunksize=4))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert list(chunks[1].index) == [4, 5, 6, 7]
+    resumed = list(iter_csv(path, chunksize=4, skip_rows=6))
+    assert list(resumed[0].index) == [6, 7, 8, 9]
+    assert resumed[0]['temp'].tolist() == [6, 7, 8, 9]
+    assert [len(c) for c in iter_csv(path, chunksize=4, skip_rows=10)] == [0]
+
+def test_iter_csv_resume_counts_quoted_and_blank_lines_like_a_full_read(tmp_path):
+    path = tmp_path / 'a.csv'
+    path.write_bytes(b'sensor_id,nota,temp\ns1,"dos\nlineas",0\n\ns2,x,1\ns3,"a ""b""",2\ns4,y,3\n')
+    full = pd.concat(iter_csv(str(path), chunksize=2))
+    resumed = pd.concat(iter_csv(str(path), chunksize=2, skip_rows=2))
+    assert full['temp'].tolist() == [0, 1, 2, 3]
+    assert resumed.equals(full.iloc[2:])
+
+def test_iter_csv_switches_to_latin1_after_sample(tmp_path):
+    # prefijo ascii (parece utf-8), 'ñ' en latin-1 mucho más adelante
+    path = write_csv(tmp_path / 'a.csv', ['s1'] * 50 + ['año'] * 2, 'latin-1')
+    assert detect_encoding(path, sample_bytes=64) == 'utf-8'
+    chunks = list(iter_csv(path, chunksize=8, encoding='utf-8'))
+    rows = [r for c in chunks for r in c['sensor_id']]
+    assert len(rows) == 52 and rows[-1] == 'año'
+    assert [i for c in chunks for i in c.index] == list(range(52))
@@ -0,0 +1,55 @@
+# tests/test_loader.py
+import src.loader as loader
+from src.ledger import file_fingerprint
+
+class FakeConn:
+    def __init__(self):
+        self.checkpoints = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.checkpoints.append(params[0])
+
+def write_csv(path, n):
+    path.write_text('sensor_id,time,temp\n' + ''.join(f's1,2025-01-01T00:00:{i:02d}Z,{i}\n' for i in range(n)))
+    return str(path)
+
+def fake_ledger(monkeypatch, offset, done):
+    finished = []
+    monkeypatch.setattr(loader, 'ledger_start', lambda conn, path, digest, size, resume=True: (offset, done))
+    monkeypatch.setattr(loader, 'ledger_finish', lambda conn, digest, rows: finished.append(rows))
+    return finished
+
+def test_resume_from_checkpoint_and_checkpoint_each_batch(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / 'a.csv', 10)
+    finished = fake_ledger(monkeypatch, 6, False)
+    written = []
+    def bulk(conn, norm, df, procedure_version='v1', batch_size=None, checkpoint=None, raw_payload=None):
+        written.extend(norm['temperatura'].tolist())
+        checkpoint(conn.cursor(), int(norm.index[-1]) + 1)
+        return len(norm)
+    monkeypatch.setattr(loader, 'insert_mediciones_bulk', bulk)
+    conn = FakeConn()
+
+    stats = loader.ingest_file(conn, path, mode='bulk', chunk_rows=3, pipeline='sequential')
+
+    assert written == [6.0, 7.0, 8.0, 9.0]
+    assert conn.checkpoints == [9, 10]
+    assert finished == [10]
+    assert (stats['desde'], stats['filas'], stats['omitido']) == (6, 4, False)
+
+def test_completed_file_is_skipped(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / 'a.csv', 10)
+    finished = fake_ledger(monkeypatch, 10, True)
+    monkeypatch.setattr(loader, 'insert_mediciones_bulk', lambda *a, **k: 1 / 0)
+
+    stats = loader.ingest_file(FakeConn(), path, mode='bulk', pipeline='sequential')
+
+    assert stats['omitido'] and stats['filas'] == 0 and finished == []
+
+def test_fingerprint_follows_content(tmp_path):
+    a, b = write_csv(tmp_path / 'a.csv', 5), write_csv(tmp_path / 'b.csv', 5)
+    assert file_fingerprint(a) == file_fingerprint(b)
+    assert file_fingerprint(a)[0] != file_fingerprint(write_csv(tmp_path / 'c.csv', 6))[0]
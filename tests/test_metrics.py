@@ -0,0 +1,48 @@
+# tests/test_metrics.py
+import time
+import urllib.request
+from src.metrics import Metrics, profiled, serve_prometheus
+
+def test_nested_stages_count_own_time():
+    m = Metrics()
+    with m.stage('escritura', rows=10):
+        with m.stage('qc', rows=10):
+            time.sleep(0.02)
+        time.sleep(0.01)
+    etapas = m.snapshot()['etapas']
+    assert etapas['qc']['segundos'] >= 0.02
+    assert 0.01 <= etapas['escritura']['segundos'] < 0.02
+    assert etapas['escritura']['filas'] == 10 and etapas['escritura']['llamadas'] == 1
+
+def test_histogram_merge_and_prometheus_text():
+    m = Metrics()
+    for seconds in (0.0001, 0.003, 0.003, 20.0):
+        m.observe_db('COPY', seconds)
+    h = m.snapshot()['db']['COPY']
+    assert h['idas'] == 4 and h['p50_s'] == 0.005 and h['p95_s'] == float('inf')
+
+    total = Metrics()
+    total.merge(m.snapshot())
+    total.merge(m.snapshot())
+    assert total.snapshot()['db']['COPY']['idas'] == 8
+    text = total.prometheus_text()
+    assert 'clima_db_latencia_segundos_bucket{op="COPY",le="0.0005"} 2' in text
+    assert 'clima_db_latencia_segundos_bucket{op="COPY",le="+Inf"} 8' in text
+    assert 'clima_db_latencia_segundos_count{op="COPY"} 8' in text
+
+def test_prometheus_endpoint_and_profile_report(tmp_path):
+    m = Metrics()
+    with m.stage('lectura', rows=5):
+        pass
+    server = serve_prometheus(0, metrics=m)
+    try:
+        port = server.server_address[1]
+        body = urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics').read().decode()
+    finally:
+        server.shutdown()
+    assert 'clima_etapa_filas_total{etapa="lectura"} 5' in body
+
+    out = tmp_path / 'cpu.txt'
+    with profiled('cpu', out):
+        sorted(range(1000), key=lambda x: -x)
+    assert 'cumulative' in out.read_text()
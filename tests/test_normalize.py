@@ -4,7 +4,47 @@ from src.normalize import normalize_row
 def test_temp_f_to_c():
     row = {'sensor_id':'s1','time':'2025-01-01T00:00:00Z','temp_f':77}
     out = normalize_row(row)
-    assert len(out) == 1
-    obs = out[0]
     # 77°F ≈ 25°C
-    assert abs(obs['value'] - 25.0) < 0.5
+    assert abs(out['temperatura'] - 25.0) < 0.5
+    assert out['sensor_id'] == 's1' and out['validation_flags'] == []
+
+def test_normalize_frame_matches_normalize_row():
+    import pandas as pd
+    from src.ingest import rows_from_df
+    from src.normalize import normalize_frame, records_from_frame
+    df = pd.DataFrame({
+        'sensor_id': ['s1', '', 's2', float('nan'), float('nan')],
+        'sensor': ['x', 'x', None, 'y', None],
+        'time': ['2025-01-01T00:00:00Z', '2025-01-01 01:00', None, 'no-fecha', '2025-01-01T03:00:00+02:00'],
+        'date': [None, None, '2025-01-02', '2025-01-03', None],
+        'temp': [20.0, None, 30.0, 10.0, None],
+        'temp_f': [77, 200, None, 50.0009, 32.0009],
+        'hum': [0.79, 0.0005, 120, None, 0.0095],
+        'p': [100870, 12345, None, 100000.05, 101325],
+    })
+    expected = [normalize_row(raw) for raw in rows_from_df(df)]
+    got = list(records_from_frame(normalize_frame(df), df))
+    # celda vacía (NaN) = sin sensor: se usa 'sensor' y si no, 'unknown'
+    assert [e['sensor_id'] for e in expected] == ['s1', 'x', 's2', 'y', 'unknown']
+    for e, g in zip(expected, got):
+        del e['raw'], g['raw']
+        assert e == g
+
+def test_conversion_plan_conflicts_unknown_and_cache():
+    import pytest
+    from src.normalize import conversion_plan
+    columns = ['sensor_id', 'time', 'temp', 'temp_f', 'hum', 'nota']
+    plan = conversion_plan(columns, 'last')
+    assert plan.conflicts == {'temperatura': ['temp', 'temp_f']}
+    assert plan.unknown == ['nota']
+    # mismo encabezado en otro archivo: no se vuelve a compilar
+    assert conversion_plan(list(columns), 'last') is plan
+    with pytest.raises(ValueError, match='temperatura <- temp, temp_f'):
+        conversion_plan(columns, 'error')
+
+    row = {'sensor_id': 's1', 'time': '2025-01-01T00:00:00Z', 'temp': 20.0, 'temp_f': 77, 'hum': 0.5, 'nota': 'x'}
+    values = [step[2](float(row[step[0]])) for step in conversion_plan(columns, 'first').steps if step[1] == 'temperatura']
+    # 'first': temp (la primera) se aplica última y gana
+    assert values == [25.0, 20.0]
+    assert normalize_row(row)['temperatura'] == 25.0
+    assert normalize_row(dict(row, temp_f=None))['temperatura'] == 20.0
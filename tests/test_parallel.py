@@ -0,0 +1,25 @@
+# tests/test_parallel.py
+from src.parallel import expand_inputs, group_by_sensor, sensors_in_file
+
+def test_expand_inputs(tmp_path):
+    for name in ['b.csv', 'a.csv', 'notas.txt']:
+        (tmp_path / name).write_text('sensor_id,time\n')
+    a, b = str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')
+    assert expand_inputs([str(tmp_path)]) == [a, b]
+    assert expand_inputs([str(tmp_path / '*.csv'), b]) == [a, b]
+
+def test_files_sharing_a_sensor_stay_in_one_group_in_order(tmp_path):
+    f = tmp_path / 'x.csv'
+    f.write_text('sensor_id,time,temp\ns1,2025-01-01,1\ns2,2025-01-01,2\n,2025-01-01,3\n')
+    # la fila sin sensor se carga como 'unknown': también agrupa
+    assert sensors_in_file(str(f)) == {'s1', 's2', 'unknown'}
+    f.write_text('sensor_id,sensor,time\n,b,2025-01-01\n101,,2025-01-01\n')
+    assert sensors_in_file(str(f)) == {'b', '101.0'}
+    groups = group_by_sensor([
+        ('d1_a.csv', {'s1'}),
+        ('d1_b.csv', {'s2'}),
+        ('d1_c.csv', {'s3', 's1'}),
+        ('d2_b.csv', {'s2'}),
+        ('d2_c.csv', {'s3'}),
+    ])
+    assert sorted(groups) == [['d1_a.csv', 'd1_c.csv', 'd2_c.csv'], ['d1_b.csv', 'd2_b.csv']]
@@ -0,0 +1,77 @@
+# tests/test_parquet.py
+import numpy as np
+import pandas as pd
+import pytest
+from src.normalize import normalize_batch
+from src.raw_payload import RawPayload
+
+pytest.importorskip('pyarrow')
+from src import parquet
+
+def raw_frame():
+    return pd.DataFrame({
+        'sensor_id': ['s1', 's2', 's1', '7'],
+        'time': ['2025-01-31T23:00:00Z', '2025-01-31T23:30:00Z', '2025-02-01T01:00:00Z', '2025-02-01T02:00:00Z'],
+        'temp': [20.0, 95.0, None, 18.5],
+        'lat': [-12.0, -12.1, -12.0, -12.2],
+    })
+
+def test_staging_round_trip_by_sensor_and_month(tmp_path):
+    df = raw_frame()
+    batch = normalize_batch(df)
+    stage = parquet.ParquetStage(tmp_path, 'f' * 64, RawPayload('unmapped'))
+    stage.write(batch, df)
+
+    dirs = sorted(p.relative_to(tmp_path).parent.as_posix() for p in tmp_path.rglob('*.parquet'))
+    assert dirs == ['sensor_id=7/mes=2025-02', 'sensor_id=s1/mes=2025-01', 'sensor_id=s1/mes=2025-02',
+                    'sensor_id=s2/mes=2025-01']
+    table = parquet.open_dataset(tmp_path).to_table().sort_by('fila')
+    back = parquet.table_batch(table)
+    # sensor '7' sigue siendo texto; NaN -> null -> NaN; los flags RANGE se recalculan igual
+    assert back['sensor_id'].astype(str).tolist() == ['s1', 's2', 's1', '7']
+    np.testing.assert_array_equal(back['temperatura'].to_numpy(), batch['temperatura'].to_numpy())
+    assert (back['timestamp'].to_numpy() == batch['timestamp'].to_numpy()).all()
+    assert back.index.tolist() == [0, 1, 2, 3] and back.flag_row.tolist() == batch.flag_row.tolist() == [1]
+    assert table['raw_payload'].to_pylist()[0] == '{"lat":-12.0}' and set(table['archivo'].to_pylist()) == {'f' * 64}
+
+    # recargar el mismo archivo desde el principio reemplaza sus archivos
+    parquet.ParquetStage(tmp_path, 'f' * 64).write(batch[:1])
+    assert parquet.open_dataset(tmp_path).count_rows() == 1
+
+def test_read_dataset_filters_time_and_sensor(tmp_path):
+    df = raw_frame()
+    parquet.ParquetStage(tmp_path, 'a' * 64).write(normalize_batch(df), df)
+
+    out = parquet.read_dataset(tmp_path, start='2025-01-31T23:15:00', end='2025-02-01T02:00:00', sensor_ids=['s1', 's2'])
+    assert sorted(zip(out['sensor_id'], out['fila'])) == [('s1', 2), ('s2', 1)]
+    assert parquet.read_dataset(tmp_path, start='2025-03-01').empty
+
+class CopyConn:
+    """Conexión mínima para export_parquet: el COPY devuelve filas fijas."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mogrify(self, query, params):
+        return query.encode()
+
+    def copy_expert(self, sql, f):
+        f.write(self.lines.encode())
+
+    def rollback(self):
+        self.rollbacks += 1
+
+def test_export_parquet_leaves_caller_transaction_alone(tmp_path):
+    conn = CopyConn('s1,1738367000000000,20.0,,,,\ns1,1738368000000000,21.0,,,,\n')
+    out = parquet.export_parquet(conn, tmp_path / 'pq', start='2025-01-31', end='2025-02-02')
+    assert out['filas'] == 2 and conn.rollbacks == 0
@@ -0,0 +1,78 @@
+# tests/test_partitions.py
+import pandas as pd
+from src import partitions
+from src.partitions import PartitionManager, month_of, months_between, months_present, partition_name
+
+class FakeConn:
+    """Conexión mínima: responde is_partitioned y la lista de particiones existentes."""
+
+    def __init__(self, partitioned, existing=()):
+        self.partitioned = partitioned
+        self.existing = [(name,) for name in existing]
+        self.sql = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.sql.append(query if isinstance(query, str) else repr(query))
+
+    def fetchone(self):
+        return (self.partitioned,)
+
+    def fetchall(self):
+        return self.existing
+
+    def commit(self):
+        self.commits += 1
+
+def test_months_between_and_names():
+    assert months_between('2024-11-30T23:00:00Z', '2025-02-01T00:00:00Z') == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+    # los meses son UTC aunque el timestamp venga en otra zona
+    assert months_between('2025-03-01T01:00:00+03:00', '2025-03-01T01:00:00+03:00') == [(2025, 2)]
+    assert partition_name((2025, 1)) == 'medicion_p202501'
+    assert month_of('medicion_p202501') == (2025, 1) and month_of('medicion_default') is None
+
+def test_ensure_creates_missing_months_once():
+    conn = FakeConn(True, existing=['medicion_default', 'medicion_p202501'])
+    pm = PartitionManager()
+    assert pm.ensure(conn, '2025-01-10T00:00:00Z', '2025-02-03T00:00:00Z') == ['medicion_p202502']
+    assert any('ATTACH PARTITION' in q for q in conn.sql)
+    n = len(conn.sql)
+    # meses ya vistos: ni siquiera se consulta el catálogo
+    assert pm.ensure(conn, '2025-01-20T00:00:00Z', '2025-02-01T00:00:00Z') == []
+    assert len(conn.sql) == n
+
+def test_ensure_is_a_noop_on_unpartitioned_table():
+    conn = FakeConn(False)
+    pm = PartitionManager()
+    assert pm.ensure(conn, '2025-01-10T00:00:00Z', '2025-05-01T00:00:00Z') == []
+    assert pm.ensure(conn, '2030-01-01T00:00:00Z', '2030-01-01T00:00:00Z') == []
+    assert len(conn.sql) == 1
+
+def test_ensure_months_only_creates_months_with_rows_and_caps_the_rest(monkeypatch):
+    ts = pd.Series(pd.to_datetime(['2025-01-03', '1970-01-01', '2025-01-05', None], utc=True))
+    assert months_present(ts) == [(1970, 1), (2025, 1)]
+    conn = FakeConn(True, existing=['medicion_default', 'medicion_p202501'])
+    assert PartitionManager().ensure_months(conn, months_present(ts)) == ['medicion_p197001']
+    # demasiados meses de una vez: ninguno se crea, las filas quedan en la default
+    monkeypatch.setattr(partitions, 'MAX_NEW_MONTHS', 2)
+    conn = FakeConn(True, existing=['medicion_default'])
+    assert PartitionManager().ensure(conn, '2025-01-01T00:00:00Z', '2025-03-01T00:00:00Z') == []
+    assert conn.sql == []
+
+def test_archive_moves_or_deletes_validaciones_in_the_same_transaction():
+    for drop in (False, True):
+        conn = FakeConn(True, existing=['medicion_default', 'medicion_p202401', 'medicion_p202402'])
+        assert PartitionManager().archive(conn, '2024-02-01', drop=drop) == ['medicion_p202401']
+        body = [q for q in conn.sql if 'medicion_p202401' in q]
+        assert 'DETACH' in body[0] and any('DELETE FROM validacion' in q for q in body)
+        assert ('DROP TABLE' in body[-1]) == drop and any('INSERT INTO' in q for q in body) != drop
+        assert conn.commits == 1
@@ -0,0 +1,17 @@
+# tests/test_pipeline.py
+import src.pipeline as pipeline
+
+def test_async_pipeline_keeps_order_and_reports_metrics(tmp_path, monkeypatch):
+    path = tmp_path / 'a.csv'
+    path.write_text('sensor_id,time,temp\n' + ''.join(f's1,2025-01-01T00:00:{i:02d}Z,{i}\n' for i in range(50)))
+    written = []
+    monkeypatch.setattr(pipeline, '_write', lambda conn, df, norm, mode, batch_size, checkpoint, raw_payload, tx, stage: written.append(norm['temperatura'].tolist()))
+
+    stats = pipeline.ingest_file_async(None, str(path), mode='bulk', chunk_rows=7, queue_size=2)
+
+    assert [t for chunk in written for t in chunk] == [float(i) for i in range(50)]
+    assert stats['filas'] == 50
+    m = stats['metricas']
+    assert [m['etapas'][s]['items'] for s in ('lectura', 'normalizacion', 'escritura')] == [8, 8, 8]
+    assert all(q['max'] <= 2 for q in m['colas'].values())
+    assert m['cuello'] in m['etapas']
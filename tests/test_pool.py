@@ -0,0 +1,158 @@
+# tests/test_pool.py
+import threading
+import time
+import pytest
+import psycopg2.extensions
+import src.db as db
+import src.pool as pool
+from src.pool import ConnectionPool, PoolTimeout, _numbered, execute_prepared
+from src.sensor_state import SensorStateCache
+
+class FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.commits = 0
+        self.prepared = set()
+        self.queries = []
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.commits += 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.queries.append((sql, params))
+
+def test_pool_reuses_waits_and_times_out(monkeypatch):
+    monkeypatch.setattr(pool, 'connect', lambda config, **kwargs: FakeConn())
+    p = ConnectionPool(config={}, max_size=1)
+    conn = p.getconn()
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    with pytest.raises(PoolTimeout):
+        p.getconn(timeout=0.05)
+
+    threading.Timer(0.05, p.putconn, (conn,)).start()
+    t0 = time.perf_counter()
+    with p.connection(timeout=2) as again:
+        assert again is conn and time.perf_counter() - t0 >= 0.04
+    # la transacción que quedó abierta se deshizo al devolverla
+    assert conn.rollbacks == 1
+    stats = p.stats()
+    assert (stats['abiertas'], stats['libres'], stats['esperas']) == (1, 1, 3)
+    assert stats['espera_max_s'] >= 0.04
+
+def test_numbered_placeholders_and_prepare_once():
+    assert _numbered("SELECT %s, %s") == ("SELECT $1, $2", [None, None])
+    assert _numbered("WHERE a = %(x)s OR b = %(y)s OR c = %(x)s") == ("WHERE a = $1 OR b = $2 OR c = $1", ['x', 'y'])
+
+    conn = FakeConn()
+    for v in (1, 2):
+        execute_prepared(conn.cursor(), 'q', "SELECT * FROM t WHERE a = %(a)s", {'a': v})
+    assert conn.queries == [("PREPARE q AS SELECT * FROM t WHERE a = $1", None),
+                            ("EXECUTE q (%s)", [1]), ("EXECUTE q (%s)", [2])]
+
+def test_transaction_batch_rejects_bad_row_and_commits_every_n(monkeypatch):
+    def insert(cur, m, sensor_id, procedure_version, state, raw_payload):
+        if m['temperatura'] is None:
+            raise ValueError('fila mala')
+        return db.to_ns(m['timestamp'])
+    refreshed = []
+    monkeypatch.setattr(db, '_insert_medicion', insert)
+    monkeypatch.setattr(db.ROLLUPS, 'refresh', lambda cur, sensors, hours: refreshed.append(len(hours)))
+    monkeypatch.setattr(db.PARTITIONS, 'pending', lambda start, end: False)
+    conn, checkpoints = FakeConn(), []
+
+    with db.TransactionBatch(conn, rows=2, checkpoint=lambda cur, n: checkpoints.append(n),
+                             state=SensorStateCache()) as tx:
+        for i, temp in enumerate([20.0, None, 21.0, 22.0, 23.0]):
+            tx.insert({'sensor_id': 's1', 'timestamp': f'2025-01-01T00:0{i}:00Z', 'temperatura': temp, 'fila': i})
+
+    assert tx.inserted == 4 and [fila for fila, _ in tx.rejected] == [1]
+    # la fila mala se deshace sola; el lote sigue y confirma cada 2 filas (la última al salir)
+    assert [q for q, _ in conn.queries].count("ROLLBACK TO SAVEPOINT fila") == 1
+    assert conn.commits == 3 and checkpoints == [2, 4, 5]
+    # los agregados se recalculan una vez por commit, no por fila (todas en la misma hora)
+    assert refreshed == [1, 1, 1]
+
+def test_borrowed_leaves_caller_transaction_alone(monkeypatch):
+    monkeypatch.setattr(pool, 'connect', lambda config, **kwargs: FakeConn())
+    monkeypatch.setattr(pool, 'POOL', ConnectionPool(config={}, max_size=1))
+    mine = FakeConn()
+    mine.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    with pool.borrowed(mine) as conn:
+        assert conn is mine
+    assert mine.rollbacks == 0 and mine.commits == 0
+    with pool.borrowed() as conn:
+        conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    # la del pool sí se devuelve con la lectura cerrada
+    assert conn is not mine and conn.rollbacks == 1 and pool.POOL.stats()['libres'] == 1
+
+def test_transaction_batch_error_forgets_unconfirmed_readings(monkeypatch):
+    monkeypatch.setattr(db, '_insert_medicion', lambda cur, m, *args: db.to_ns(m['timestamp']))
+    monkeypatch.setattr(db.PARTITIONS, 'pending', lambda start, end: False)
+
+    class NoRows:
+        def execute(self, sql, params=None):
+            pass
+
+        def fetchall(self):
+            return []
+    state = SensorStateCache()
+    t0 = db.to_ns('2025-01-01T00:00:00Z')
+    state.warm(NoRows(), {'s1': (t0, t0), 's2': (t0, t0)})
+    conn = FakeConn()
+    with pytest.raises(RuntimeError):
+        with db.TransactionBatch(conn, rows=10, state=state) as tx:
+            tx.insert({'sensor_id': 's1', 'timestamp': '2025-01-01T00:05:00Z', 'temperatura': 20.0})
+            assert state.previous('s1', t0 + 10**12)[0] == 20.0
+            raise RuntimeError('falla el que llama')
+    # deshecho: la lectura de s1 no quedó en la base, tampoco en la cache; s2 no se tocó
+    assert conn.rollbacks == 1 and conn.commits == 0
+    assert 's1' not in state and 's2' in state
+
+def test_insert_medicion_rows_refreshes_rollups_once_even_if_a_row_fails(monkeypatch):
+    def insert(cur, m, *args):
+        if m['temperatura'] is None:
+            raise ValueError('fila mala')
+        return db.to_ns(m['timestamp'])
+    refreshed = []
+    monkeypatch.setattr(db, '_insert_medicion', insert)
+    monkeypatch.setattr(db.ROLLUPS, 'refresh', lambda cur, sensors, hours: refreshed.append(sorted(set(hours))))
+    monkeypatch.setattr(db.PARTITIONS, 'ensure', lambda conn, start, end: [])
+    conn, checkpoints = FakeConn(), []
+    rows = [(i, {'sensor_id': 's1', 'timestamp': f'2025-01-01T0{i}:30:00Z', 'temperatura': 20.0}) for i in range(3)]
+    n = db.insert_medicion_rows(conn, rows, checkpoint=lambda cur, next_row: checkpoints.append(next_row))
+    assert n == 3 and checkpoints == [1, 2, 3] and conn.commits == 4
+    assert refreshed == [[db.to_ns(f'2025-01-01T0{i}:00:00Z') for i in range(3)]]
+
+    refreshed.clear()
+    rows = [(0, {'sensor_id': 's1', 'timestamp': '2025-01-01T05:00:00Z', 'temperatura': 20.0}),
+            (1, {'sensor_id': 's1', 'timestamp': '2025-01-01T06:00:00Z', 'temperatura': None})]
+    with pytest.raises(ValueError):
+        db.insert_medicion_rows(conn, rows)
+    # la fila confirmada antes del error igual tiene sus agregados
+    assert refreshed == [[db.to_ns('2025-01-01T05:00:00Z')]]
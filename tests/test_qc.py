@@ -0,0 +1,48 @@
+# tests/test_qc.py
+import numpy as np
+import pandas as pd
+from src.dictionary import LOCAL_LIMITS, VariableLimits
+from src.qc import VARIABLES, qc_frame
+
+def limits(**rows):
+    return VariableLimits(fetch=lambda: rows)
+
+def series(sensor_id, start, freq, **values):
+    n = len(next(iter(values.values())))
+    df = pd.DataFrame({'sensor_id': sensor_id, 'timestamp': pd.date_range(start, periods=n, freq=freq, tz='UTC')})
+    for var in VARIABLES:
+        df[var] = values.get(var, [np.nan] * n)
+    return df
+
+def test_limits_come_from_table_with_local_fallback():
+    lim = limits(temperatura={'rango_minimo': -40, 'rango_maximo': 50, 'salto_maximo': None})
+    assert lim.range('temperatura') == (-40, 50)
+    assert lim.get('temperatura', 'salto_maximo') is None                  # NULL desactiva
+    assert lim.get('temperatura', 'plano_minutos') == LOCAL_LIMITS['temperatura']['plano_minutos']   # columna ausente
+    def down():
+        raise OSError('sin base')
+    assert VariableLimits(fetch=down).range('humedad') == (0, 100)
+
+def test_temporal_rules_per_sensor_in_any_row_order():
+    temp = [20.0, 20.1, 35.0, 20.2, 20.3, 27.0, 27.1, 27.2]     # pico en 2, escalón en 5
+    a = series('a', '2025-01-01T00:00:00Z', '10min', temperatura=temp)
+    b = series('b', '2025-01-01T00:00:00Z', '1min', velocidad_viento=[3.0] * 5 + [4.0] * 400)
+    df = pd.concat([a, b]).sample(frac=1, random_state=1).reset_index(drop=True)
+    flags = qc_frame(df, limits())
+    got = {(df.at[f, 'sensor_id'], str(df.at[f, 'timestamp'].time()), t) for f, t in zip(flags['fila'], flags['tipo_flag'])}
+    assert ('a', '00:20:00', 'SPIKE') in got and ('a', '00:20:00', 'CONSISTENCY') in got
+    assert ('a', '00:50:00', 'STEP') in got
+    # ni el pico ni el escalón se marcan como escalón en la lectura siguiente
+    assert ('a', '00:30:00', 'STEP') not in got and ('a', '01:00:00', 'STEP') not in got
+    # 400 minutos iguales: se marca el tramo entero (FLATLINE de viento = 360 min), no el de 5 minutos
+    flat = [(s, t) for s, t, k in got if k == 'FLATLINE']
+    assert len(flat) == 400 and {s for s, _ in flat} == {'b'}
+    assert not any(s == 'b' and k in ('SPIKE', 'STEP', 'RATE') for s, _, k in got)
+
+def test_rate_uses_time_gap_and_descriptions_match_ingest():
+    # +4 °C en 10 minutos = 24 °C/h (límite 10/h); +4 °C en 1 hora no
+    df = pd.concat([series('a', '2025-01-01T00:00:00Z', '10min', temperatura=[10.0, 14.0]),
+                    series('b', '2025-01-01T00:00:00Z', '1h', temperatura=[10.0, 14.0, 75.0])], ignore_index=True)
+    flags = qc_frame(df, limits(), rules=('RATE', 'RANGE'))
+    assert list(zip(flags['fila'], flags['tipo_flag'])) == [(1, 'RATE'), (4, 'RANGE'), (4, 'RATE')]
+    assert flags['descripcion_problema'][1] == 'temperatura=75.0 fuera de rango [-60,60]'
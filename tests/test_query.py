@@ -0,0 +1,100 @@
+# tests/test_query.py
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from src import query
+from src.query import QueryCache, iter_window, nearest
+
+def _frame(n):
+    return pd.DataFrame({'sensor_id': ['s1'] * n, 'temperatura': np.arange(n, dtype=float)})
+
+def test_cache_lru_ttl_and_invalidation_by_sensor_and_range(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query.time, 'monotonic', lambda: now[0])
+    cache = QueryCache(max_entries=2, ttl=10, max_rows=5)
+    g = cache.generation
+    cache.put('a', _frame(2), ['s1'], 0, 99, g)
+    cache.put('b', _frame(2), ['s2'], 0, 99, g)
+    cache.put('grande', _frame(6), ['s1'], 0, 99, g)     # más de max_rows: no se guarda
+    hit = cache.get('a')
+    assert hit.attrs['cache'] and 'grande' not in cache._entries
+    hit['temperatura'] = -1.0                             # la copia no toca la cache
+    assert cache.get('a')['temperatura'].tolist() == [0.0, 1.0]
+    cache.put('c', _frame(1), None, 50, math.inf, g)      # sale 'b', la menos usada
+    assert list(cache._entries) == ['a', 'c']
+
+    # otro sensor o fuera del intervalo: se conserva; None (todos los sensores) cae con cualquiera
+    assert cache.invalidate({'s2': (0, 10)}) == 0
+    assert cache.invalidate({'s2': (60, 70)}) == 1
+    assert list(cache._entries) == ['a']
+    assert cache.invalidate({'s1': (100, 200)}) == 0
+    assert cache.invalidate({'s1': (99, 99)}) == 1 and len(cache) == 0
+
+    # leído antes de un commit: no se guarda; vencido: no se devuelve
+    cache.put('d', _frame(1), ['s1'], 0, 1, g)
+    assert len(cache) == 0
+    cache.put('d', _frame(1), ['s1'], 0, 1, cache.generation)
+    now[0] += 11
+    assert cache.get('d') is None
+    assert cache.stats() == {'entradas': 0, 'aciertos': 2, 'fallos': 1, 'invalidadas': 2}
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows            # (sensor, ts_us, temperatura) ordenadas
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.executed.append(dict(params))
+        if 'UNION ALL' in sql:
+            ts = int(pd.Timestamp(params['ts']).value // 1000)
+            mine = [r for r in self.rows if r[0] == params['sensor']]
+            before = [r for r in mine if r[1] <= ts][-1:]
+            after = [r for r in mine if r[1] > ts][:1]
+            self.result = [r[1:] for r in before + after]
+            return
+        after = pd.Timestamp(params['despues']).value // 1000
+        end = pd.Timestamp(params['hasta']).value // 1000
+        self.result = [r[1:] for r in self.rows if r[0] == params['sensor'] and after < r[1] < end][:params['filas']]
+
+    def fetchall(self):
+        return self.result
+
+class FakeConn:
+    def __init__(self, rows):
+        self.cur = FakeCursor(rows)
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self.cur
+
+    def rollback(self):
+        self.rollbacks += 1
+
+def test_iter_window_pages_by_keyset_and_nearest():
+    base = pd.Timestamp('2025-01-01T00:00:00Z').value // 1000
+    rows = [(s, base + i * 60_000_000, float(i)) for s in ('s1', 's2') for i in range(7)]
+    conn = FakeConn(rows)
+    pages = list(iter_window(['s2', 's1'], '2025-01-01T00:01:00Z', '2025-01-01T00:06:00Z', ['temperatura'],
+                             page_rows=2, conn=conn))
+    assert [len(p) for p in pages] == [2, 2, 1, 2, 2, 1]
+    frame = pd.concat(pages, ignore_index=True)
+    assert frame['sensor_id'].tolist() == ['s1'] * 5 + ['s2'] * 5
+    assert frame['temperatura'].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0] * 2
+    assert str(frame['timestamp'].dtype) == 'datetime64[us, UTC]'
+    # cada página sigue a la anterior por timestamp, no por OFFSET
+    assert [pd.Timestamp(p['despues']).minute for p in conn.cur.executed[:3]] == [0, 2, 4]
+    assert conn.rollbacks == 0        # la transacción del que llama no se toca
+
+    got = nearest('s1', '2025-01-01T00:02:40Z', ['temperatura'], conn=conn, cache=False)
+    assert got['temperatura'].tolist() == [3.0]
+    assert nearest('s1', '2025-01-01T00:02:30Z', ['temperatura'], conn=conn, cache=False)['temperatura'].tolist() == [2.0]
+    assert nearest('s1', '2025-01-01T00:20:00Z', ['temperatura'], max_distance='5min', conn=conn, cache=False).empty
+    with pytest.raises(ValueError, match='Variables desconocidas'):
+        list(iter_window(['s1'], '2025-01-01', '2025-01-02', ['lluvia'], conn=conn))
@@ -0,0 +1,67 @@
+# tests/test_raw_payload.py
+import numpy as np
+import pandas as pd
+import pytest
+from src.raw_payload import RawPayload, RawRefs, mapped_columns
+
+RAW = pd.DataFrame({'sensor_id': ['s1', 's2'], 'time': ['2025-01-01T00:00:00Z', '2025-01-01T00:01:00Z'],
+                    'temp_f': [77.0, np.nan], 'hum': [0.5, 0.6], 'lat': [-12.0, -12.0], 'nota': ['a', None]},
+                   index=[7, 8])
+
+def test_modes_keep_only_what_is_asked():
+    assert mapped_columns(RAW.columns) == {'sensor_id', 'time', 'temp_f', 'hum'}
+    assert RawPayload('full').payloads(RAW)[0] == RAW.iloc[:1].to_json(orient='records', lines=True).strip()
+    assert RawPayload('unmapped').payloads(RAW) == ['{"lat":-12.0,"nota":"a"}', '{"lat":-12.0,"nota":null}']
+    assert RawPayload('none').payloads(RAW) is None
+    assert RawPayload('unmapped').payload({'sensor_id': 's1', 'temp': 1.0}) is None
+    assert RawPayload('unmapped').payload({'sensor_id': 's1', 'lat': -12.0}) == {'lat': -12.0}
+    # sin DataFrame crudo, full guarda '{}' como antes
+    assert RawPayload('full').payloads(None) == '{}'
+
+def test_reference_keeps_file_and_row():
+    ref = RawPayload('reference', archivo_id=3)
+    assert ref.payloads(RAW) is None and ref.payload(RAW.iloc[0].to_dict()) is None
+    assert ref.refs(7) == (3, 7)
+    assert RawPayload('full').refs(7) == (None, None)
+    with pytest.raises(ValueError):
+        RawPayload('reference')
+    with pytest.raises(ValueError):
+        RawPayload('comprimido')
+
+class FakeCursor:
+    def __init__(self, answer):
+        self.answer = answer
+        self.queries = 0
+
+    def execute(self, sql, params=None):
+        self.queries += 1
+
+    def fetchone(self):
+        return (self.answer,)
+
+def test_ref_columns_checked_once():
+    refs, cur = RawRefs(), FakeCursor(False)
+    assert refs.columns(cur) == [] and refs.columns(cur) == [] and cur.queries == 1
+    refs.clear()
+    assert RawRefs().columns(FakeCursor(True)) == ['raw_archivo_id', 'raw_fila']
+
+def test_csv_blocks_cut_at_record_ends_and_number_rows_like_iter_csv(tmp_path):
+    import io
+    from src.ingest import iter_csv
+    from src.raw_payload import csv_blocks
+    path = tmp_path / 'a.csv'
+    path.write_bytes(b'sensor_id,time,nota\n'
+                     b's1,2025-01-01T00:00:00Z,"dos\nlineas"\n'
+                     b'\n'
+                     b's1,2025-01-01T00:01:00Z,ok\n'
+                     b's2,2025-01-01T00:02:00Z,"con ""comillas"""\n'
+                     b's2,2025-01-01T00:03:00Z,\n')
+    expected = pd.concat(iter_csv(str(path), chunksize=2))
+    with open(path, 'rb') as f:
+        header, blocks = csv_blocks(f, block_bytes=1)
+        blocks = list(blocks)
+    assert header == b'sensor_id,time,nota\n'
+    assert [(a, b) for a, b, _ in blocks] == [(0, 1), (1, 2), (2, 3), (3, 4)]
+    for desde, hasta, data in blocks:
+        got = pd.read_csv(io.BytesIO(header + data))
+        assert got['nota'].fillna('').tolist() == expected['nota'].iloc[desde:hasta].fillna('').tolist()
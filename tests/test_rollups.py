@@ -0,0 +1,41 @@
+# tests/test_rollups.py
+import pandas as pd
+import src.db as db
+from src.rollups import ROLLUPS, VARIABLES, Rollups, _source_for, touched_hours
+
+class FakeCursor:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.sql = []
+
+    def execute(self, query, params=None):
+        self.sql.append((query, params))
+
+    def fetchone(self):
+        return (self.enabled,)
+
+def test_touched_hours_are_distinct_utc_buckets():
+    sensores, horas = touched_hours(
+        ['a', 'a', 'b', 'a'],
+        ['2025-01-01T10:05:00Z', '2025-01-01T10:55:00Z', '2025-01-01T10:05:00Z', '2025-01-01T08:30:00-03:00'])
+    assert sensores == ['a', 'b', 'a']
+    assert [pd.Timestamp(h).isoformat() for h in horas] == [
+        '2025-01-01T10:00:00+00:00', '2025-01-01T10:00:00+00:00', '2025-01-01T11:00:00+00:00']
+
+def test_refresh_is_a_noop_without_rollup_tables():
+    cur, rollups = FakeCursor(False), Rollups()
+    assert rollups.refresh(cur, ['a'], ['2025-01-01T10:00:00Z']) == 0
+    assert rollups.refresh(cur, ['b'], ['2025-01-01T11:00:00Z']) == 0
+    assert len(cur.sql) == 1          # sólo la consulta al catálogo
+    cur = FakeCursor(True)
+    rollups.clear()
+    assert rollups.refresh(cur, ['a', 'a'], ['2025-01-01T10:00:00Z', '2025-01-01T10:30:00Z']) == 1
+    assert cur.sql[-1][1] == {'sensores': ['a'], 'horas': [pd.Timestamp('2025-01-01T10:00:00Z').to_pydatetime()]}
+
+def test_source_follows_resolution():
+    assert _source_for(pd.Timedelta('15min')) == 'medicion'
+    assert _source_for(pd.Timedelta('90min')) == 'medicion'
+    assert _source_for(pd.Timedelta('6h')) == 'medicion_hora'
+    assert _source_for(pd.Timedelta('36h')) == 'medicion_hora'
+    assert _source_for(pd.Timedelta('7D')) == 'medicion_dia'
+    assert VARIABLES == db.VARIABLES and ROLLUPS is db.ROLLUPS
@@ -0,0 +1,44 @@
+# tests/test_timestamps.py
+import pandas as pd
+from src.timestamps import InvalidTimestamps, TimestampParser, infer_format, parse_column, parse_value
+
+def test_infer_format_by_kind():
+    assert infer_format(pd.Series(['2025-01-01T00:00:00Z', '2025-01-01T00:01:00Z'])) == ('iso', None)
+    assert infer_format(pd.Series(['2025-01-01T00:00:00-05:00'])) == ('iso', 6)
+    assert infer_format(pd.Series([1735689600, 1735689660])) == ('epoch', 's')
+    assert infer_format(pd.Series(['1735689600000', 'x', '1735689660000'])) == ('epoch', 'ms')
+    assert infer_format(pd.Series([20250101.0, None, 20250102.0]).dropna()) == ('format', '%Y%m%d')
+    # el primer valor es ambiguo; el 13/01 decide que es dd/mm
+    assert infer_format(pd.Series(['01/02/2025 10:00', '13/01/2025 10:00'])) == ('format', '%d/%m/%Y %H:%M')
+
+def test_iso_offset_fast_path_matches_pandas():
+    values = pd.Series(['2025-01-01T00:00:00-05:00', '2025-06-01T12:30:00+01:00', '2025-01-01 00:00', 'nada'])
+    got = parse_column(values, 'iso', 6)
+    expect = pd.to_datetime(values[:3], format='mixed', utc=True)
+    assert (got[:3] == expect).all() and pd.isna(got[3])
+
+def test_parse_value_fast_paths_match_column_rules():
+    cells = ['2025-01-01T00:00:00Z', '2025-01-01 10:30', '2025-06-01T12:30:00.5-0500', '2025-01-01T25:00:00',
+             1735689600, 1735689600123.0, '1735689600', '20250101', 20250101, '03/04/2025', 'nada']
+    for cell in cells:
+        values = pd.Series([cell])
+        expect = parse_column(values, *infer_format(values)).iat[0]
+        got = parse_value(cell)
+        assert (got is None and pd.isna(expect)) or got == expect, cell
+
+def test_parser_caches_format_and_leaves_nat():
+    parser = TimestampParser()
+    first = parser.parse(pd.DataFrame({'time': ['13/01/2025 10:00', '14/01/2025 10:00']}))
+    assert parser.formats == {'time': ('format', '%d/%m/%Y %H:%M')}
+    # segundo chunk del mismo archivo: mismo formato aunque el día sea <= 12
+    second = parser.parse(pd.DataFrame({'time': ['02/03/2025 10:00', '???'], 'date': [None, 'tampoco']}))
+    assert first[0] == pd.Timestamp('2025-01-13 10:00', tz='UTC')
+    assert second[0] == pd.Timestamp('2025-03-02 10:00', tz='UTC') and pd.isna(second[1])
+
+def test_invalid_rows_are_dropped_and_reported():
+    df = pd.DataFrame({'time': ['2025-01-01T00:00:00Z', 'roto', None]}, index=[5, 6, 7])
+    norm = pd.DataFrame({'timestamp': TimestampParser().parse(df)})
+    invalid = InvalidTimestamps('a.csv', limit=1)
+    norm, kept = invalid.drop(norm, df)
+    assert list(norm.index) == list(kept.index) == [5]
+    assert invalid.as_dict() == {'timestamps_invalidos': 2, 'filas_sin_timestamp': [(6, 'roto')]}